@@ -0,0 +1,98 @@
+"""Opt-in cap on how many pksql queries run at once on this host.
+
+Every pksql process starts its own DuckDB, which by default takes every core
+and up to 80% of memory; twenty started by cron at once thrash and run each
+other out of memory.  With a limit of ``n``, a query first takes one of ``n``
+slot files in a directory private to the user (``$XDG_RUNTIME_DIR/pksql``, or
+``/tmp/pksql-<uid>``), holding an exclusive ``flock`` on it for as long as it
+runs, and waits while all are taken.  The kernel releases the lock when the
+process exits, however it exits, so a crashed query never keeps its slot.
+
+The resources are partitioned statically: each slot gets a fixed ``1/n`` of
+the cores and of DuckDB's usual memory allowance, decided when its query
+starts, however many of the other slots are taken.  A query running alone
+therefore still gets only its ``1/n``, but the queries running together never
+add up to more than one DuckDB would take, which a share sized by how many
+are running now could not promise once more of them start.  Waiting queries
+are not served in any strict order.
+"""
+
+import contextlib
+import os
+import tempfile
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# DuckDB's own default memory_limit is this share of physical memory.
+MEMORY_SHARE = 0.8
+POLL_SECONDS = (0.01, 0.5)
+
+
+class AdmissionError(Exception):
+    """Raised when slots cannot be taken on this system."""
+
+
+def slots_dir():
+    """The directory holding the slot files, created private to the user."""
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        path = Path(runtime) / "pksql"
+    else:
+        path = Path(tempfile.gettempdir()) / f"pksql-{os.getuid()}"
+    path.mkdir(mode=0o700, exist_ok=True)
+    if path.stat().st_uid != os.getuid():
+        # Another user made it first, to see or hold up our queries.
+        raise AdmissionError(f"{path} belongs to another user")
+    return path
+
+
+def physical_memory():
+    """Bytes of physical memory, or ``None`` if unknown."""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def budget(limit):
+    """``{setting: value}`` for one of ``limit`` queries sharing this host."""
+    settings = {"threads": max(1, (os.cpu_count() or 1) // limit)}
+    memory = physical_memory()
+    if memory is not None:
+        settings["memory_limit"] = f"{int(memory * MEMORY_SHARE / limit)}B"
+    return settings
+
+
+def _try_slots(directory, limit):
+    """An open, locked slot file, or ``None`` if all ``limit`` are taken."""
+    for slot in range(limit):
+        fd = os.open(directory / f"slot-{slot}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        return fd
+    return None
+
+
+@contextlib.contextmanager
+def admitted(limit, directory=None):
+    """Wait for one of ``limit`` slots and hold it; yields the seconds waited."""
+    if fcntl is None:
+        raise AdmissionError("limiting concurrent queries needs a POSIX system")
+    directory = slots_dir() if directory is None else Path(directory)
+    start_time = time.perf_counter()
+    pause = POLL_SECONDS[0]
+    while (fd := _try_slots(directory, limit)) is None:
+        time.sleep(pause)
+        pause = min(pause * 2, POLL_SECONDS[1])
+    try:
+        yield time.perf_counter() - start_time
+    finally:
+        os.close(fd)  # Releases the lock.
@@ -5,6 +5,12 @@ A ``.pksql`` file is a list of ``name = path`` lines (``#`` starts a comment)::
     corpus = data/s3-backup-20260731/karl/corpus.duckdb
     hits   = 'results/*.parquet'
 
+A line starting with a directive keyword followed by more than ``=`` says
+something other than where an alias lives (see ``directives``)::
+
+    rollup daily_hits = hits by day: count(*)
+    set workers = host1:7878, host2:7878
+
 ``~/.pksql`` supplies aliases everywhere; a ``.pksql`` in the working directory
 adds to it and wins on a name collision.  Relative paths are resolved against
 the directory holding the file that declared them, so a ``.pksql`` stays
@@ -12,23 +18,66 @@ correct wherever the project is checked out.
 """
 
 import glob
+import hashlib
 import os
 import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import duckdb
 
 ALIAS_FILE = ".pksql"
 
+# DuckDB table functions that read an explicit list of files, by extension.
+READERS = {
+    ".parquet": "read_parquet",
+    ".csv": "read_csv",
+    ".tsv": "read_csv",
+    ".json": "read_json",
+    ".jsonl": "read_json",
+    ".ndjson": "read_json",
+}
+
+# Aliases with these extensions are DuckDB databases, attached rather than
+# wrapped in a view (see ``attach_databases``).
+DATABASES = (".duckdb",)
+
+# A glob of databases is attached shard by shard, as catalogs named
+# ``pksql_shard_<alias>_<n>``, this many at a time.
+SHARD_PREFIX = "pksql_shard"
+ATTACH_THREADS = 16
+
 # Alias names become DuckDB view names and are interpolated straight into SQL,
 # so restrict them to plain identifiers rather than trying to escape anything.
 NAME_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*\Z")
 
 
+# Keywords that start a directive line rather than an alias.
+DIRECTIVES = ("rollup", "set")
+_DIRECTIVE_RE = re.compile(r"({})\s+(?!=)(\S.*)\Z".format("|".join(DIRECTIVES)))
+
+
 class AliasError(Exception):
     """Raised for a malformed alias name or ``.pksql`` file."""
 
 
+def quote(text):
+    """``text`` as a SQL string literal."""
+    return "'{}'".format(str(text).replace("'", "''"))
+
+
+def quote_identifier(name):
+    """``name`` as a SQL identifier, quoted whatever it holds."""
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def attach(conn, catalog, path, read_only=True):
+    """Attach the DuckDB database at ``path`` to ``conn`` as ``catalog``."""
+    mode = " (READ_ONLY)" if read_only else ""
+    conn.sql(f"ATTACH {quote(path)} AS {quote_identifier(catalog)}{mode}")
+
+
 def global_file():
     """Path of the user-wide alias file."""
     return Path.home() / ALIAS_FILE
@@ -61,10 +110,20 @@ def _strip_quotes(value):
     return value
 
 
+def _directive(line):
+    """``(keyword, rest)`` if ``line`` is a directive, else ``None``.
+
+    ``rollup = x`` is still an alias named ``rollup``: a directive keyword
+    needs something other than ``=`` after it.
+    """
+    match = _DIRECTIVE_RE.match(line.strip())
+    return match.groups() if match else None
+
+
 def _entry_name(line):
-    """The alias a line defines, or ``None`` for blanks and comments."""
+    """The alias a line defines, or ``None`` for blanks, comments and directives."""
     stripped = line.strip()
-    if not stripped or stripped.startswith("#"):
+    if not stripped or stripped.startswith("#") or _directive(stripped):
         return None
     name, sep, _ = stripped.partition("=")
     return name.strip() if sep else None
@@ -75,7 +134,7 @@ def parse(text, source=ALIAS_FILE):
     aliases = {}
     for lineno, line in enumerate(text.splitlines(), 1):
         stripped = line.strip()
-        if not stripped or stripped.startswith("#"):
+        if not stripped or stripped.startswith("#") or _directive(stripped):
             continue
         name, sep, path = stripped.partition("=")
         where = f"{source}:{lineno}"
@@ -90,6 +149,36 @@ def parse(text, source=ALIAS_FILE):
     return aliases
 
 
+def directives(keyword, cwd=None):
+    """``(text, where)`` for each ``keyword`` directive, lowest precedence first.
+
+    ``text`` is the rest of the line and ``where`` its ``file:line``, for
+    error messages.  The caller interprets the text.
+    """
+    found = []
+    for source in source_files(cwd):
+        try:
+            text = Path(source).read_text()
+        except FileNotFoundError:
+            continue
+        for lineno, line in enumerate(text.splitlines(), 1):
+            directive = _directive(line)
+            if directive is not None and directive[0] == keyword:
+                found.append((directive[1].strip(), f"{source}:{lineno}"))
+    return found
+
+
+def settings(cwd=None):
+    """``{name: value}`` from ``set name = value`` lines; ``./.pksql`` wins."""
+    found = {}
+    for text, where in directives("set", cwd):
+        name, sep, value = text.partition("=")
+        if not sep or not NAME_RE.match(name.strip()):
+            raise AliasError(f"{where}: expected 'set name = value', got {text!r}")
+        found[name.strip().lower()] = _strip_quotes(value.strip())
+    return found
+
+
 def needs_quoting(name):
     """Whether querying ``name`` requires double-quoting it.
 
@@ -141,8 +230,9 @@ def update_file(path, name, new_path):
     """Set ``name`` to ``new_path`` in ``path``, or remove it if ``new_path`` is None.
 
     Only the matching line is touched, so hand-written comments and ordering
-    survive.  Returns the path ``name`` used to point at, or ``None`` if it was
-    not previously set.
+    survive.  The new file replaces the old in one step, so a query reading it
+    meanwhile sees one or the other, never half of each.  Returns the path
+    ``name`` used to point at, or ``None`` if it was not previously set.
     """
     path = Path(path)
     # Parse before writing: copying a line we cannot read back would let the
@@ -174,10 +264,32 @@ def update_file(path, name, new_path):
             kept.append(None)
         kept[slot] = f"{name} = {new_path}"
 
-    path.write_text("".join(f"{line}\n" for line in kept))
+    fd, temporary = tempfile.mkstemp(prefix=f"{path.name}.", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write("".join(f"{line}\n" for line in kept))
+        if path.exists():
+            os.chmod(temporary, path.stat().st_mode)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
     return previous
 
 
+def declaring_file(name, cwd=None):
+    """The alias file whose definition of ``name`` is in effect, or ``None``."""
+    for source in reversed(source_files(cwd)):
+        if name in read_file(source):
+            return source
+    return None
+
+
+def is_database(path):
+    """Whether ``path`` is a DuckDB database, which is attached rather than viewed."""
+    return path.lower().endswith(DATABASES)
+
+
 def create_views(conn, aliases):
     """Create a view per alias, skipping any whose path will not bind.
 
@@ -186,10 +298,13 @@ def create_views(conn, aliases):
     when a query actually names it, as DuckDB's own "does not exist" error.
     The view name is double-quoted so that a keyword alias still works; the
     query then has to quote it too.  ``NAME_RE`` has already ruled out a ``"``
-    in the name.  Returns the names that failed.
+    in the name.  Database aliases are left to ``attach_databases``.  Returns
+    the names that failed.
     """
     failed = []
     for name, path in aliases.items():
+        if is_database(path):
+            continue
         quoted = path.replace("'", "''")
         try:
             conn.sql(f"CREATE OR REPLACE VIEW \"{name}\" AS SELECT * FROM '{quoted}'")
@@ -198,6 +313,150 @@ def create_views(conn, aliases):
     return failed
 
 
+def is_glob(path):
+    """Whether ``path`` is a local glob rather than a single file or URL."""
+    return "://" not in path and any(ch in path for ch in "*?[")
+
+
+def _single_table_view(conn, name, tables):
+    """Make ``name`` itself the table, if ``tables`` holds just the one."""
+    if len(tables) == 1:
+        conn.sql(
+            f'CREATE OR REPLACE VIEW memory.main."{name}" AS SELECT * FROM {tables[0]}'
+        )
+
+
+def attach_shards(conn, name, paths):
+    """Attach every shard in ``paths`` and union their tables into schema ``name``.
+
+    The shards are attached from a pool of threads, since opening hundreds of
+    database files is mostly waiting on the disk.  Each table of the ``main``
+    schema becomes ``name.table``, a ``UNION ALL BY NAME`` over the shards
+    that have it; DuckDB's optimizer pushes filters and projections through
+    the union into every shard's scan, so each one is read as it would be
+    alone.  Raises ``duckdb.Error`` if a shard cannot be attached.
+    """
+    catalogs = [f"{SHARD_PREFIX}_{name}_{i}" for i in range(len(paths))]
+
+    def attach_one(catalog, path):
+        cursor = conn.cursor()  # One per thread; they share the database.
+        try:
+            attach(cursor, catalog, path)
+        finally:
+            cursor.close()
+
+    with ThreadPoolExecutor(max_workers=min(len(paths), ATTACH_THREADS)) as pool:
+        list(pool.map(attach_one, catalogs, paths))
+
+    order = {catalog: i for i, catalog in enumerate(catalogs)}
+    tables = {}
+    for catalog, table in conn.execute(
+        "SELECT database_name, table_name FROM duckdb_tables() "
+        "WHERE schema_name = 'main' AND list_contains(?, database_name)",
+        [catalogs],
+    ).fetchall():
+        tables.setdefault(table, []).append(catalog)
+
+    schema = quote_identifier(name)
+    conn.sql(f"CREATE SCHEMA IF NOT EXISTS memory.{schema}")
+    for table, sources in tables.items():
+        quoted = quote_identifier(table)
+        union = " UNION ALL BY NAME ".join(
+            f"SELECT * FROM {quote_identifier(catalog)}.main.{quoted}"
+            for catalog in sorted(sources, key=order.get)
+        )
+        conn.sql(f"CREATE OR REPLACE VIEW memory.{schema}.{quoted} AS {union}")
+    _single_table_view(
+        conn, name, [f"memory.{schema}.{quote_identifier(table)}" for table in tables]
+    )
+
+
+def attach_databases(conn, aliases, names):
+    """Attach the database aliases among ``names`` read-only, each as a catalog.
+
+    A ``.duckdb`` alias ``corpus`` makes every table in it available as
+    ``corpus.documents``, ``corpus.tokens`` and so on, with no view per table.
+    Only the aliases a query names are attached, so an unrelated query never
+    opens a large database file.  A glob of ``.duckdb`` shards looks the same,
+    with each table the union of that table across the shards (see
+    ``attach_shards``).  A database holding a single table also gets a view
+    named after the alias, so ``SELECT * FROM corpus`` works as it does for a
+    file.  Returns the names that failed to attach.
+    """
+    failed = []
+    for name in names:
+        path = aliases.get(name)
+        if path is None or not is_database(path):
+            continue
+        try:
+            if is_glob(path):
+                shards = files(path)
+                if not shards:
+                    raise duckdb.IOException(f"no files match {path}")
+                attach_shards(conn, name, shards)
+                continue
+            attach(conn, name, path)
+        except duckdb.Error:
+            failed.append(name)
+            continue
+        tables = conn.execute(
+            "SELECT database_name, schema_name, table_name "
+            "FROM duckdb_tables() WHERE database_name = ?",
+            [name],
+        ).fetchall()
+        _single_table_view(
+            conn, name, [".".join(map(quote_identifier, row)) for row in tables]
+        )
+    return failed
+
+
+def _token_end(text):
+    """Length of the token at the start of ``text``, which runs on to the next one."""
+    if text[0] in "'\"":
+        end = 1
+        while True:
+            end = text.find(text[0], end)
+            if end == -1:
+                return len(text)
+            if text[end + 1 : end + 2] != text[0]:
+                return end + 1
+            end += 2  # A doubled quote stands for itself.
+    match = re.match(r"\S+?(?=\s|--|/\*|\Z)", text)
+    return match.end() if match else len(text)
+
+
+def tokens(sql):
+    """``(text, token_type)`` for each token of ``sql``, comments dropped.
+
+    ``duckdb.tokenize`` gives only where each token starts, so its text has to
+    be cut from there, short of any whitespace or comment that follows it.
+    """
+    positions = duckdb.tokenize(sql)
+    bounds = [start for start, _ in positions[1:]] + [len(sql)]
+    for (start, kind), end in zip(positions, bounds):
+        text = sql[start:end]
+        yield text[: _token_end(text)], kind
+
+
+def referenced(sql, names):
+    """The subset of ``names`` that ``sql`` mentions, in ``names`` order.
+
+    Tokenizing rather than parsing keeps this working for any statement
+    (DuckDB only serializes ``SELECT`` to an AST) and never binds anything.
+    It over-approximates: a column that happens to share an alias's name
+    counts too, which only costs the caller some unnecessary setup.
+    """
+    mentioned = set()
+    for text, kind in tokens(sql):
+        if kind not in (duckdb.token_type.identifier, duckdb.token_type.keyword):
+            continue
+        if len(text) >= 2 and text[0] == text[-1] == '"':
+            text = text[1:-1].replace('""', '"')
+        # DuckDB matches names case-insensitively, quoted or not.
+        mentioned.add(text.lower())
+    return [name for name in names if name.lower() in mentioned]
+
+
 def missing(path):
     """Whether a local path currently matches nothing.
 
@@ -209,3 +468,58 @@ def missing(path):
     if any(ch in path for ch in "*?["):
         return not glob.glob(path, recursive=True)
     return not os.path.exists(path)
+
+
+def files(path):
+    """The local files ``path`` currently matches, sorted; ``[]`` for a URL."""
+    if "://" in path:
+        return []
+    if any(ch in path for ch in "*?["):
+        return sorted(glob.glob(path, recursive=True))
+    return [path] if os.path.exists(path) else []
+
+
+def footprint(paths):
+    """``(files, bytes)`` for the local files behind ``paths``.
+
+    URLs contribute nothing: sizing them would cost a request each.
+    """
+    count = size = 0
+    for path in paths:
+        for name in files(path):
+            count += 1
+            size += os.path.getsize(name)
+    return count, size
+
+
+def scan_sql(paths):
+    """A ``FROM`` clause reading exactly ``paths``, or ``None`` if they differ in kind.
+
+    This is how a subset of a glob alias's files is read: the files must all
+    share one of the ``READERS`` extensions (optionally compressed), since a
+    list, unlike a glob, does not get DuckDB's extension-based dispatch.
+    """
+    readers = set()
+    for path in paths:
+        stem = re.sub(r"\.(gz|zst)\Z", "", path.lower())
+        readers.add(READERS.get(os.path.splitext(stem)[1]))
+    if len(readers) != 1 or None in readers:
+        return None
+    listed = ", ".join(quote(path) for path in paths)
+    return f"{readers.pop()}([{listed}])"
+
+
+def fingerprint(path):
+    """A digest that changes whenever the files behind ``path`` change.
+
+    Local files contribute their name, size and modification time, so adding
+    a file to a glob or rewriting one shows up without reading any data.  A
+    URL is its own fingerprint: checking the object would cost a round trip.
+    """
+    if "://" in path:
+        return path
+    digest = hashlib.sha256(path.encode())
+    for name in files(path):
+        stat = os.stat(name)
+        digest.update(f"\0{name}\0{stat.st_size}\0{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
@@ -0,0 +1,92 @@
+"""Repeatable timing of one query, for comparing query shapes and file layouts.
+
+A single ``Query time`` is one noisy sample.  ``benchmark`` runs the query
+several times after some untimed warm-up runs and summarises the timings.  In
+cold mode every run gets a fresh DuckDB instance, so nothing DuckDB caches in
+memory (parquet footers, file handles, buffer-managed blocks) carries over
+from one run to the next; the operating system's page cache still does, and
+dropping that needs root.
+"""
+
+import math
+import statistics
+import time
+
+import duckdb
+
+from pksql import __version__
+from pksql import aliases as alias_store
+from pksql import history, partials
+
+RESULT = "pksql_bench_result"
+
+
+def _percentile(sorted_values, fraction):
+    """Nearest-rank percentile of already sorted values."""
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _run_once(conn, sql, select):
+    """Time one execution of ``sql``, returning ``(seconds, rows)``.
+
+    A ``SELECT`` is materialized inside DuckDB rather than fetched, so the
+    timing covers the whole query without converting every value to Python;
+    ``rows`` is ``None`` for other statements.
+    """
+    start_time = time.perf_counter()
+    if select:
+        conn.sql(f"CREATE OR REPLACE TEMP TABLE {RESULT} AS ({sql})")
+        elapsed = time.perf_counter() - start_time
+        (rows,) = conn.sql(f"SELECT count(*) FROM {RESULT}").fetchone()
+        conn.sql(f"DROP TABLE {RESULT}")
+        return elapsed, rows
+    conn.execute(sql)
+    return time.perf_counter() - start_time, None
+
+
+def benchmark(connect, sql, aliases, runs=20, warmup=3, cold=False):
+    """Run ``sql`` ``warmup + runs`` times and summarise the timed runs.
+
+    ``connect`` returns a fresh connection with the aliases bound; it is
+    called once, or once per run when ``cold``.  ``aliases`` maps the names the
+    query uses to their paths.  The ``alias_*`` figures are for every file
+    behind them, not just what the query reads.  Returns a JSON-ready dict.
+    """
+    conn = connect()
+    try:
+        select = partials.parse(conn, sql) is not None
+        timings, rows = [], None
+        for i in range(warmup + runs):
+            if cold and i:
+                conn.close()
+                conn = connect()
+            elapsed, rows = _run_once(conn, sql, select)
+            if i >= warmup:
+                timings.append(elapsed)
+    finally:
+        conn.close()
+
+    timings.sort()
+    median = statistics.median(timings)
+    files, size = alias_store.footprint(aliases.values())
+    normalized, fingerprint = history.normalize(sql)
+    return {
+        "sql": normalized,
+        "fingerprint": fingerprint,
+        "runs": runs,
+        "warmup": warmup,
+        "cold": cold,
+        "min_seconds": timings[0],
+        "median_seconds": median,
+        "p95_seconds": _percentile(timings, 0.95),
+        "max_seconds": timings[-1],
+        "stddev_seconds": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "rows": rows,
+        "rows_per_second": None if rows is None or not median else rows / median,
+        "alias_files": files,
+        "alias_bytes": size,
+        "alias_bytes_per_second": size / median if median else None,
+        "pksql_version": __version__,
+        "duckdb_version": duckdb.__version__,
+    }
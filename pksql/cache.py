@@ -0,0 +1,233 @@
+"""Local read-through cache for remote (``http://``/``https://``) alias sources.
+
+DuckDB fetches a remote file afresh in every process, so a hot alias pointing at
+a URL pays for the download on each query.  ``RemoteCache`` keeps a copy under
+``~/.cache/pksql/remote``, keyed by the URL plus the server's ``ETag`` (or
+``Last-Modified``) validator, so a changed object is fetched again and an
+unchanged one costs a single ``HEAD`` request.
+
+Several pksql processes may share the cache.  Objects are downloaded to a
+private temporary file and renamed into place, so a reader never sees a partial
+copy, and the index is a SQLite database, whose locking serialises the
+bookkeeping.  The index also holds the size cap's LRU order and the running
+hit/miss counts.
+"""
+
+import contextlib
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import urllib.request
+from pathlib import Path, PurePosixPath
+from urllib.parse import urlparse
+
+from pksql.core import parse_size
+
+DEFAULT_LIMIT = "10GiB"
+LIMIT_ENV = "PKSQL_CACHE_LIMIT"
+SCHEMES = ("http", "https")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    validator TEXT NOT NULL,
+    file TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+def cache_dir():
+    """Root of pksql's on-disk caches.
+
+    That is ``$XDG_CACHE_HOME/pksql``, or ``~/.cache/pksql`` if it is unset.
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "pksql"
+
+
+def cacheable(path):
+    """Whether ``path`` is a single remote object this cache can fetch.
+
+    Globs are left to DuckDB: expanding one needs a listing the server may not
+    offer, and ``s3://`` needs DuckDB's own credentials and request signing.
+    """
+    scheme = urlparse(path).scheme.lower()
+    return scheme in SCHEMES and not any(ch in path for ch in "*?[")
+
+
+class RemoteCache:
+    """A size-capped, LRU-evicted cache of remote objects shared between processes.
+
+    ``hits`` and ``misses`` count this instance's lookups; ``stats()`` reports
+    the totals across every process that has used the cache.
+    """
+
+    def __init__(self, root=None, limit=None, timeout=30):
+        self.root = Path(root) if root is not None else cache_dir() / "remote"
+        if limit is None:
+            limit = os.environ.get(LIMIT_ENV, DEFAULT_LIMIT)
+        self.limit = parse_size(limit) if isinstance(limit, str) else limit
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+
+    def _index(self):
+        (self.root / "objects").mkdir(parents=True, exist_ok=True)
+        index = sqlite3.connect(self.root / "index.sqlite", timeout=self.timeout)
+        index.executescript(_SCHEMA)
+        return index
+
+    def _head(self, url):
+        """``(validator, size)`` for ``url``, either ``None`` if the server omits it.
+
+        The validator is the server's version tag for the object.
+        """
+        request = urllib.request.Request(url, method="HEAD")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            headers = response.headers
+            length = headers.get("Content-Length")
+            return (
+                headers.get("ETag") or headers.get("Last-Modified"),
+                int(length) if length and length.isdigit() else None,
+            )
+
+    def _download(self, url, destination):
+        """Fetch ``url`` into ``destination`` atomically."""
+        fd, partial = tempfile.mkstemp(dir=destination.parent, suffix=".part")
+        try:
+            with (
+                os.fdopen(fd, "wb") as out,
+                urllib.request.urlopen(url, timeout=self.timeout) as response,
+            ):
+                shutil.copyfileobj(response, out, 1024 * 1024)
+            os.replace(partial, destination)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(partial)
+            raise
+
+    def fetch(self, url):
+        """A local path holding the current contents of ``url``.
+
+        An object without a validator cannot be checked for staleness, and one
+        larger than the whole cache would not fit in it, so neither is cached
+        and ``url`` itself comes back.  Network errors propagate.
+        """
+        validator, size = self._head(url)
+        if validator is None or (size is not None and size > self.limit):
+            return url
+        key = hashlib.sha256(f"{url}\0{validator}".encode()).hexdigest()
+        # Keep the extension: DuckDB picks the reader from it.
+        suffix = "".join(PurePosixPath(urlparse(url).path).suffixes)
+        local = self.root / "objects" / f"{key}{suffix}"
+
+        index = self._index()
+        try:
+            if local.exists():
+                self.hits += 1
+                counter = "hits"
+            else:
+                self._download(url, local)
+                if local.stat().st_size > self.limit:
+                    # The server did not say how big it was.
+                    local.unlink()
+                    return url
+                self.misses += 1
+                counter = "misses"
+            # An upsert rather than an UPDATE on a hit: it also adopts a file
+            # whose downloader died between the rename and the bookkeeping.
+            with index:
+                index.execute(
+                    "INSERT INTO objects VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET last_used = excluded.last_used",
+                    (
+                        key,
+                        url,
+                        validator,
+                        local.name,
+                        local.stat().st_size,
+                        time.time(),
+                    ),
+                )
+                self._count(index, counter)
+                self._evict(index, keep=key)
+            return str(local)
+        finally:
+            index.close()
+
+    def _count(self, index, name):
+        index.execute(
+            "INSERT INTO counters VALUES (?, 1) "
+            "ON CONFLICT (name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def _evict(self, index, keep):
+        """Drop least recently used objects until the cache fits its limit.
+
+        A process already reading an evicted file keeps its open handle; POSIX
+        only reclaims the space once that closes.
+        """
+        (total,) = index.execute(
+            "SELECT coalesce(sum(size), 0) FROM objects"
+        ).fetchone()
+        victims = index.execute(
+            "SELECT key, file, size FROM objects WHERE key != ? ORDER BY last_used",
+            (keep,),
+        )
+        for key, file, size in victims.fetchall():
+            if total <= self.limit:
+                break
+            # Another process may have evicted it first.
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.root / "objects" / file)
+            index.execute("DELETE FROM objects WHERE key = ?", (key,))
+            total -= size
+
+    def stats(self):
+        """Totals across all processes: object count, bytes, hits and misses."""
+        index = self._index()
+        try:
+            objects, size = index.execute(
+                "SELECT count(*), coalesce(sum(size), 0) FROM objects"
+            ).fetchone()
+            counters = dict(index.execute("SELECT name, value FROM counters"))
+        finally:
+            index.close()
+        return {
+            "objects": objects,
+            "bytes": size,
+            "limit": self.limit,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+        }
+
+    def clear(self):
+        """Remove every cached object and reset the counters."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def localize(aliases, names, cache):
+    """Copy of ``aliases`` with the remote sources among ``names`` cached locally.
+
+    Returns ``(aliases, failures)``.  An alias whose fetch fails keeps its URL,
+    so DuckDB still gets the chance to read it (and to report the error); the
+    failures map each such name to the exception.
+    """
+    localized, failures = dict(aliases), {}
+    for name in names:
+        path = aliases[name]
+        if not cacheable(path):
+            continue
+        try:
+            localized[name] = cache.fetch(path)
+        except OSError as e:
+            failures[name] = e
+    return localized, failures
@@ -0,0 +1,145 @@
+"""Persistent alias catalog, so view binding survives between runs.
+
+Without it every query rebinds every alias in ``create_views``, which reads a
+footer (or fetches a URL) per alias even when the query names just one.  The
+catalog is a DuckDB file under ``~/.cache/pksql`` holding one view per alias
+plus a ``bindings`` table recording the path and source fingerprint each view
+was bound against.  A view is only rebound when its ``.pksql`` path or the
+files behind it change.
+
+Each set of alias files (the global ``~/.pksql`` plus a directory's own) gets
+its own schema of views and its own bindings, so moving between projects finds
+every one of them still bound.
+
+The file is attached read-only while a query runs, so any number of pksql
+processes can share it.  Refreshing needs a writer: if another process holds
+the file then, the caller falls back to binding in memory for that run.
+"""
+
+import hashlib
+import os
+
+import duckdb
+
+from pksql import aliases as alias_store
+from pksql.cache import cache_dir
+
+NAME = "pksql_catalog"
+
+_BINDINGS = f"{NAME}.main.bindings"
+
+
+def catalog_file():
+    """Path of the persistent catalog database."""
+    return cache_dir() / "catalog.duckdb"
+
+
+def scope(cwd=None):
+    """The catalog schema holding the views for the aliases read in ``cwd``."""
+    sources = "\0".join(
+        os.path.realpath(source) for source in alias_store.source_files(cwd)
+    )
+    return f"aliases_{hashlib.sha256(sources.encode()).hexdigest()[:16]}"
+
+
+def _bindings(conn, schema):
+    return {
+        name: (path, fingerprint, bound)
+        for name, path, fingerprint, bound in conn.execute(
+            f"SELECT name, path, fingerprint, bound FROM {_BINDINGS} WHERE scope = ?",
+            [schema],
+        ).fetchall()
+    }
+
+
+def _create_tables(conn, schema):
+    """Create the bindings table and ``schema`` if they are missing."""
+    conn.sql(
+        f"CREATE TABLE IF NOT EXISTS {_BINDINGS} (scope VARCHAR, name VARCHAR, "
+        "path VARCHAR, fingerprint VARCHAR, bound BOOLEAN, PRIMARY KEY (scope, name))"
+    )
+    conn.sql(f"CREATE SCHEMA IF NOT EXISTS {NAME}.{schema}")
+
+
+def _stale(bindings, aliases):
+    """Whether ``bindings`` no longer describe ``aliases``."""
+    if set(bindings) != set(aliases):
+        return True
+    return any(
+        bindings[name][:2] != (path, alias_store.fingerprint(path))
+        for name, path in aliases.items()
+    )
+
+
+def _refresh(conn, aliases, schema):
+    """Bring the views and bindings of ``schema`` in line with ``aliases``.
+
+    A path that fails to bind is recorded too, unbound, so a dead alias is
+    not retried on every run, only once its files change.
+    """
+    bindings = _bindings(conn, schema)
+    for name in bindings.keys() - aliases.keys():
+        conn.sql(f'DROP VIEW IF EXISTS {NAME}.{schema}."{name}"')
+        conn.execute(
+            f"DELETE FROM {_BINDINGS} WHERE scope = ? AND name = ?", [schema, name]
+        )
+    for name, path in aliases.items():
+        fingerprint = alias_store.fingerprint(path)
+        if bindings.get(name, ())[:2] == (path, fingerprint):
+            continue
+        try:
+            conn.sql(
+                f'CREATE OR REPLACE VIEW {NAME}.{schema}."{name}" '
+                f"AS SELECT * FROM {alias_store.quote(path)}"
+            )
+        except duckdb.Error:
+            conn.sql(f'DROP VIEW IF EXISTS {NAME}.{schema}."{name}"')
+            bound = False
+        else:
+            bound = True
+        conn.execute(
+            f"INSERT OR REPLACE INTO {_BINDINGS} VALUES (?, ?, ?, ?, ?)",
+            [schema, name, path, fingerprint, bound],
+        )
+
+
+def attach(conn, aliases, path=None, cwd=None):
+    """Make the catalog's views visible on ``conn``, rebinding what changed.
+
+    Returns the alias names that failed to bind, like ``create_views``, or
+    ``None`` if another process holds the catalog while it needs refreshing;
+    the caller should then bind in memory instead.  The catalog is left
+    attached read-only and on the search path behind ``memory``, so statements
+    that create tables still create them in the throwaway in-memory database.
+    """
+    path = catalog_file() if path is None else path
+    schema = scope(cwd)
+    try:
+        alias_store.attach(conn, NAME, path, read_only=True)
+    except duckdb.Error:
+        stale = True  # Not created yet.
+    else:
+        try:
+            stale = _stale(_bindings(conn, schema), aliases)
+        except duckdb.CatalogException:
+            stale = True
+        if stale:
+            conn.sql(f"DETACH {NAME}")
+
+    try:
+        if stale:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            alias_store.attach(conn, NAME, path, read_only=False)
+            _create_tables(conn, schema)
+            _refresh(conn, aliases, schema)
+            conn.sql(f"DETACH {NAME}")
+            alias_store.attach(conn, NAME, path, read_only=True)
+    except (duckdb.IOException, duckdb.BinderException):
+        # Locked by another process, or attached by another connection in
+        # this one.
+        return None
+
+    conn.sql(f"SET search_path = 'memory.main,{NAME}.{schema}'")
+    return [
+        name for name, (_, _, bound) in _bindings(conn, schema).items() if not bound
+    ]
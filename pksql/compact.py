@@ -0,0 +1,120 @@
+"""Rewrite an alias's many small files as a few large, sorted parquet files.
+
+A glob alias that collects a file per job or per minute ends up as thousands
+of small files, each with a footer to read and tiny row groups, and every query
+pays for opening all of them.  ``compact`` reads the alias once and writes it
+back with DuckDB's parallel parquet writer, split into files of about a target
+size and optionally sorted, so that filters on the sort columns can skip whole
+row groups.
+
+The output is written to a staging directory beside its destination and only
+renamed into place once complete, so an interrupted run leaves nothing that
+looks finished.  The original files are never touched: ``pksql compact``
+repoints the alias and leaves deleting them to the user.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from pksql import aliases as alias_store
+
+COMPRESSIONS = ("zstd", "snappy", "gzip", "lz4", "uncompressed")
+DEFAULT_TARGET_SIZE = "512MB"
+
+
+class CompactError(Exception):
+    """Raised when an alias cannot be compacted."""
+
+
+def _static_prefix(path):
+    """The longest leading part of ``path`` without glob characters."""
+    parts = []
+    for part in Path(path).parts:
+        if any(ch in part for ch in "*?["):
+            break
+        parts.append(part)
+    return Path(*parts)
+
+
+def destination(path, name):
+    """Where a compacted copy of ``path`` goes by default.
+
+    A glob ``results/*.parquet`` becomes ``results-<name>-compacted-<time>``
+    beside ``results``; a single file gets that directory beside itself.
+    """
+    stamp = time.strftime("%Y%m%dT%H%M%S")
+    if alias_store.is_glob(path):
+        root = _static_prefix(path)
+    else:
+        root = Path(path).parent / Path(path).stem
+    return root.parent / f"{root.name}-{name}-compacted-{stamp}"
+
+
+def source(path):
+    """A ``FROM`` clause reading the files behind alias ``path``.
+
+    Raises ``CompactError`` unless ``path`` is local files DuckDB reads with
+    one of ``alias_store.READERS``.
+    """
+    if "://" in path:
+        raise CompactError(f"{path} is remote; only local files can be compacted")
+    if alias_store.is_database(path):
+        raise CompactError(f"{path} is a DuckDB database, not data files")
+    paths = alias_store.files(path)
+    if not paths:
+        raise CompactError(f"nothing matches {path}")
+    scan = alias_store.scan_sql(paths)
+    if scan is None:
+        raise CompactError(f"{path} matches files of different or unknown kinds")
+    return scan
+
+
+def scan_seconds(conn, scan):
+    """Time one pass over every column of ``scan``."""
+    start_time = time.perf_counter()
+    conn.sql(f"SELECT count(COLUMNS(*)) FROM {scan}").fetchall()
+    return time.perf_counter() - start_time
+
+
+def compact(conn, scan, out, target_size, sort_by=(), compression="zstd"):
+    """Write the rows of ``scan`` to parquet files in the new directory ``out``.
+
+    Files are cut at about ``target_size`` bytes.  The rows are sorted by the
+    ``sort_by`` columns first, if any.  Raises ``CompactError`` if ``out``
+    exists or a sort column is unknown; a failed write leaves no ``out``.
+    """
+    out = Path(out)
+    if out.exists():
+        raise CompactError(f"{out} already exists")
+    columns = {
+        column.lower(): column
+        for column in conn.sql(f"SELECT * FROM {scan} LIMIT 0").columns
+    }
+    unknown = [column for column in sort_by if column.lower() not in columns]
+    if unknown:
+        raise CompactError(
+            f"no column {unknown[0]!r} to sort by; "
+            f"the columns are {', '.join(columns.values())}"
+        )
+    order = ", ".join(
+        alias_store.quote_identifier(columns[column.lower()]) for column in sort_by
+    )
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{out.name}-", dir=out.parent)
+    try:
+        conn.sql(
+            f"COPY (SELECT * FROM {scan}{f' ORDER BY {order}' if order else ''}) "
+            f"TO {alias_store.quote(staging)} (FORMAT parquet, "
+            f"FILE_SIZE_BYTES {target_size}, COMPRESSION {compression}, "
+            "FILENAME_PATTERN 'part_{i}', "
+            "OVERWRITE_OR_IGNORE)"
+        )
+        os.rename(staging, out)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return str(out / "*.parquet")
@@ -10,6 +10,7 @@ import base64
 import csv
 import io
 import json
+import re
 import time
 from datetime import date, datetime
 from datetime import time as time_type
@@ -17,6 +18,8 @@ from decimal import Decimal
 
 import duckdb
 
+from pksql import aliases as alias_store
+
 
 def json_serializer(obj):
     """Custom JSON serializer for objects ``json`` can't handle natively."""
@@ -40,12 +43,41 @@ def format_elapsed(elapsed):
     return f"{elapsed:.3f} sec"
 
 
-def render_result(result, output_format):
+_SIZE_RE = re.compile(r"\s*(\d+(?:\.\d+)?)\s*([KMGTP]?)(i?B?)\s*\Z", re.I)
+
+
+def parse_size(text):
+    """Parse a byte count such as ``512MB``, ``1.5GiB`` or ``1024`` into an int.
+
+    Units are binary (``1KB`` is 1024 bytes), matching DuckDB's own settings.
+    Raises ``ValueError`` for anything else.
+    """
+    match = _SIZE_RE.match(str(text))
+    if not match:
+        raise ValueError(f"{text!r} is not a size (try 512MB or 50GB)")
+    number, unit, _ = match.groups()
+    return int(float(number) * 1024 ** " KMGTP".index(unit.upper() or " "))
+
+
+def format_size(size):
+    """Format a byte count as a human-readable string."""
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if abs(size) < 1024 or unit == "TiB":
+            break
+        size /= 1024
+    return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+
+
+def render_result(result, output_format, stats=None):
     """Render a DuckDB result for ``output_format``.
 
     Returns the text to print to stdout, or ``None`` when the statement
     produced no result set (e.g. DDL such as ``CREATE``/``COPY``), in which
-    case the caller decides how to report success.
+    case the caller decides how to report success.  If ``stats`` is a dict,
+    ``stats["rows"]`` is set to the number of rows in the result.  DuckDB's box
+    drawing does not say, so for ``table`` output that takes a ``count(*)``
+    over the result first, which runs the query again; pass ``stats`` only
+    when the count is wanted.
     """
     is_query = (
         result is not None and hasattr(result, "columns") and bool(result.columns)
@@ -54,6 +86,8 @@ def render_result(result, output_format):
         return None
 
     if output_format == "table":
+        if stats is not None:
+            (stats["rows"],) = result.aggregate("count(*)").fetchone()
         # DuckDB renders a nicely boxed table via its string representation.
         return str(result)
     if output_format in ("csv", "tsv"):
@@ -63,28 +97,116 @@ def render_result(result, output_format):
         # empty field rather than the literal string "None".
         buffer = io.StringIO()
         writer = csv.writer(buffer, delimiter=delimiter, lineterminator="\n")
+        rows = result.fetchall()
+        if stats is not None:
+            stats["rows"] = len(rows)
         writer.writerow(result.columns)
-        writer.writerows(result.fetchall())
+        writer.writerows(rows)
         return buffer.getvalue().rstrip("\n")
     if output_format == "json":
         rows = [dict(zip(result.columns, row)) for row in result.fetchall()]
+        if stats is not None:
+            stats["rows"] = len(rows)
         return json.dumps(rows, default=json_serializer)
     return None
 
 
-def execute_query(sql, conn=None, output_format="table"):
+def execute_query(sql, conn=None, output_format="table", params=None, stats=None):
     """Execute ``sql`` and return ``(output, time_str)``.
 
     ``output`` is the rendered result text for a result-producing query, or
     ``None`` for statements that return no rows (callers decide how to report
     success).  ``conn`` defaults to DuckDB's global in-memory connection.
-    ``time_str`` is the formatted elapsed execution time.
+    ``params`` maps ``$name`` placeholders to values, bound by DuckDB rather
+    than pasted into the SQL.  ``time_str`` is the formatted elapsed execution
+    time.  A ``stats`` dict receives the raw ``seconds`` and the ``rows``
+    rendered (see ``render_result``).
     """
     executor = conn if conn is not None else duckdb
     # perf_counter is monotonic, so NTP/DST wall-clock adjustments can't skew
     # (or negate) the measured duration.
     start_time = time.perf_counter()
-    result = executor.sql(sql)
-    output = render_result(result, output_format)
-    time_str = format_elapsed(time.perf_counter() - start_time)
-    return output, time_str
+    result = executor.sql(sql, params=params) if params else executor.sql(sql)
+    output = render_result(result, output_format, stats)
+    elapsed = time.perf_counter() - start_time
+    if stats is not None:
+        stats["seconds"] = elapsed
+    return output, format_elapsed(elapsed)
+
+
+SWEEP_STATEMENT = "pksql_sweep"
+
+
+def _literal(value):
+    """``value`` as a SQL string literal, or ``NULL``."""
+    return "NULL" if value is None else alias_store.quote(value)
+
+
+def sweep(sql, rows, conn, output_format="table"):
+    """Run ``sql`` once per parameter set in ``rows``, yielding rendered output.
+
+    Each row maps ``$name`` placeholders to values.  The statement is prepared
+    once and executed per row, so parsing and binding are paid once however
+    long the sweep.  Values are passed as string literals, exactly as
+    ``execute_query`` binds them.  Only the parameters ``sql`` uses are
+    passed; other values in a row just label its result.
+
+    Each result carries the row's values as leading columns, named ``$name``
+    where the result has a column ``name`` of its own.  ``csv``, ``tsv`` and
+    ``json`` chunks together form a single document (one header, one array),
+    while ``table`` yields a table per row.  Statements producing no result
+    set yield nothing.
+    """
+    statements = conn.extract_statements(sql)
+    used = {name.lower() for name in statements[0].named_parameters}
+    conn.execute(f"PREPARE {SWEEP_STATEMENT} AS {sql}")
+    header = False
+    if output_format == "json":
+        yield "["
+    for row in rows:
+        for name in row:
+            # Names are spliced into the EXECUTE statement.
+            if not alias_store.NAME_RE.match(str(name)):
+                raise ValueError(f"{name!r} is not a valid parameter name")
+        args = ", ".join(
+            f"{name} := {_literal(value)}"
+            for name, value in row.items()
+            if name.lower() in used
+        )
+        result = conn.sql(f"EXECUTE {SWEEP_STATEMENT}({args})")
+        if result is None or not result.columns:
+            continue
+        own = {column.lower() for column in result.columns}
+        tagged = result.select(
+            *(
+                duckdb.ConstantExpression(value).alias(
+                    f"${name}" if name.lower() in own else name
+                )
+                for name, value in row.items()
+            ),
+            duckdb.StarExpression(),
+        )
+        if output_format in ("csv", "tsv"):
+            buffer = io.StringIO()
+            writer = csv.writer(
+                buffer,
+                delimiter="," if output_format == "csv" else "\t",
+                lineterminator="\n",
+            )
+            if not header:
+                writer.writerow(tagged.columns)
+                header = True
+            writer.writerows(tagged.fetchall())
+            if buffer.getvalue():
+                yield buffer.getvalue().rstrip("\n")
+        elif output_format == "json":
+            for values in tagged.fetchall():
+                text = json.dumps(
+                    dict(zip(tagged.columns, values)), default=json_serializer
+                )
+                yield f"{',' if header else ''}{text}"
+                header = True
+        else:
+            yield render_result(tagged, output_format)
+    if output_format == "json":
+        yield "]"
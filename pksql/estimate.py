@@ -0,0 +1,244 @@
+"""Estimate how much a query will read, before running it.
+
+Nothing otherwise stops a ``SELECT *`` over an alias that resolves to
+terabytes until the machine gives out.  ``estimate`` sizes a query up front,
+cheaply enough to do before every run: ``EXPLAIN`` gives the scans in its plan
+and the columns each one reads, file sizes on disk bound the rest, and parquet
+footers give each column's compressed size and the row counts.  For a large
+glob only a sample of the footers is read and the rest extrapolated by file
+size.
+
+A plan does not say which alias a scan reads, so each scan is put down to the
+alias of the same kind that has all the columns it reads, or to the largest of
+several.  An alias counts once however often the query scans it.
+
+The figures are upper bounds of a sort.  They leave out row groups a filter
+lets DuckDB skip and whatever an index saves; a query a rollup answers should
+be estimated as rewritten.  A CSV or JSON file is read whole whichever columns
+are used, as is a database alias's file, and their row counts are DuckDB's own
+guesses.  Remote aliases are not sized.
+"""
+
+import json
+import os
+import re
+
+import duckdb
+
+from pksql import aliases as alias_store
+
+# Parquet footers read per alias; the rest of a larger glob is extrapolated.
+FOOTER_SAMPLE = 64
+
+# Plan operators that read an alias's files, by the reader they stand for.
+# DuckDB names them after the table function actually bound, which varies.
+_FILE_SCANS = (("PARQUET", "read_parquet"), ("CSV", "read_csv"), ("JSON", "read_json"))
+_TABLE_SCANS = ("SEQ_SCAN", "TABLE_SCAN")
+
+
+class Scan:
+    """What the query reads of alias ``name``: ``bytes`` of its ``files``.
+
+    ``rows`` is the number of rows behind those bytes, or ``None`` if unknown.
+    """
+
+    def __init__(self, name, files, bytes, rows):
+        self.name = name
+        self.files = files
+        self.bytes = bytes
+        self.rows = rows
+
+
+def _reader(path):
+    """The ``alias_store.READERS`` function for a file ``path``, or ``None``."""
+    stem = re.sub(r"\.(gz|zst)\Z", "", path.lower())
+    return alias_store.READERS.get(os.path.splitext(stem)[1])
+
+
+def _as_list(value):
+    if isinstance(value, list):
+        return value
+    return [value] if value else []
+
+
+def _walk(node):
+    yield node
+    for child in node.get("children", []):
+        yield from _walk(child)
+
+
+def _identifiers(text):
+    """The lowercased identifiers in expression ``text``."""
+    for token, kind in alias_store.tokens(text):
+        if kind != duckdb.token_type.identifier:
+            continue
+        if len(token) >= 2 and token[0] == token[-1] == '"':
+            token = token[1:-1].replace('""', '"')
+        yield token.lower()
+
+
+def plan_scans(conn, sql, params=None):
+    """``(operator, extra_info)`` for every scan in the plan of ``sql``.
+
+    Returns ``None`` if ``sql`` cannot be planned as it stands, such as when a
+    parameter has no value yet.
+    """
+    try:
+        statements = conn.extract_statements(sql)
+        if len(statements) != 1:
+            return None
+        if set(statements[0].named_parameters) - set(params or {}):
+            return None
+        rows = conn.execute(f"EXPLAIN (FORMAT json) {sql}", params or None).fetchall()
+    except duckdb.Error:
+        return None
+    scans = []
+    for _, plan in rows:
+        for root in json.loads(plan):
+            for node in _walk(root):
+                info = node.get("extra_info") or {}
+                if isinstance(info, dict) and (
+                    node["name"] in _TABLE_SCANS or "Function" in info
+                ):
+                    scans.append((node["name"], info))
+    return scans
+
+
+def _parquet(conn, paths, columns):
+    """``(bytes, rows)`` for reading the top-level ``columns`` of parquet ``paths``."""
+    if len(paths) > FOOTER_SAMPLE:
+        sample = [paths[i * len(paths) // FOOTER_SAMPLE] for i in range(FOOTER_SAMPLE)]
+    else:
+        sample = paths
+    size, rows = conn.execute(
+        "SELECT (SELECT coalesce(sum(total_compressed_size), 0) "
+        "FROM parquet_metadata($paths) "
+        "WHERE list_contains($columns, lower(split_part(path_in_schema, ', ', 1)))), "
+        "(SELECT coalesce(sum(num_rows), 0) FROM parquet_file_metadata($paths))",
+        {"paths": sample, "columns": sorted(columns)},
+    ).fetchone()
+    scale = sum(map(os.path.getsize, paths)) / max(1, sum(map(os.path.getsize, sample)))
+    return int(size * scale), int(rows * scale)
+
+
+class _Alias:
+    """A file or database alias the query names, as far as sizing it goes."""
+
+    def __init__(self, conn, name, path):
+        self.name = name
+        self.files = alias_store.files(path)
+        self.bytes = sum(map(os.path.getsize, self.files))
+        self.database = alias_store.is_database(path)
+        readers = {_reader(file) for file in self.files}
+        self.reader = readers.pop() if len(readers) == 1 else None
+        self.columns = set()
+        if not self.database:
+            try:
+                relation = conn.sql(f'SELECT * FROM "{name}" LIMIT 0')
+            except duckdb.Error:
+                pass
+            else:
+                self.columns = {column.lower() for column in relation.columns}
+        self.read = None  # Columns read, for a file alias the query scans.
+        self.scanned = set()  # Files scanned, for a database alias.
+        self.cardinality = 0
+
+    def reads(self, reader, columns):
+        """Whether a scan of ``reader`` over ``columns`` could be this alias's."""
+        if self.database or self.reader not in (None, reader):
+            return False
+        return all(
+            column in self.columns
+            or any(column.startswith(f"{name}.") for name in self.columns)
+            for column in columns
+        )
+
+    def catalog_file(self, catalog):
+        """The file behind attached ``catalog``, if it is one of this alias's."""
+        if not self.database:
+            return None
+        if catalog == self.name.lower() and len(self.files) == 1:
+            return self.files[0]
+        prefix = f"{alias_store.SHARD_PREFIX}_{self.name}_".lower()
+        if catalog.startswith(prefix) and catalog[len(prefix) :].isdigit():
+            index = int(catalog[len(prefix) :])
+            if index < len(self.files):
+                return self.files[index]
+        return None
+
+    def scan(self, conn):
+        """The ``Scan`` of this alias, or ``None`` if the query does not read it."""
+        if not self.files:
+            return None
+        if self.database:
+            if not self.scanned:
+                return None
+            files = sorted(self.scanned)
+            return Scan(
+                self.name,
+                len(files),
+                sum(map(os.path.getsize, files)),
+                self.cardinality,
+            )
+        if self.read is None:
+            return None
+        if self.reader == "read_parquet":
+            # Match struct fields like "s.a" to the column "s" they are in.
+            top = {
+                name
+                for name in self.columns
+                for column in self.read
+                if column == name or column.startswith(f"{name}.")
+            }
+            size, rows = _parquet(conn, self.files, top)
+            return Scan(self.name, len(self.files), size, rows)
+        return Scan(self.name, len(self.files), self.bytes, self.cardinality or None)
+
+
+def estimate(conn, sql, aliases, names, params=None):
+    """``(scans, unsized)`` for running ``sql`` on ``conn``.
+
+    ``conn`` has the aliases bound and ``names`` are those the query uses.
+    ``scans`` holds a ``Scan`` per alias the query reads; ``unsized`` names the
+    remote aliases it uses, which are left out.  If ``sql`` cannot be planned,
+    every column of every alias it names is counted.
+    """
+    unsized = [name for name in names if "://" in aliases[name]]
+    local = [_Alias(conn, name, aliases[name]) for name in names if name not in unsized]
+    scans = plan_scans(conn, sql, params)
+    if scans is None:
+        for alias in local:
+            alias.read = alias.columns
+            if alias.database:
+                alias.scanned.update(alias.files)
+        return [scan for alias in local if (scan := alias.scan(conn))], unsized
+
+    for operator, info in scans:
+        cardinality = int(info.get("Estimated Cardinality") or 0)
+        if operator in _TABLE_SCANS:
+            catalog = str(info.get("Table", "")).split(".")[0].strip('"').lower()
+            for alias in local:
+                file = alias.catalog_file(catalog)
+                if file is not None:
+                    alias.scanned.add(file)
+                    alias.cardinality += cardinality
+            continue
+        function = str(info["Function"]).upper()
+        reader = next(
+            (reader for marker, reader in _FILE_SCANS if marker in function), None
+        )
+        if reader is None:
+            continue
+        columns = {column.lower() for column in _as_list(info.get("Projections"))}
+        candidates = [alias for alias in local if alias.reads(reader, columns)]
+        if not candidates:
+            continue
+        owner = max(candidates, key=lambda alias: alias.bytes)
+        # Filter columns may be read without being projected.
+        for text in _as_list(info.get("Filters")):
+            columns.update(
+                name for name in _identifiers(str(text)) if name in owner.columns
+            )
+        owner.read = (owner.read or set()) | columns
+        owner.cardinality = max(owner.cardinality, cardinality)
+    return [scan for alias in local if (scan := alias.scan(conn))], unsized
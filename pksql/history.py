@@ -0,0 +1,164 @@
+"""Opt-in log of the queries pksql ran, for spotting performance regressions.
+
+Each run appends one JSON object to ``~/.cache/pksql/history.ndjson``:
+when it finished (in UTC), the normalized SQL and its fingerprint, the
+aliases it named and the size of the files behind them, the rows it returned,
+how long setup, waiting for a slot (``--max-concurrent``) and execution took,
+the process's peak memory, and whether it failed.
+
+Newline-delimited JSON rather than a DuckDB file, because any number of
+pksql processes may finish at once: a single ``O_APPEND`` write of one line is
+atomic, whereas a DuckDB database admits one writer at a time.  DuckDB reads it
+back just as easily, which is what ``pksql history`` does.
+"""
+
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+import duckdb
+
+from pksql import __version__
+from pksql import aliases as alias_store
+from pksql.cache import cache_dir
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+VIEW = "history"
+
+# Spelled out so that a column which has only ever been NULL is still typed.
+COLUMNS = {
+    "finished": "TIMESTAMP",  # UTC
+    "fingerprint": "VARCHAR",
+    "sql": "VARCHAR",
+    "aliases": "VARCHAR[]",
+    "input_files": "BIGINT",
+    "input_bytes": "BIGINT",
+    "rows": "BIGINT",
+    "setup_seconds": "DOUBLE",
+    "queue_seconds": "DOUBLE",
+    "query_seconds": "DOUBLE",
+    "peak_memory_bytes": "BIGINT",
+    "error": "VARCHAR",
+    "version": "VARCHAR",
+}
+
+# Summary per fingerprint and day, for `pksql history --stats`.
+STATS_SQL = f"""
+SELECT
+    fingerprint,
+    CAST(finished AS DATE) AS day,
+    count(*) AS runs,
+    round(quantile_cont(query_seconds, 0.5), 4) AS p50_seconds,
+    round(quantile_cont(query_seconds, 0.95), 4) AS p95_seconds,
+    max(input_bytes) AS input_bytes,
+    any_value(sql) AS sql
+FROM {VIEW}
+WHERE error IS NULL
+GROUP BY ALL
+ORDER BY fingerprint, day
+"""
+
+RECENT_SQL = f"""
+SELECT finished, fingerprint, round(query_seconds, 4) AS query_seconds, rows,
+    input_files, input_bytes, error IS NULL AS ok, sql
+FROM {VIEW}
+ORDER BY finished DESC
+LIMIT ?
+"""
+
+
+def history_file():
+    """Path of the query history log."""
+    return cache_dir() / "history.ndjson"
+
+
+def normalize(sql):
+    """``(normalized SQL, fingerprint)`` for ``sql``.
+
+    Normalizing drops comments and collapses whitespace and keyword case; the
+    fingerprint also ignores literal values, so one query run for different
+    dates or ids groups together.  Both come from DuckDB's tokenizer, which
+    accepts any statement without binding it.
+    """
+    words, shape = [], []
+    for text, kind in alias_store.tokens(sql):
+        if kind == duckdb.token_type.keyword:
+            text = text.upper()
+        words.append(text)
+        literal = kind in (
+            duckdb.token_type.string_const,
+            duckdb.token_type.numeric_const,
+        )
+        shape.append("?" if literal else text)
+    fingerprint = hashlib.sha256(" ".join(shape).encode()).hexdigest()[:16]
+    return " ".join(words), fingerprint
+
+
+def peak_memory():
+    """The process's peak resident set size in bytes, or ``None`` if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def entry(sql, aliases, setup_seconds, stats, error=None):
+    """The history record for one run of ``sql``.
+
+    ``aliases`` are the ``{name: path}`` the query named and ``stats`` is what
+    ``execute_query`` filled in (empty if it failed).
+    """
+    normalized, fingerprint = normalize(sql)
+    # Naive UTC: DuckDB hands TIMESTAMPTZ to Python only if pytz is around.
+    finished = datetime.now(timezone.utc).replace(tzinfo=None)
+    input_files, input_bytes = alias_store.footprint(aliases.values())
+    return {
+        "finished": finished.isoformat(timespec="milliseconds"),
+        "fingerprint": fingerprint,
+        "sql": normalized,
+        "aliases": sorted(aliases),
+        "input_files": input_files,
+        "input_bytes": input_bytes,
+        "rows": stats.get("rows"),
+        "setup_seconds": setup_seconds,
+        "queue_seconds": stats.get("queue_seconds"),
+        "query_seconds": stats.get("seconds"),
+        "peak_memory_bytes": peak_memory(),
+        "error": None if error is None else str(error),
+        "version": __version__,
+    }
+
+
+def record(item, path=None):
+    """Append ``item`` to the history log as one line."""
+    path = history_file() if path is None else path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    line = (json.dumps(item) + "\n").encode()
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def create_view(conn, path=None):
+    """Expose the log on ``conn`` as the view ``history``.
+
+    Returns ``False`` if nothing has been recorded yet.
+    """
+    path = history_file() if path is None else path
+    if not path.exists():
+        return False
+    columns = ", ".join(f"{name}: '{kind}'" for name, kind in COLUMNS.items())
+    conn.sql(
+        f"CREATE VIEW {VIEW} AS SELECT * FROM read_json({alias_store.quote(path)}, "
+        f"format = 'newline_delimited', columns = {{{columns}}})"
+    )
+    return True
@@ -0,0 +1,481 @@
+"""Sidecar key indexes, so a point lookup reads only the row groups it needs.
+
+Looking up one ``id`` in a big glob alias makes DuckDB read every file's
+footer and, unless the files happen to be sorted by ``id``, the ``id`` column
+chunk of nearly every row group.  ``pksql index hits id`` records, for each
+parquet row group behind ``hits``, the hash of every ``id`` value in it.  A
+query that filters the alias on ``id = <value>`` or ``id IN (<values>)`` is
+then run against a view of just the row groups holding one of those hashes
+(see ``prune``), which DuckDB reads by row number.  Any other row group cannot
+match, so the answer is unchanged; a hash collision only costs a row group
+read for nothing.
+
+The index lives in ``~/.cache/pksql/indexes.duckdb`` with a manifest of the
+files it covers (name, size and modification time).  It is brought up to date
+incrementally: only files added or changed since are read, and the entries of
+removed files dropped.  A lookup only reads the index, so any number of
+queries share it; indexing new files takes it for writing, and a query that
+finds it held by another process reads the files not yet covered in full.
+"""
+
+import os
+
+import duckdb
+
+from pksql import aliases as alias_store
+from pksql import partials
+from pksql.cache import cache_dir
+
+NAME = "pksql_indexes"
+
+# A pruned alias is a union of one scan per run of adjacent row groups; past
+# this many, whole files are read instead, as planning each scan costs too.
+MAX_RANGES = 64
+# Files are indexed this many at a time, bounding the memory a refresh needs.
+BATCH_FILES = 64
+
+# Column types whose equality is not equality of their hashes (-0.0 and 0.0,
+# NaN), or that a literal cannot be compared with exactly.
+UNINDEXABLE = ("FLOAT", "DOUBLE", "REAL")
+_NUMERIC = {
+    "TINYINT",
+    "SMALLINT",
+    "INTEGER",
+    "BIGINT",
+    "HUGEINT",
+    "UTINYINT",
+    "USMALLINT",
+    "UINTEGER",
+    "UBIGINT",
+    "UHUGEINT",
+    "DECIMAL",
+}
+
+_INDEXES = f"{NAME}.main.indexes"
+_FILES = f"{NAME}.main.files"
+_ROW_GROUPS = f"{NAME}.main.row_groups"
+_ENTRIES = f"{NAME}.main.entries"
+
+
+class IndexingError(Exception):
+    """Raised when an alias or column cannot be indexed."""
+
+
+def indexes_file():
+    """Path of the database the indexes are kept in."""
+    return cache_dir() / "indexes.duckdb"
+
+
+def _listed(paths):
+    return "[{}]".format(", ".join(alias_store.quote(path) for path in paths))
+
+
+def parquet_files(path):
+    """The parquet files behind alias ``path``; ``IndexingError`` if not all are."""
+    if "://" in path:
+        raise IndexingError(f"{path} is remote; only local files can be indexed")
+    paths = alias_store.files(path)
+    if not paths:
+        raise IndexingError(f"nothing matches {path}")
+    if not all(name.lower().endswith(".parquet") for name in paths):
+        raise IndexingError(f"{path} is not all parquet files")
+    return paths
+
+
+def _stats(paths):
+    """``{file: (size, mtime_ns)}``, what the manifest compares against."""
+    stats = {}
+    for name in paths:
+        stat = os.stat(name)
+        stats[name] = (stat.st_size, stat.st_mtime_ns)
+    return stats
+
+
+def _column_type(conn, paths, column):
+    """``(column as spelled in the files, its type)``, or ``IndexingError``."""
+    described = conn.sql(
+        f"DESCRIBE SELECT * FROM read_parquet({_listed(paths)}, union_by_name=true)"
+    ).fetchall()
+    for name, kind, *_ in described:
+        if name.lower() == column.lower():
+            nested = kind.endswith("]") or kind.startswith(("STRUCT", "MAP", "UNION"))
+            if kind in UNINDEXABLE or nested:
+                raise IndexingError(f"cannot index {name}, a {kind} column")
+            return name, kind
+    columns = ", ".join(name for name, *_ in described)
+    raise IndexingError(f"no column {column!r}; the columns are {columns}")
+
+
+def _create_tables(conn):
+    for ddl in (
+        f"{_INDEXES} (path VARCHAR, column_name VARCHAR, column_type VARCHAR, "
+        "version VARCHAR, PRIMARY KEY (path, column_name))",
+        f"{_FILES} (path VARCHAR, column_name VARCHAR, file VARCHAR, "
+        "size BIGINT, mtime_ns BIGINT)",
+        f"{_ROW_GROUPS} (path VARCHAR, column_name VARCHAR, file VARCHAR, "
+        "row_group BIGINT, first_row BIGINT, num_rows BIGINT)",
+        f"{_ENTRIES} (path VARCHAR, column_name VARCHAR, file VARCHAR, "
+        "row_group BIGINT, key UBIGINT)",
+    ):
+        conn.sql(f"CREATE TABLE IF NOT EXISTS {ddl}")
+
+
+def _manifest(conn, path, column):
+    return {
+        file: (size, mtime_ns)
+        for file, size, mtime_ns in conn.execute(
+            f"SELECT file, size, mtime_ns FROM {_FILES} "
+            "WHERE path = ? AND column_name = ?",
+            [path, column],
+        ).fetchall()
+    }
+
+
+def _index_files(conn, path, column, paths, stats):
+    """Add ``paths`` to the index of ``column``; ``conn`` has it attached writable."""
+    key = [path, column]
+    conn.execute(
+        f"INSERT INTO {_ROW_GROUPS} SELECT ?, ?, file_name, row_group_id, "
+        "sum(row_group_num_rows) OVER (PARTITION BY file_name ORDER BY row_group_id) "
+        "- row_group_num_rows, row_group_num_rows "
+        f"FROM (SELECT DISTINCT file_name, row_group_id, row_group_num_rows "
+        f"FROM parquet_metadata({_listed(paths)}))",
+        key,
+    )
+    # Each row's group is the last one starting at or before it.
+    conn.execute(
+        f"INSERT INTO {_ENTRIES} SELECT DISTINCT ?, ?, r.filename, g.row_group, "
+        f"hash(r.{alias_store.quote_identifier(column)}) AS key "
+        f"FROM read_parquet({_listed(paths)}, filename=true, file_row_number=true, "
+        "union_by_name=true) r "
+        f"ASOF JOIN (SELECT * FROM {_ROW_GROUPS} WHERE path = ? AND column_name = ?) g "
+        "ON r.filename = g.file AND r.file_row_number >= g.first_row "
+        "ORDER BY key",
+        key + key,
+    )
+    conn.executemany(
+        f"INSERT INTO {_FILES} VALUES (?, ?, ?, ?, ?)",
+        [key + [name, *stats[name]] for name in paths],
+    )
+
+
+def _update(conn, path, column):
+    """Bring the index of ``column`` up to date; returns ``(added, removed)``."""
+    key = [path, column]
+    current = _stats(parquet_files(path))
+    indexed = _manifest(conn, path, column)
+    removed = [name for name, stat in indexed.items() if current.get(name) != stat]
+    added = [name for name, stat in current.items() if indexed.get(name) != stat]
+    for table in (_FILES, _ROW_GROUPS, _ENTRIES):
+        conn.execute(
+            f"DELETE FROM {table} WHERE path = ? AND column_name = ? "
+            "AND list_contains(?, file)",
+            key + [removed],
+        )
+    for start in range(0, len(added), BATCH_FILES):
+        _index_files(conn, path, column, added[start : start + BATCH_FILES], current)
+    return len(added), len(removed)
+
+
+def build(conn, path, column, db=None):
+    """Create or update the index of ``column`` over alias ``path``.
+
+    Returns ``(files indexed, files dropped)``.  Raises ``IndexingError`` if
+    the alias or column cannot be indexed, or another process holds the
+    database.
+    """
+    db = indexes_file() if db is None else db
+    paths = parquet_files(path)
+    column, kind = _column_type(conn, paths, column)
+    db.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        alias_store.attach(conn, NAME, db, read_only=False)
+    except (duckdb.IOException, duckdb.BinderException):
+        raise IndexingError("another pksql is using the indexes; try again") from None
+    try:
+        _create_tables(conn)
+        previous = conn.execute(
+            f"SELECT column_type, version FROM {_INDEXES} "
+            "WHERE path = ? AND lower(column_name) = lower(?)",
+            [path, column],
+        ).fetchone()
+        if previous != (kind, duckdb.__version__):
+            # Hashes are only comparable from the same type and DuckDB.
+            _drop(conn, path, column)
+            conn.execute(
+                f"INSERT INTO {_INDEXES} VALUES (?, ?, ?, ?)",
+                [path, column, kind, duckdb.__version__],
+            )
+        return _update(conn, path, column)
+    finally:
+        conn.sql(f"DETACH {NAME}")
+
+
+def _drop(conn, path, column):
+    for table in (_INDEXES, _FILES, _ROW_GROUPS, _ENTRIES):
+        conn.execute(
+            f"DELETE FROM {table} WHERE path = ? AND lower(column_name) = lower(?)",
+            [path, column],
+        )
+
+
+def drop(conn, path, column, db=None):
+    """Forget the index of ``column`` over alias ``path``, if there is one."""
+    db = indexes_file() if db is None else db
+    if not db.exists():
+        return
+    try:
+        alias_store.attach(conn, NAME, db, read_only=False)
+    except (duckdb.IOException, duckdb.BinderException):
+        raise IndexingError("another pksql is using the indexes; try again") from None
+    try:
+        _create_tables(conn)
+        _drop(conn, path, column)
+    finally:
+        conn.sql(f"DETACH {NAME}")
+
+
+def listed(conn, db=None):
+    """``[(path, column, type, files)]`` for every index, read-only."""
+    db = indexes_file() if db is None else db
+    try:
+        alias_store.attach(conn, NAME, db, read_only=True)
+    except duckdb.Error:
+        return []
+    try:
+        return conn.sql(
+            f"SELECT i.path, i.column_name, i.column_type, count(f.file) "
+            f"FROM {_INDEXES} i LEFT JOIN {_FILES} f USING (path, column_name) "
+            "GROUP BY ALL ORDER BY ALL"
+        ).fetchall()
+    except duckdb.CatalogException:
+        return []
+    finally:
+        conn.sql(f"DETACH {NAME}")
+
+
+def _filters(node, name):
+    """``{column: [value expressions]}`` from equality filters on alias ``name``.
+
+    Only the top-level ``WHERE`` of a query reading ``name`` once, and nothing
+    else, counts: the alias is replaced wholesale, so every use must be
+    filtered the same way.
+    """
+    if node is None or node["type"] != "SELECT_NODE":
+        return {}
+    source = node["from_table"]
+    reads = [
+        part
+        for part in partials.walk(node)
+        if part.get("type") == "BASE_TABLE"
+        and part.get("table_name", "").lower() == name.lower()
+        and not part.get("schema_name")
+        and not part.get("catalog_name")
+    ]
+    if reads != [source] or node["where_clause"] is None:
+        return {}
+    qualifiers = {name.lower(), source["alias"].lower()} - {""}
+
+    def column_of(expression):
+        if expression["class"] != "COLUMN_REF":
+            return None
+        names = expression["column_names"]
+        if len(names) == 1 or (len(names) == 2 and names[0].lower() in qualifiers):
+            return names[-1].lower()
+        return None
+
+    def is_value(expression):
+        return expression["class"] in ("CONSTANT", "PARAMETER")
+
+    where = node["where_clause"]
+    conjuncts = where["children"] if where["type"] == "CONJUNCTION_AND" else [where]
+    filters = {}
+    for conjunct in conjuncts:
+        if conjunct["type"] == "COMPARE_EQUAL":
+            pair = (conjunct["left"], conjunct["right"])
+            for column, value in (pair, pair[::-1]):
+                if column_of(column) and is_value(value):
+                    filters.setdefault(column_of(column), []).append([value])
+        elif conjunct["type"] == "COMPARE_IN":
+            column, *values = conjunct["children"]
+            if column_of(column) and all(is_value(value) for value in values):
+                filters.setdefault(column_of(column), []).append(values)
+    return filters
+
+
+def _keys(conn, values, kind, params):
+    """The hashes of ``values`` as column type ``kind``, or ``None`` if unsure.
+
+    DuckDB casts a string literal or ``$parameter`` (pksql binds those as
+    strings) to the column's type, and a number to a numeric column's, so the
+    same cast finds the same hash.  Anything else, and any value that does not
+    cast, is left to DuckDB.
+    """
+    numeric = kind.split("(")[0] in _NUMERIC
+    for value in values:
+        if value["class"] == "CONSTANT":
+            literal = value["value"]["type"]["id"]
+            if literal != "VARCHAR" and not (numeric and literal in _NUMERIC):
+                return None
+    used = {value["identifier"] for value in values if value["class"] == "PARAMETER"}
+    expressions = [partials.expression_sql(conn, value) for value in values]
+    casts = [f"TRY_CAST({expression} AS {kind})" for expression in expressions]
+    failed = " OR ".join(
+        f"({cast} IS NULL AND {expression} IS NOT NULL)"
+        for cast, expression in zip(casts, expressions)
+    )
+    try:
+        keys, uncast = conn.execute(
+            f"SELECT [{', '.join(f'hash({cast})' for cast in casts)}], {failed}",
+            {name: (params or {})[name] for name in used} or None,
+        ).fetchone()
+    except (duckdb.Error, KeyError):
+        return None
+    return None if uncast else keys
+
+
+def _ranges(conn, path, column, keys, covered):
+    """Row groups that may hold ``keys``: ``({file: [(first, last row)]}, count)``.
+
+    Only the files ``covered`` count; the index may still list others that
+    have since been rewritten or removed.
+    """
+    rows = conn.execute(
+        f"SELECT g.file, g.first_row, g.first_row + g.num_rows - 1 "
+        f"FROM {_ROW_GROUPS} g SEMI JOIN (SELECT file, row_group FROM {_ENTRIES} "
+        "WHERE path = ? AND column_name = ? AND list_contains(?, key)) e "
+        "USING (file, row_group) WHERE g.path = ? AND g.column_name = ? "
+        "AND list_contains(?, g.file) ORDER BY g.file, g.first_row",
+        [path, column, keys, path, column, covered],
+    ).fetchall()
+    ranges = {}
+    for file, first, last in rows:
+        runs = ranges.setdefault(file, [])
+        if runs and runs[-1][1] + 1 == first:
+            runs[-1] = (runs[-1][0], last)  # Adjacent groups read as one.
+        else:
+            runs.append((first, last))
+    return ranges, len(rows)
+
+
+def _view_sql(ranges, whole, schema_from):
+    """A query over just the row ``ranges`` and the ``whole`` files.
+
+    With neither, it reads no rows of file ``schema_from``, for the columns.
+    """
+    if sum(len(runs) for runs in ranges.values()) > MAX_RANGES:
+        whole, ranges = sorted(set(whole) | set(ranges)), {}
+    scans = [
+        "SELECT * EXCLUDE (file_row_number) FROM "
+        f"read_parquet({alias_store.quote(file)}, file_row_number=true) "
+        f"WHERE file_row_number BETWEEN {first} AND {last}"
+        for file, runs in ranges.items()
+        for first, last in runs
+    ]
+    if whole:
+        scans.append(f"SELECT * FROM read_parquet({_listed(whole)})")
+    if not scans:
+        scans.append(
+            f"SELECT * FROM read_parquet({alias_store.quote(schema_from)}) LIMIT 0"
+        )
+    return " UNION ALL BY NAME ".join(scans)
+
+
+def _narrow(conn, name, sql):
+    """Redefine alias ``name`` as ``sql``, if that has the same columns."""
+    quoted = alias_store.quote_identifier(name)
+    before = conn.sql(f"SELECT * FROM {quoted} LIMIT 0")
+    after = conn.sql(f"SELECT * FROM ({sql}) LIMIT 0")
+    # Hive partition columns, say, come from the path and could differ.
+    if (before.columns, before.types) != (after.columns, after.types):
+        return False
+    conn.sql(f"CREATE OR REPLACE VIEW memory.main.{quoted} AS {sql}")
+    return True
+
+
+def _fresh(conn, db, path, column, current):
+    """Files in ``current`` the index of ``column`` does not cover, after updating.
+
+    ``conn`` has the database attached read-only, and still does afterwards.
+    """
+    if _manifest(conn, path, column) == current:
+        return []
+    conn.sql(f"DETACH {NAME}")
+    try:
+        alias_store.attach(conn, NAME, db, read_only=False)
+    except (duckdb.IOException, duckdb.BinderException):
+        pass  # Another process has it; read what is not covered in full.
+    else:
+        try:
+            _update(conn, path, column)
+        except (IndexingError, duckdb.Error):
+            pass
+        finally:
+            conn.sql(f"DETACH {NAME}")
+    alias_store.attach(conn, NAME, db, read_only=True)
+    indexed = _manifest(conn, path, column)
+    return sorted(name for name, stat in current.items() if indexed.get(name) != stat)
+
+
+def prune(conn, sql, aliases, names, params=None, db=None):
+    """Narrow the aliases ``sql`` looks up by an indexed column to what matches.
+
+    Each alias among ``names`` with an index on a column that ``sql`` filters
+    by equality is redefined on ``conn`` to read only the row groups that may
+    hold the values, plus any files the index does not cover.  Returns
+    ``[(alias, column, groups read, groups indexed, files not indexed)]``.
+    """
+    db = indexes_file() if db is None else db
+    node = partials.parse(conn, sql) if db.exists() else None
+    wanted = {name: _filters(node, name) for name in names}
+    wanted = {name: filters for name, filters in wanted.items() if filters}
+    if not wanted:
+        return []
+    try:
+        alias_store.attach(conn, NAME, db, read_only=True)
+    except duckdb.Error:
+        return []
+
+    narrowed = []
+    try:
+        for name, filters in wanted.items():
+            path = aliases[name]
+            try:
+                indexed = conn.execute(
+                    f"SELECT column_name, column_type FROM {_INDEXES} "
+                    "WHERE path = ? AND version = ?",
+                    [path, duckdb.__version__],
+                ).fetchall()
+            except duckdb.CatalogException:
+                break
+            for column, kind in indexed:
+                # Each filter on the column must hold, so any one of them will do.
+                keys = next(
+                    (
+                        keys
+                        for values in filters.get(column.lower(), [])
+                        if (keys := _keys(conn, values, kind, params)) is not None
+                    ),
+                    None,
+                )
+                current = _stats(alias_store.files(path))
+                if keys is None or not current:
+                    continue
+                whole = _fresh(conn, db, path, column, current)
+                # Files indexed as they are now; the rest are read whole.
+                covered = sorted(set(current) - set(whole))
+                ranges, read = _ranges(conn, path, column, keys, covered)
+                (total,) = conn.execute(
+                    f"SELECT count(*) FROM {_ROW_GROUPS} "
+                    "WHERE path = ? AND column_name = ? AND list_contains(?, file)",
+                    [path, column, covered],
+                ).fetchone()
+                if read == total:
+                    break  # Every row group may match; nothing to gain.
+                view = _view_sql(ranges, whole, next(iter(current)))
+                if _narrow(conn, name, view):
+                    narrowed.append((name, column, read, total, len(whole)))
+                break
+    finally:
+        conn.sql(f"DETACH {NAME}")
+    return narrowed
@@ -1,15 +1,39 @@
 """CLI entry point for pksql."""
 
 import contextlib
+import csv
+import json
 import os
+import signal
 import sys
+import time
 
 import click
 import duckdb
 from rich.console import Console
 
+from pksql import admission as admitting
 from pksql import aliases as alias_store
-from pksql.core import execute_query
+from pksql import bench as benchmarking
+from pksql import cache as remote_cache
+from pksql import catalog as alias_catalog
+from pksql import compact as compaction
+from pksql import estimate as estimating
+from pksql import history as query_history
+from pksql import indexes as key_indexes
+from pksql import rollups as rolling
+from pksql import shards as sharding
+from pksql import stdin as stdin_table
+from pksql import watch as watching
+from pksql import workers as working
+from pksql.core import (
+    execute_query,
+    format_elapsed,
+    format_size,
+    parse_size,
+    render_result,
+    sweep,
+)
 
 # Long file paths read better unbroken than wrapped mid-token.
 console = Console(soft_wrap=True)
@@ -70,6 +94,22 @@ def cli(ctx):
         click.echo(ctx.get_help())
 
 
+def bind_aliases(conn, registered, named, use_catalog=False):
+    """Expose the aliases on ``conn``, from the persistent catalog if asked.
+
+    Database aliases are attached only when ``named`` includes them.  The
+    catalog can be unavailable (another process is refreshing it); the query
+    still runs, binding in memory as it would without ``--catalog``.
+    """
+    databases = {
+        name: path for name, path in registered.items() if alias_store.is_database(path)
+    }
+    files = {name: path for name, path in registered.items() if name not in databases}
+    if not (use_catalog and alias_catalog.attach(conn, files) is not None):
+        alias_store.create_views(conn, files)
+    alias_store.attach_databases(conn, databases, named)
+
+
 @cli.command(context_settings=dict(ignore_unknown_options=True))
 @click.argument("sql", nargs=-1, required=True)
 @click.option(
@@ -80,21 +120,268 @@ def cli(ctx):
     default="table",
     help="Output format for query results",
 )
-def query(sql, output_format):
-    """Run a SQL query (assumed when no subcommand is given)."""
+@click.option(
+    "--cache-remote",
+    is_flag=True,
+    envvar="PKSQL_CACHE_REMOTE",
+    help="Serve http(s) aliases from a local copy (see `pksql cache`)",
+)
+@click.option(
+    "--catalog",
+    "use_catalog",
+    is_flag=True,
+    envvar="PKSQL_CATALOG",
+    help="Keep alias views bound between runs in ~/.cache/pksql/catalog.duckdb",
+)
+@click.option(
+    "--watch",
+    is_flag=True,
+    help="Re-run whenever the files behind the query's aliases change",
+)
+@click.option(
+    "--interval",
+    type=click.FloatRange(min=0.1),
+    default=2.0,
+    show_default=True,
+    help="Seconds between checks for changed files, with --watch",
+)
+@click.option(
+    "--param",
+    "-p",
+    "params",
+    multiple=True,
+    metavar="NAME=VALUE",
+    callback=lambda ctx, param, value: _parse_params(value),
+    help="Bind $NAME in the query to VALUE (repeatable)",
+)
+@click.option(
+    "--params-file",
+    type=click.File("r"),
+    help="Run once per row of this CSV, whose header names the parameters "
+    "(- for stdin)",
+)
+@click.option(
+    "--history",
+    "keep_history",
+    is_flag=True,
+    envvar="PKSQL_HISTORY",
+    help="Log this run's timings to ~/.cache/pksql (see `pksql history`)",
+)
+@click.option(
+    "--stdin-format",
+    type=click.Choice(stdin_table.FORMATS, case_sensitive=False),
+    default="csv",
+    show_default=True,
+    help="How to read standard input, when the query reads the table stdin",
+)
+@click.option(
+    "--shard-processes",
+    type=click.IntRange(min=1),
+    help="Run the query over each shard of a .duckdb glob alias in this many "
+    "processes and merge the results (count/sum/min/max queries only)",
+)
+@click.option(
+    "--workers",
+    multiple=True,
+    metavar="HOST:PORT,...",
+    help="Run the query on these `pksql worker`s and merge the results "
+    "(count/sum/min/max queries only; default: `set workers` in .pksql)",
+)
+@click.option(
+    "--max-concurrent",
+    type=click.IntRange(min=1),
+    envvar="PKSQL_MAX_CONCURRENT",
+    help="Run at most this many pksql queries at once on this host, queuing "
+    "the rest and splitting cores and memory between them",
+)
+@click.option(
+    "--estimate",
+    "estimate_only",
+    is_flag=True,
+    help="Print how much the query would read, without running it",
+)
+@click.option(
+    "--max-scan",
+    metavar="SIZE",
+    envvar="PKSQL_MAX_SCAN",
+    callback=lambda ctx, param, value: _parse_size_option(value),
+    help="Refuse, or at a terminal ask first, to run a query estimated to read "
+    "more than this, such as 50GB (default: `set max_scan` in .pksql)",
+)
+def query(
+    sql,
+    output_format,
+    cache_remote,
+    use_catalog,
+    watch,
+    interval,
+    params,
+    params_file,
+    keep_history,
+    stdin_format,
+    shard_processes,
+    workers,
+    max_concurrent,
+    estimate_only,
+    max_scan,
+):
+    """Run a SQL query (assumed when no subcommand is given).
+
+    \b
+    Values given with -p are bound by DuckDB, not pasted into the SQL, so they
+    need no quoting.  They arrive as strings, which DuckDB converts wherever a
+    comparison makes the type clear; elsewhere cast them ($n::INT).
+        pksql -p day=2024-01-31 'SELECT count(*) FROM hits WHERE day = $day'
+        pksql --params-file days.csv 'SELECT count(*) FROM hits WHERE day = $day'
+
+    \b
+    The table stdin is whatever is piped in, read as it arrives:
+        producer | pksql 'SELECT key, count(*) FROM stdin GROUP BY 1'
+    """
+    started = time.perf_counter()
+    sql = " ".join(sql)
     with reporting_alias_errors():
         registered = alias_store.load()
+        settings = alias_store.settings()
+    named = alias_store.referenced(sql, registered)
+    # Workers named on the command line are expected to be used, so say when
+    # they cannot be; those from .pksql apply only where they can.
+    announce = bool(workers)
+    workers = _split_list(workers) or _split_list([settings.get("workers", "")])
+    max_scan_source = "--max-scan"
+    if max_scan is None and "max_scan" in settings:
+        max_scan_source = "max_scan in .pksql"
+        try:
+            max_scan = parse_size(settings["max_scan"])
+        except ValueError as e:
+            conserr.print(f"Error: max_scan in .pksql: {e}")
+            sys.exit(1)
+    reads_stdin = stdin_table.NAME not in registered and bool(
+        alias_store.referenced(sql, [stdin_table.NAME])
+    )
+    if reads_stdin and watch:
+        raise click.UsageError("--watch cannot re-read stdin")
+    if watch and params_file is not None:
+        raise click.UsageError("--watch runs one query; it cannot take --params-file")
+    if reads_stdin and params_file is not None and params_file.name == "<stdin>":
+        raise click.UsageError("stdin cannot be both the table and --params-file")
 
-    conn = duckdb.connect(database=":memory:")
-    try:
-        alias_store.create_views(conn, registered)
+    cache = None
+    if cache_remote:
+        cache = remote_cache.RemoteCache()
+        registered, failures = remote_cache.localize(registered, named, cache)
+        for name, error in failures.items():
+            conserr.print(f"Warning: could not cache {name}: {error}")
+
+    # Held until the connection closes; a slot's share of cores and memory
+    # applies to this connection.
+    slot = contextlib.ExitStack()
+    queue_seconds, config = 0.0, {}
+    if max_concurrent:
         try:
-            output, time_str = execute_query(
-                " ".join(sql), conn=conn, output_format=output_format
+            queue_seconds = slot.enter_context(admitting.admitted(max_concurrent))
+        except (admitting.AdmissionError, OSError) as e:
+            conserr.print(f"Error: {e}")
+            sys.exit(1)
+        config = admitting.budget(max_concurrent)
+    conn = duckdb.connect(database=":memory:", config=config)
+    try:
+        bind_aliases(conn, registered, named, use_catalog)
+        if reads_stdin:
+            try:
+                stdin_table.bind(conn, stdin_format.lower())
+            except stdin_table.StdinError as e:
+                conserr.print(f"Error: {e}")
+                sys.exit(1)
+        if estimate_only:
+            estimate_query(conn, sql, registered, named, params, output_format)
+            return
+        once = not (watch or params_file is not None)
+        gathering = bool(
+            workers
+            and not shard_processes
+            and once
+            and working.split(conn, sql, registered, named) is not None
+        )
+        if workers and not shard_processes and once and not gathering and announce:
+            conserr.print(
+                "Note: --workers needs a count/sum/min/max query over one file "
+                "alias; running it in this process."
             )
+        distributed = bool(shard_processes or gathering)
+        # Only a plain run uses rollups, and the guard should see that query.
+        plain = once and not distributed
+        guard = None
+        if max_scan is not None:
+            # Asking needs a terminal that is not also feeding the query.
+            can_ask = sys.stdin.isatty() and not reads_stdin and params_file is None
+
+            def guard(scan_sql, scan_params, subject="This query"):
+                guard_scan(
+                    conn,
+                    scan_sql,
+                    registered,
+                    named,
+                    scan_params,
+                    (max_scan, max_scan_source),
+                    can_ask,
+                    subject,
+                )
+
+        run_sql = use_rollup(conn, sql, registered, named, guard) if plain else sql
+        if guard is not None:
+            guard(run_sql, params)
+        if watch:
+            watch_query(conn, sql, registered, params, output_format, interval)
+            return
+        if params_file is not None:
+            sweep_query(conn, sql, params, params_file, output_format)
+            return
+        if not distributed:
+            use_indexes(conn, run_sql, registered, named, params)
+        setup_seconds = time.perf_counter() - started - queue_seconds
+        # Only the history uses these; gathering them can cost a row count.
+        stats = None
+        if keep_history:
+            stats = {"queue_seconds": queue_seconds} if max_concurrent else {}
+        try:
+            if gathering:
+                output, time_str = gather_query(
+                    conn,
+                    sql,
+                    registered,
+                    named,
+                    workers,
+                    params,
+                    output_format,
+                    stats,
+                )
+            elif shard_processes:
+                output, time_str = scatter_query(
+                    conn,
+                    sql,
+                    registered,
+                    named,
+                    shard_processes,
+                    params,
+                    output_format,
+                    stats,
+                )
+            else:
+                output, time_str = execute_query(
+                    run_sql,
+                    conn=conn,
+                    output_format=output_format,
+                    params=params,
+                    stats=stats,
+                )
         except Exception as e:
+            if keep_history:
+                _record(sql, registered, named, setup_seconds, stats, e)
             conserr.print(f"Error: {str(e)}")
             sys.exit(1)
+        if keep_history:
+            _record(sql, registered, named, setup_seconds, stats)
 
         if output is not None:
             # Result-producing query: results go to stdout.
@@ -105,9 +392,245 @@ def query(sql, output_format):
             # DuckDB has no table to render.)
             conserr.print("Query executed successfully.")
 
+        if max_concurrent:
+            conserr.print(f"Queue wait: {format_elapsed(queue_seconds)}")
         conserr.print(f"Query time: {time_str}")
+        if cache is not None and cache.hits + cache.misses:
+            conserr.print(f"Remote cache: {cache.hits} hits, {cache.misses} misses")
     finally:
         conn.close()
+        slot.close()
+
+
+def use_rollup(conn, sql, registered, named, guard=None):
+    """``sql``, rewritten to read a rollup that covers it if one is declared.
+
+    The rollup is built or refreshed first if its alias's files changed, once
+    ``guard`` (see ``guard_scan``), if given, has passed the scan that takes.
+    If that cannot happen now, the query scans the alias as written.
+    """
+    with reporting_alias_errors():
+        declared = rolling.declared(conn, named)
+    found = rolling.rewrite(conn, sql, declared) if declared else None
+    if found is None:
+        return sql
+    rewritten, rollup = found
+    if guard is not None:
+        state = rolling.status(conn, [rollup], registered)[rollup.name]
+        if state != "fresh":
+            guard(rollup.sql, None, f"Building rollup {rollup.name}")
+    failures = rolling.refresh(conn, [rollup], registered)
+    if failures is None:
+        conserr.print(
+            f"Note: rollup {rollup.name} is being used by another pksql and "
+            f"needs rebuilding; scanning {rollup.alias} instead."
+        )
+        return sql
+    if failures:
+        conserr.print(
+            f"Warning: could not build rollup {rollup.name}: {failures[rollup.name]}"
+        )
+        return sql
+    conserr.print(f"Note: answered from rollup {rollup.name}.")
+    return rewritten
+
+
+def use_indexes(conn, sql, registered, named, params):
+    """Narrow aliases that ``sql`` looks up by an indexed column to what matches."""
+    for name, column, read, total, unindexed in key_indexes.prune(
+        conn, sql, registered, named, params
+    ):
+        note = f"Note: index on {name}.{column}: reading {read} of {total} row groups"
+        if unindexed:
+            note += f", and {unindexed} files it does not cover yet"
+        conserr.print(f"{note}.")
+
+
+def _scan_summary(scans):
+    """``"12.3 GiB in 40 files (about 1000000 rows)"`` for ``scans``."""
+    size = sum(scan.bytes for scan in scans)
+    files = sum(scan.files for scan in scans)
+    summary = f"{format_size(size)} in {files} file{'s' if files != 1 else ''}"
+    if scans and all(scan.rows is not None for scan in scans):
+        summary += f" (about {sum(scan.rows for scan in scans)} rows)"
+    return size, summary
+
+
+def estimate_query(conn, sql, registered, named, params, output_format):
+    """Print what ``sql`` would read of each alias, without running it."""
+    with reporting_alias_errors():
+        declared = rolling.declared(conn, named)
+    found = rolling.rewrite(conn, sql, declared) if declared else None
+    if found is not None:
+        conserr.print(
+            f"Note: rollup {found[1].name} can answer this query; the estimate "
+            f"is for scanning {found[1].alias} instead."
+        )
+    scans, unsized = estimating.estimate(conn, sql, registered, named, params)
+    result = conn.sql(
+        "SELECT unnest($names::VARCHAR[]) AS alias, "
+        "unnest($files::INTEGER[]) AS files, unnest($bytes::BIGINT[]) AS bytes, "
+        "unnest($sizes::VARCHAR[]) AS size, unnest($rows::BIGINT[]) AS rows",
+        params={
+            "names": [scan.name for scan in scans],
+            "files": [scan.files for scan in scans],
+            "bytes": [scan.bytes for scan in scans],
+            "sizes": [format_size(scan.bytes) for scan in scans],
+            "rows": [scan.rows for scan in scans],
+        },
+    )
+    print(render_result(result, output_format))
+    if unsized:
+        conserr.print(f"Note: remote aliases are not sized: {', '.join(unsized)}.")
+    conserr.print(f"Estimated scan: {_scan_summary(scans)[1]}")
+
+
+def guard_scan(
+    conn, sql, registered, named, params, limit, can_ask, subject="This query"
+):
+    """Stop unless ``sql`` is estimated to read at most ``limit`` or the user agrees.
+
+    ``limit`` is ``(bytes, where it was set)``.  Past it, the user is asked if
+    ``can_ask``, and otherwise the query is refused.  ``subject`` says what
+    would read that much, in the message.
+    """
+    scans, _ = estimating.estimate(conn, sql, registered, named, params)
+    size, summary = _scan_summary(scans)
+    allowed, source = limit
+    if size <= allowed:
+        return
+    conserr.print(
+        f"{subject} would read about {summary}, "
+        f"more than {format_size(allowed)} ({source})."
+    )
+    if can_ask and click.confirm("Run it anyway?", default=False, err=True):
+        return
+    conserr.print(f"Error: refusing to run it; raise {source} to allow it.")
+    sys.exit(1)
+
+
+def _record(sql, registered, named, setup_seconds, stats, error=None):
+    """Append this run to the history log; a failure to do so is only a warning."""
+    paths = {name: registered[name] for name in named}
+    try:
+        query_history.record(
+            query_history.entry(sql, paths, setup_seconds, stats, error)
+        )
+    except OSError as e:
+        conserr.print(f"Warning: could not record history: {e}")
+
+
+def _parse_params(values):
+    """``-p`` arguments as a ``{name: value}`` dict."""
+    params = {}
+    for value in values:
+        name, sep, text = value.partition("=")
+        if not sep or not alias_store.NAME_RE.match(name.strip()):
+            raise click.BadParameter(f"expected NAME=VALUE, got {value!r}")
+        params[name.strip()] = text
+    return params
+
+
+def sweep_query(conn, sql, params, params_file, output_format):
+    """Run ``sql`` for every row of ``params_file``, streaming the results.
+
+    ``-p`` values apply to every row; a column of the same name overrides them.
+    """
+    rows = ({**params, **row} for row in csv.DictReader(params_file))
+    start_time = time.perf_counter()
+    try:
+        for chunk in sweep(sql, rows, conn, output_format):
+            print(chunk, flush=True)
+    except (duckdb.Error, ValueError) as e:
+        conserr.print(f"Error: {e}")
+        sys.exit(1)
+    conserr.print(f"Query time: {format_elapsed(time.perf_counter() - start_time)}")
+
+
+def scatter_query(
+    conn, sql, registered, named, processes, params, output_format, stats
+):
+    """``execute_query``, computing a sharded alias's result in ``processes``.
+
+    A query ``sharding.scatter`` cannot split runs as usual, with a note.
+    """
+    start_time = time.perf_counter()
+    result = sharding.scatter(conn, sql, registered, named, processes, params)
+    if result is None:
+        conserr.print(
+            "Note: --shard-processes needs a count/sum/min/max query over one "
+            "sharded .duckdb alias; running it in this process."
+        )
+        return execute_query(
+            sql, conn=conn, output_format=output_format, params=params, stats=stats
+        )
+    output = render_result(result, output_format, stats)
+    elapsed = time.perf_counter() - start_time
+    if stats is not None:
+        stats["seconds"] = elapsed
+    return output, format_elapsed(elapsed)
+
+
+def gather_query(conn, sql, registered, named, workers, params, output_format, stats):
+    """``execute_query``, with the partial results computed by ``workers``.
+
+    The caller has checked that ``working.split`` can split ``sql``.
+    """
+    start_time = time.perf_counter()
+    result = working.gather(conn, sql, registered, named, workers, params)
+    output = render_result(result, output_format, stats)
+    elapsed = time.perf_counter() - start_time
+    if stats is not None:
+        stats["seconds"] = elapsed
+    return output, format_elapsed(elapsed)
+
+
+def watch_query(conn, sql, registered, params, output_format, interval):
+    """Print the result of ``sql`` now and after every change, until interrupted.
+
+    A failing update is reported and the watch goes on: the files may simply
+    be mid-write.
+    """
+    watcher = watching.Watcher(conn, sql, registered, params)
+    if watcher.incremental is not None:
+        conserr.print(
+            f"Watching {watcher.incremental.path}: new files are merged into "
+            "the previous result."
+        )
+    try:
+        for _ in watching.changes(watcher, interval):
+            start_time = time.perf_counter()
+            try:
+                output = render_result(watcher.run(), output_format)
+            except duckdb.Error as e:
+                conserr.print(f"Error: {e}")
+                continue
+            elapsed = format_elapsed(time.perf_counter() - start_time)
+            if output is not None:
+                print(output, flush=True)
+            note = ""
+            if watcher.incremental is not None:
+                note = f" ({watcher.incremental.scanned} files scanned)"
+            conserr.print(f"Query time: {elapsed}{note}")
+    except KeyboardInterrupt:
+        pass
+
+
+def _parse_size_option(value):
+    """A ``SIZE`` option as bytes, or ``None`` if not given."""
+    if value is None:
+        return None
+    try:
+        return parse_size(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e)) from None
+
+
+def _split_list(values):
+    """Comma-separated and repeated option values, as one list."""
+    return [
+        item.strip() for value in values for item in value.split(",") if item.strip()
+    ]
 
 
 def _split_assignment(words):
@@ -166,6 +689,9 @@ def add_alias(words, use_global):
     if not path:
         conserr.print(f"Error: no path given for alias {name!r}.")
         sys.exit(1)
+    if name.lower() == stdin_table.NAME:
+        conserr.print(f"Error: {name!r} is reserved for standard input.")
+        sys.exit(1)
 
     target = _target_file(use_global)
     with reporting_alias_errors():
@@ -238,5 +764,365 @@ def list_aliases():
             console.print(f"  {name:<{width}} = {path}{note}")
 
 
+@cli.command("bench", context_settings=dict(ignore_unknown_options=True))
+@click.argument("sql", nargs=-1, required=True)
+@click.option(
+    "--runs",
+    "-n",
+    type=click.IntRange(min=1),
+    default=20,
+    show_default=True,
+    help="Timed runs",
+)
+@click.option(
+    "--warmup",
+    type=click.IntRange(min=0),
+    default=3,
+    show_default=True,
+    help="Untimed runs first",
+)
+@click.option(
+    "--cold",
+    is_flag=True,
+    help="Start every run on a fresh DuckDB, dropping its cached metadata",
+)
+@click.option(
+    "--catalog",
+    "use_catalog",
+    is_flag=True,
+    envvar="PKSQL_CATALOG",
+    help="Bind aliases from the persistent catalog, as queries would",
+)
+def bench(sql, runs, warmup, cold, use_catalog):
+    """Time a query repeatedly and print the statistics as JSON.
+
+    \b
+    The query runs through the same aliases as `pksql "SQL"` would.  Save the
+    JSON to compare query shapes, file layouts or pksql/DuckDB releases:
+        pksql bench -n 50 "SELECT count(*) FROM hits WHERE day = '2024-01-31'"
+    """
+    sql = " ".join(sql)
+    with reporting_alias_errors():
+        registered = alias_store.load()
+    named = {name: registered[name] for name in alias_store.referenced(sql, registered)}
+
+    def connect():
+        conn = duckdb.connect(database=":memory:")
+        bind_aliases(conn, registered, named, use_catalog)
+        return conn
+
+    try:
+        report = benchmarking.benchmark(connect, sql, named, runs, warmup, cold)
+    except duckdb.Error as e:
+        conserr.print(f"Error: {e}")
+        sys.exit(1)
+    print(json.dumps(report, indent=2))
+    conserr.print(
+        f"median {format_elapsed(report['median_seconds'])}, "
+        f"p95 {format_elapsed(report['p95_seconds'])} over {runs} runs"
+    )
+
+
+@cli.command("history", context_settings=dict(ignore_unknown_options=True))
+@click.argument("sql", nargs=-1)
+@click.option(
+    "--stats",
+    is_flag=True,
+    help="p50/p95 query time per query fingerprint and day",
+)
+@click.option(
+    "--limit",
+    "-n",
+    type=click.IntRange(min=1),
+    default=20,
+    show_default=True,
+    help="How many recent runs to list",
+)
+@click.option(
+    "--output-format",
+    "-F",
+    "output_format",
+    type=click.Choice(["table", "csv", "tsv", "json"], case_sensitive=False),
+    default="table",
+    help="Output format for query results",
+)
+def show_history(sql, stats, limit, output_format):
+    """Show queries logged with --history (or PKSQL_HISTORY=1).
+
+    \b
+    With no SQL, lists the most recent runs.  Otherwise runs SQL against the
+    log, which is the table `history`:
+        pksql history --stats
+        pksql history "SELECT * FROM history WHERE query_seconds > 60"
+    """
+    conn = duckdb.connect(database=":memory:")
+    try:
+        if not query_history.create_view(conn):
+            console.print("No history yet. Run queries with --history to record it.")
+            return
+        params = None
+        if sql:
+            text = " ".join(sql)
+        elif stats:
+            text = query_history.STATS_SQL
+        else:
+            text, params = query_history.RECENT_SQL, [limit]
+        try:
+            output, _ = execute_query(
+                text, conn=conn, output_format=output_format, params=params
+            )
+        except duckdb.Error as e:
+            conserr.print(f"Error: {e}")
+            sys.exit(1)
+        if output is not None:
+            print(output)
+    finally:
+        conn.close()
+
+
+@cli.command("cache")
+@click.option("--clear", is_flag=True, help="Delete every cached remote object")
+def cache_info(clear):
+    """Show (or clear) the local cache of remote alias sources.
+
+    \b
+    Queries run with --cache-remote (or PKSQL_CACHE_REMOTE=1) keep a copy of
+    each http(s) alias they read, reusing it until the server's ETag or
+    Last-Modified changes.  PKSQL_CACHE_LIMIT caps its size (default 10GiB);
+    the least recently used objects go first.
+    """
+    cache = remote_cache.RemoteCache()
+    if clear:
+        cache.clear()
+        console.print(f"Cleared {cache.root}.")
+        return
+    stats = cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    rate = f" ({stats['hits'] / lookups:.0%} hit rate)" if lookups else ""
+    console.print(f"[bold]{cache.root}[/bold]")
+    console.print(
+        f"  {stats['objects']} objects, {format_size(stats['bytes'])} "
+        f"of {format_size(stats['limit'])}"
+    )
+    console.print(f"  {stats['hits']} hits, {stats['misses']} misses{rate}")
+
+
+@cli.command("rollups")
+@click.option(
+    "--refresh", is_flag=True, help="Build every rollup that is missing or stale"
+)
+def list_rollups(refresh):
+    """List the rollups declared in .pksql and whether they are up to date.
+
+    \b
+    A rollup keeps an alias pre-aggregated; queries it covers read it instead:
+        rollup daily_hits = hits by day, status: count(*), sum(bytes)
+    Queries build a stale rollup when they need it; --refresh does it now.
+    """
+    with reporting_alias_errors():
+        registered = alias_store.load()
+    conn = duckdb.connect(database=":memory:")
+    try:
+        with reporting_alias_errors():
+            rollups = list(rolling.declared(conn, registered).values())
+        if not rollups:
+            console.print(
+                "No rollups declared. Try a .pksql line like: "
+                "rollup daily = hits by day: count(*)"
+            )
+            return
+        if refresh:
+            bind_aliases(conn, registered, [rollup.alias for rollup in rollups])
+            failures = rolling.refresh(conn, rollups, registered)
+            if failures is None:
+                conserr.print("Error: another pksql is using the rollups; try again.")
+                sys.exit(1)
+            conn.sql(f"DETACH {rolling.NAME}")
+            for name, error in failures.items():
+                conserr.print(f"Warning: could not build rollup {name}: {error}")
+        states = rolling.status(conn, rollups, registered)
+    finally:
+        conn.close()
+    width = max(len(rollup.name) for rollup in rollups)
+    for rollup in rollups:
+        console.print(
+            f"  {rollup.name:<{width}} = {rollup.alias} "
+            f"[dim]({states[rollup.name]})[/dim]"
+        )
+
+
+@cli.command("compact")
+@click.argument("name")
+@click.option(
+    "--target-size",
+    default=compaction.DEFAULT_TARGET_SIZE,
+    show_default=True,
+    help="Roughly how big each new file should be",
+)
+@click.option(
+    "--sort-by",
+    multiple=True,
+    help="Sort the rows by this column; repeat or comma-separate for more",
+)
+@click.option(
+    "--compression",
+    type=click.Choice(compaction.COMPRESSIONS, case_sensitive=False),
+    default="zstd",
+    show_default=True,
+)
+@click.option(
+    "--output",
+    type=click.Path(file_okay=False),
+    help="Directory for the new files; it must not exist yet",
+)
+def compact(name, target_size, sort_by, compression, output):
+    """Rewrite an alias's files as a few large, sorted parquet files.
+
+    \b
+    The alias is pointed at the new files once they are all written; the old
+    files are left where they are for you to delete:
+        pksql compact hits --sort-by day --target-size 512MB
+    """
+    try:
+        size = parse_size(target_size)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--target-size")
+    sort_by = [column.strip() for value in sort_by for column in value.split(",")]
+    with reporting_alias_errors():
+        registered = alias_store.load()
+        declared_in = alias_store.declaring_file(name)
+    if declared_in is None:
+        conserr.print(f"Error: no alias {name!r} here.")
+        sys.exit(1)
+    path = registered[name]
+
+    conn = duckdb.connect(database=":memory:")
+    try:
+        scan = compaction.source(path)
+        before = alias_store.footprint([path]), compaction.scan_seconds(conn, scan)
+        if output:
+            out = os.path.abspath(output)
+        else:
+            out = compaction.destination(path, name)
+        new_path = compaction.compact(conn, scan, out, size, sort_by, compression)
+        after = alias_store.footprint([new_path]), compaction.scan_seconds(
+            conn, compaction.source(new_path)
+        )
+    except (compaction.CompactError, duckdb.Error) as e:
+        conserr.print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+    # Keep a relative alias relative, so the directory can still be moved.
+    old_path = alias_store.read_file(declared_in)[name]
+    if not os.path.isabs(os.path.expanduser(old_path)):
+        new_path = os.path.relpath(new_path, declared_in.parent)
+    with reporting_alias_errors():
+        alias_store.update_file(declared_in, name, new_path)
+
+    for label, ((files, size), seconds) in (("before", before), ("after", after)):
+        console.print(
+            f"  {label:<6} {files:>7} files {format_size(size):>10}   "
+            f"scan {format_elapsed(seconds)}"
+        )
+    console.print(f"{name} = {new_path} [dim](was {old_path})[/dim]")
+    conserr.print(f"The old files are untouched; delete them when ready: {path}")
+
+
+@cli.command("index")
+@click.argument("name", required=False)
+@click.argument("column", required=False)
+@click.option("--drop", is_flag=True, help="Forget the index instead")
+def index(name, column, drop):
+    """Index a parquet alias by a column, to speed up lookups by its values.
+
+    \b
+    Queries filtering the alias with = or IN on the column then read only the
+    row groups that can hold those values.  Run it again, or just query, to
+    index files added since.  With no arguments, list the indexes:
+        pksql index hits id
+        pksql "SELECT * FROM hits WHERE id = 42"
+    """
+    conn = duckdb.connect(database=":memory:")
+    try:
+        with reporting_alias_errors():
+            registered = alias_store.load()
+        if name is None:
+            found = key_indexes.listed(conn)
+            if not found:
+                console.print("No indexes. Try: pksql index <alias> <column>")
+            names = {path: alias for alias, path in registered.items()}
+            for path, indexed, kind, files in found:
+                console.print(
+                    f"  {names.get(path, path)}.{indexed} "
+                    f"[dim]({kind}, {files} files)[/dim]"
+                )
+            return
+        if column is None:
+            raise click.UsageError("name the column to index")
+        if name not in registered:
+            conserr.print(f"Error: no alias {name!r} here.")
+            sys.exit(1)
+        try:
+            if drop:
+                key_indexes.drop(conn, registered[name], column)
+                console.print(f"Dropped the index on {name}.{column}.")
+                return
+            added, removed = key_indexes.build(conn, registered[name], column)
+        except (key_indexes.IndexingError, duckdb.Error) as e:
+            conserr.print(f"Error: {e}")
+            sys.exit(1)
+    finally:
+        conn.close()
+    console.print(f"Indexed {name}.{column}: {added} files added, {removed} dropped.")
+
+
+@cli.command("worker")
+@click.option(
+    "--listen",
+    default=working.DEFAULT_ADDRESS,
+    show_default=True,
+    metavar="HOST:PORT|unix:PATH",
+    help="Where to accept queries",
+)
+@click.option(
+    "--root",
+    "roots",
+    multiple=True,
+    type=click.Path(exists=True, file_okay=False),
+    help="Only read files under this directory (repeatable; default: here)",
+)
+def worker(listen, roots):
+    """Answer queries from `pksql --workers` until interrupted.
+
+    \b
+    Each query arrives with the files to read, and the partial result goes
+    back to be merged:
+        host1$ pksql worker --listen 0.0.0.0:7878 --root /data
+        here$  pksql --workers host1:7878,host2:7878 "SELECT count(*) FROM hits"
+    Anyone who can reach the address can query the files under --root.
+    """
+    try:
+        listening = working.server(listen, roots or [os.getcwd()])
+    except (working.WorkerError, OSError) as e:
+        conserr.print(f"Error: {e}")
+        sys.exit(1)
+    with listening:
+        address = listening.server_address
+        if isinstance(address, tuple):
+            address = "{}:{}".format(*address[:2])
+        conserr.print(f"Listening on {address}; Ctrl-C to stop.")
+        # Stopped by a service manager, still clean up on the way out.
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            listening.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if isinstance(listening.server_address, str):
+                os.unlink(listening.server_address)  # The Unix socket file.
+
+
 if __name__ == "__main__":
     cli()
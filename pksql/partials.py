@@ -0,0 +1,246 @@
+"""Split a query over one alias into per-file partial results that can be merged.
+
+Some queries give the same answer whether they scan all of an alias's files at
+once or scan subsets separately and combine the pieces:
+
+* a plain projection/filter (``SELECT a, b FROM hits WHERE c > 0``), whose
+  pieces just concatenate, and
+* a grouped aggregate built only from ``count``, ``sum``, ``min`` and ``max``
+  (``SELECT day, count(*), max(t) FROM hits GROUP BY day``), whose pieces are
+  re-aggregated: counts and sums are summed, minima and maxima re-minimised.
+
+``decompose`` recognises these from DuckDB's own parse tree, so that callers
+such as ``pksql --watch`` can scan only what changed and merge it in, and
+``pksql.shards`` can run one query per shard and merge the results.  Anything
+else (joins, ``HAVING``, ``ORDER BY``/``LIMIT``, ``DISTINCT``, windows,
+subqueries, ``avg`` and friends) is not decomposable and gets ``None``.
+"""
+
+import json
+
+import duckdb
+
+from pksql import aliases as alias_store
+
+# Aggregate -> the aggregate that combines its partial results.
+MERGES = {
+    "count_star": "sum",
+    "count": "sum",
+    "sum": "sum",
+    "min": "min",
+    "max": "max",
+    "bool_and": "bool_and",
+    "bool_or": "bool_or",
+}
+
+_AGGREGATE_HANDLING = ("STANDARD_HANDLING", "FORCE_AGGREGATES")
+
+
+def parse(conn, sql):
+    """The parse tree of ``sql`` if it is a single ``SELECT``, else ``None``."""
+    (serialized,) = conn.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()
+    tree = json.loads(serialized)
+    if tree.get("error") or len(tree["statements"]) != 1:
+        return None
+    return tree["statements"][0]["node"]
+
+
+def expression_sql(conn, expression):
+    """A parsed expression printed back as SQL, without its alias.
+
+    This is also the name DuckDB gives the column of an unaliased expression.
+    """
+    (serialized,) = conn.execute("SELECT json_serialize_sql('SELECT 1')").fetchone()
+    tree = json.loads(serialized)
+    tree["statements"][0]["node"]["select_list"] = [{**expression, "alias": ""}]
+    (sql,) = conn.execute(
+        "SELECT json_deserialize_sql(?)", [json.dumps(tree)]
+    ).fetchone()
+    return sql[len("SELECT ") :]
+
+
+def walk(node):
+    """Every dict inside ``node`` (itself included), depth first."""
+    if isinstance(node, dict):
+        yield node
+        children = node.values()
+    elif isinstance(node, list):
+        children = node
+    else:
+        return
+    for child in children:
+        yield from walk(child)
+
+
+def aggregate_names(conn):
+    """The name of every aggregate function, ``count_star`` included."""
+    return {
+        name
+        for (name,) in conn.sql(
+            "SELECT DISTINCT function_name FROM duckdb_functions() "
+            "WHERE function_type = 'aggregate'"
+        ).fetchall()
+    } | {"count_star"}
+
+
+class Plan:
+    """How to combine partial results of a decomposable query.
+
+    ``table`` is the alias the query reads, ``node`` its parse tree, and
+    ``merges`` gives, per output column, the aggregate that combines it or
+    ``None`` for a group key (or any column of a plain projection).
+    """
+
+    def __init__(self, table, node, merges, grouped):
+        self.table = table
+        self.node = node
+        self.merges = merges
+        self.grouped = grouped
+
+    def merge_sql(self, source, partial):
+        """SQL combining the partial rows in table ``source``.
+
+        ``partial`` is any relation shaped like one partial result; the merged
+        result keeps its column names and types, so it is indistinguishable
+        from a single full scan.  Raises ``ValueError`` if the names are
+        ambiguous, since the merge has to refer to them by name.
+        """
+        columns = partial.columns
+        if not self.grouped:
+            return f"SELECT * FROM {source}"
+        if len(set(columns)) != len(columns):
+            raise ValueError("partial results have duplicate column names")
+        select = []
+        for column, kind, merge in zip(columns, partial.types, self.merges):
+            quoted = alias_store.quote_identifier(column)
+            if merge is None:
+                select.append(quoted)
+            else:
+                select.append(f"CAST({merge}({quoted}) AS {kind}) AS {quoted}")
+        group = " GROUP BY ALL" if None in self.merges else ""
+        return f"SELECT {', '.join(select)} FROM {source}{group}"
+
+
+def decompose(conn, sql, names):
+    """A ``Plan`` if ``sql`` reads one of ``names`` decomposably, else ``None``.
+
+    ``names`` are table names as the query would write them, such as
+    ``hits`` or ``shards.events``.
+    """
+    node = parse(conn, sql)
+    if (
+        node is None
+        or node["type"] != "SELECT_NODE"
+        or node["modifiers"]
+        or node["cte_map"]["map"]
+        or node["having"] is not None
+        or node["qualify"] is not None
+        or node["sample"] is not None
+        or node["aggregate_handling"] not in _AGGREGATE_HANDLING
+        or len(node["group_sets"]) > 1
+    ):
+        return None
+
+    source = node["from_table"]
+    if (
+        source["type"] != "BASE_TABLE"
+        or source["catalog_name"]
+        or source["sample"] is not None
+        or source["at_clause"] is not None
+    ):
+        return None
+    # A name may be schema-qualified, for the tables of a sharded alias.
+    qualified = ".".join(filter(None, (source["schema_name"], source["table_name"])))
+    table = next((n for n in names if n.lower() == qualified.lower()), None)
+    if table is None:
+        return None
+
+    # A subquery could read the alias again, and would then see only a part.
+    if any(part.get("class") == "SUBQUERY" for part in walk(node)):
+        return None
+
+    aggregates = aggregate_names(conn)
+    merges = []
+    for item in node["select_list"]:
+        if item["class"] == "STAR":
+            # Fine for a projection; beside an aggregate DuckDB rejects it.
+            merges.append(None)
+        elif item["class"] == "FUNCTION" and item["function_name"] in aggregates:
+            merge = MERGES.get(item["function_name"])
+            if merge is None or item["distinct"] or item["order_bys"]["orders"]:
+                return None
+            if any(_is_aggregate(part, aggregates) for part in walk(item["children"])):
+                return None
+            merges.append(merge)
+        elif any(_is_aggregate(part, aggregates) for part in walk(item)):
+            # An expression over aggregates, such as sum(x) / count(*).
+            return None
+        else:
+            merges.append(None)
+
+    grouped = bool(node["group_expressions"]) or any(merges)
+    if grouped and any(item["class"] == "STAR" for item in node["select_list"]):
+        return None
+    # The merge groups by the key columns of the partial results, so every
+    # grouping key must be one of them: a key left out of the select list (or
+    # only a function of one) would be merged over.
+    keys = [item for item, merge in zip(node["select_list"], merges) if merge is None]
+
+    def columns():
+        relation = conn.sql(f"SELECT * FROM {table} LIMIT 0")
+        return {column.lower() for column in relation.columns}
+
+    try:
+        if not all(
+            _is_key(expression, keys, node, columns)
+            for expression in node["group_expressions"]
+        ):
+            return None
+    except duckdb.Error:
+        return None  # The table is not bound here, so the alias is unresolved.
+    return Plan(table, node, merges, grouped)
+
+
+def _signature(expression):
+    """``expression`` as comparable text, ignoring its alias and position."""
+    if isinstance(expression, dict):
+        return {
+            key: _signature(value)
+            for key, value in expression.items()
+            if key not in ("alias", "query_location")
+        }
+    if isinstance(expression, list):
+        return [_signature(value) for value in expression]
+    return expression
+
+
+def _is_key(expression, keys, node, columns):
+    """Whether grouping ``expression`` is one of the select items ``keys``.
+
+    ``columns()`` gives the lowercased column names of the table read, and
+    raises ``duckdb.Error`` if it is not bound.
+    """
+    if expression["class"] == "CONSTANT":
+        # GROUP BY 2 names the second select item.
+        value = expression["value"]
+        position = value.get("value")
+        if value["is_null"] or not isinstance(position, int):
+            return False
+        select = node["select_list"]
+        return 1 <= position <= len(select) and any(
+            item is select[position - 1] for item in keys
+        )
+    if expression["class"] == "COLUMN_REF" and len(expression["column_names"]) == 1:
+        # GROUP BY d names the item aliased d, unless the table has a column d,
+        # which DuckDB groups by instead.
+        (name,) = expression["column_names"]
+        if any(item["alias"].lower() == name.lower() for item in keys):
+            return name.lower() not in columns()
+    signature = _signature(expression)
+    return any(_signature(item) == signature for item in keys)
+
+
+def _is_aggregate(part, aggregates):
+    return part.get("class") == "WINDOW" or (
+        part.get("class") == "FUNCTION" and part.get("function_name") in aggregates
+    )
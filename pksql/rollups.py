@@ -0,0 +1,496 @@
+"""Rollups: pre-aggregated copies of an alias that covered queries read instead.
+
+A rollup is declared in ``.pksql`` with group keys and measures::
+
+    rollup daily_hits = hits by day, status: count(*), sum(bytes), max(t)
+    rollup hits_by_hour = hits by date_trunc('hour', t) AS hour: count(*)
+
+pksql keeps it as a table in ``~/.cache/pksql/rollups.duckdb``, one row per
+key combination, and rebuilds it whenever the files behind the alias (or the
+declaration) change.  The table is named for the declaration and the alias's
+path as well as the rollup, so projects declaring rollups of the same name
+over different files each keep their own.
+
+``rewrite`` recognises a query the rollup can answer: one over the alias
+alone whose columns outside aggregates are all rollup keys and whose
+aggregates are all measures.  It is rewritten to read the rollup,
+re-aggregating each measure the way ``pksql.partials`` merges partial results
+(counts are summed, minima re-minimised, and so on), so the answer is the
+same as scanning the alias.  Key expressions such as ``date_trunc('hour', t)``
+match the same expression in a query.
+
+A query reads the rollups read-only, alongside any others.  Rebuilding a
+stale one needs the database to itself; while another process has it open,
+the query scans the alias instead, as if no rollup were declared.
+"""
+
+import copy
+import hashlib
+import json
+import re
+
+import duckdb
+
+from pksql import aliases as alias_store
+from pksql import partials
+from pksql.cache import cache_dir
+
+NAME = "pksql_rollups"
+
+_DEFINITIONS = f"{NAME}.main.definitions"
+
+# name = alias [by keys]: measures.  The colon is a lone one, not a `::` cast.
+_SPEC_RE = re.compile(
+    r"(?P<name>\w+)\s*=\s*(?P<alias>\w+)(?:\s+by\s+(?P<keys>.*?))?"
+    r"\s*(?<!:):(?!:)\s*(?P<measures>.+)\Z",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def rollups_file():
+    """Path of the database the rollups are kept in."""
+    return cache_dir() / "rollups.duckdb"
+
+
+def _tree(conn, sql):
+    (serialized,) = conn.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()
+    return json.loads(serialized)
+
+
+def _to_sql(conn, tree):
+    (sql,) = conn.execute(
+        "SELECT json_deserialize_sql(?)", [json.dumps(tree)]
+    ).fetchone()
+    return sql
+
+
+def _select_list(conn, text):
+    """The parsed expressions of ``SELECT text``."""
+    node = partials.parse(conn, f"SELECT {text}")
+    if node is None:
+        raise ValueError(f"cannot parse {text!r}")
+    return node["select_list"]
+
+
+def _shape(node):
+    """``node`` without positions and aliases, to compare expressions by."""
+    if isinstance(node, dict):
+        return {
+            key: (
+                [name.lower() for name in value]
+                if key == "column_names"
+                else _shape(value)
+            )
+            for key, value in node.items()
+            if key not in ("query_location", "alias")
+        }
+    if isinstance(node, list):
+        return [_shape(value) for value in node]
+    return node
+
+
+def _signature(node):
+    return json.dumps(_shape(node), sort_keys=True)
+
+
+def _map(value, replace):
+    """``value`` with ``replace`` applied to each outermost expression in it."""
+    if isinstance(value, dict):
+        if "class" in value:
+            return replace(value)
+        return {key: _map(child, replace) for key, child in value.items()}
+    if isinstance(value, list):
+        return [_map(child, replace) for child in value]
+    return value
+
+
+def measure_column(index):
+    """The rollup column holding measure number ``index``."""
+    return f"measure_{index}"
+
+
+class Rollup:
+    """A rollup declared as ``name = alias by keys: measures``.
+
+    ``keys`` maps each key column to its parsed expression and ``measures``
+    lists the parsed aggregates, stored as columns ``measure_0`` onwards.
+    ``sql`` is the query that builds it, and ``path`` the alias's path as
+    declared, if known.
+    """
+
+    def __init__(self, name, alias, keys, measures, sql, path=None):
+        self.name = name
+        self.alias = alias
+        self.keys = keys
+        self.measures = measures
+        self.sql = sql
+        self.path = path
+
+    @property
+    def table(self):
+        """The table the rollup is kept in, one per declaration and path."""
+        digest = hashlib.sha256(f"{self.path or ''}\0{self.sql}".encode())
+        return f"{self.name}_{digest.hexdigest()[:16]}"
+
+
+def parse_rollup(conn, text, where="<rollup>"):
+    """The ``Rollup`` a ``rollup`` directive declares; ``AliasError`` if invalid."""
+    match = _SPEC_RE.match(text.strip())
+    if match is None:
+        raise alias_store.AliasError(
+            f"{where}: expected 'rollup name = alias by keys: measures', "
+            f"got {text!r}"
+        )
+    name, alias = match["name"], match["alias"]
+    try:
+        key_nodes = _select_list(conn, match["keys"]) if match["keys"] else []
+        measure_nodes = _select_list(conn, match["measures"])
+    except ValueError as e:
+        raise alias_store.AliasError(f"{where}: rollup {name}: {e}") from None
+
+    keys = {}
+    for node in key_nodes:
+        if node["alias"]:
+            key = node["alias"]
+        elif node["class"] == "COLUMN_REF":
+            key = node["column_names"][-1]
+        else:
+            raise alias_store.AliasError(
+                f"{where}: rollup {name}: name the key "
+                f"{partials.expression_sql(conn, node)} with AS"
+            )
+        if key.lower() in (k.lower() for k in keys):
+            raise alias_store.AliasError(f"{where}: rollup {name}: key {key} twice")
+        keys[key] = {**node, "alias": ""}
+
+    measures = []
+    for node in measure_nodes:
+        if (
+            node["class"] != "FUNCTION"
+            or node["function_name"] not in partials.MERGES
+            or node["distinct"]
+            or node["order_bys"]["orders"]
+        ):
+            raise alias_store.AliasError(
+                f"{where}: rollup {name}: {partials.expression_sql(conn, node)} is not "
+                "a count, sum, min, max, bool_and or bool_or"
+            )
+        measures.append({**node, "alias": ""})
+
+    columns = [
+        f"{partials.expression_sql(conn, node)} AS {alias_store.quote_identifier(key)}"
+        for key, node in keys.items()
+    ] + [
+        f"{partials.expression_sql(conn, node)} AS {measure_column(i)}"
+        for i, node in enumerate(measures)
+    ]
+    source = alias_store.quote_identifier(alias)
+    sql = f"SELECT {', '.join(columns)} FROM {source} GROUP BY ALL"
+    return Rollup(name, alias, keys, measures, sql)
+
+
+def declared(conn, aliases, cwd=None):
+    """``{name: Rollup}`` for the rollups over any of ``aliases``.
+
+    A later declaration of a name (``./.pksql`` after ``~/.pksql``) wins.
+    Rollups over other aliases are not parsed, so a query that does not
+    involve them pays nothing.
+    """
+    wanted = {alias.lower(): alias for alias in aliases}
+    paths = None
+    rollups = {}
+    for text, where in alias_store.directives("rollup", cwd):
+        match = _SPEC_RE.match(text)
+        if match is not None and match["alias"].lower() not in wanted:
+            continue
+        rollup = parse_rollup(conn, text, where)
+        rollup.alias = wanted[rollup.alias.lower()]  # As the alias is spelled.
+        if paths is None:
+            paths = alias_store.load(cwd)
+        rollup.path = paths.get(rollup.alias)
+        rollups[rollup.name] = rollup
+    return rollups
+
+
+class _NotCovered(Exception):
+    pass
+
+
+def _rewrite_for(conn, node, rollup, aggregates, columns):
+    """``node`` rewritten to read ``rollup``, or ``None`` if it does not cover it.
+
+    ``columns`` are the lower-cased column names of the alias.
+    """
+    unaliased = [
+        "" if item["alias"] else partials.expression_sql(conn, item)
+        for item in node["select_list"]
+    ]
+    node = copy.deepcopy(node)
+    source = node["from_table"]
+    qualifiers = {source["table_name"].lower(), source["alias"].lower()} - {""}
+    # hits.bytes is bytes, as far as matching measures goes.
+    for part in partials.walk(node):
+        names = part.get("column_names") if part.get("class") == "COLUMN_REF" else None
+        if names and len(names) == 2 and names[0].lower() in qualifiers:
+            part["column_names"] = names[1:]
+    plain = {
+        key.lower()
+        for key, expression in rollup.keys.items()
+        if expression["class"] == "COLUMN_REF"
+        and expression["column_names"][-1].lower() == key.lower()
+    }
+    keys = {
+        _signature(expression): key
+        for key, expression in rollup.keys.items()
+        if key.lower() not in plain
+    }
+    measures = {_signature(measure): i for i, measure in enumerate(rollup.measures)}
+    outputs = {item["alias"].lower() for item in node["select_list"] if item["alias"]}
+    # GROUP BY prefers a column of the alias to a select alias; ORDER BY the
+    # reverse.  Either way, a select alias stands for an item covered below.
+    grouping = outputs - columns
+    aggregated = False
+
+    def covered(expression, outputs=frozenset()):
+        nonlocal aggregated
+        signature = _signature(expression)
+        if signature in keys:
+            (column,) = _select_list(
+                conn, alias_store.quote_identifier(keys[signature])
+            )
+            return {**column, "alias": expression["alias"]}
+        if signature in measures:
+            aggregated = True
+            function = expression["function_name"]
+            column = alias_store.quote_identifier(measure_column(measures[signature]))
+            merged = f"{partials.MERGES[function]}({column})"
+            if function in ("count", "count_star"):
+                # A count over no rows is 0, where a sum over none is NULL.
+                merged = f"CAST(coalesce({merged}, 0) AS BIGINT)"
+            (merge,) = _select_list(conn, merged)
+            return {**merge, "alias": expression["alias"]}
+        kind = expression["class"]
+        if kind in ("STAR", "SUBQUERY", "WINDOW") or (
+            kind == "FUNCTION" and expression["function_name"] in aggregates
+        ):
+            raise _NotCovered
+        if kind == "COLUMN_REF":
+            names = [name.lower() for name in expression["column_names"]]
+            if len(names) == 1 and (names[0] in plain or names[0] in outputs):
+                return expression
+            raise _NotCovered
+        return {
+            key: _map(value, lambda child: covered(child, outputs))
+            for key, value in expression.items()
+        }
+
+    try:
+        select_list = []
+        for item, name in zip(node["select_list"], unaliased):
+            new = covered(item)
+            if new != item and not item["alias"]:
+                # Keep the column name the query would have had.
+                new = {**new, "alias": name}
+            select_list.append(new)
+        node["select_list"] = select_list
+        node["group_expressions"] = [
+            covered(expression, grouping) for expression in node["group_expressions"]
+        ]
+        for clause in ("where_clause", "having"):
+            if node[clause] is not None:
+                node[clause] = covered(node[clause])
+        for modifier in node["modifiers"]:
+            if modifier["type"] == "ORDER_MODIFIER":
+                for order in modifier["orders"]:
+                    order["expression"] = covered(order["expression"], outputs)
+    except _NotCovered:
+        return None
+
+    if not (
+        aggregated
+        or node["group_expressions"]
+        or node["aggregate_handling"] == "FORCE_AGGREGATES"
+    ):
+        return None  # A plain projection wants the alias's rows, not groups.
+
+    node["from_table"] = {
+        **source,
+        "catalog_name": NAME,
+        "schema_name": "main",
+        "table_name": rollup.table,
+        "alias": source["alias"] or source["table_name"],
+    }
+    return node
+
+
+def rewrite(conn, sql, rollups):
+    """``(sql rewritten to read a rollup, that Rollup)``, or ``None``.
+
+    Of the rollups that cover the query, the one with the fewest keys is
+    chosen, as the coarsest has the fewest rows.  The rollup is not checked
+    for freshness here; ``refresh`` does that.
+    """
+    tree = _tree(conn, sql)
+    if tree.get("error") or len(tree["statements"]) != 1:
+        return None
+    node = tree["statements"][0]["node"]
+    if (
+        node["type"] != "SELECT_NODE"
+        or node["cte_map"]["map"]
+        or node["qualify"] is not None
+        or node["sample"] is not None
+        or node["aggregate_handling"] not in ("STANDARD_HANDLING", "FORCE_AGGREGATES")
+        or len(node["group_sets"]) > 1
+        or any(
+            modifier["type"] not in ("ORDER_MODIFIER", "LIMIT_MODIFIER")
+            for modifier in node["modifiers"]
+        )
+    ):
+        return None
+    source = node["from_table"]
+    if (
+        source["type"] != "BASE_TABLE"
+        or source["schema_name"]
+        or source["catalog_name"]
+        or source["sample"] is not None
+        or source["at_clause"] is not None
+    ):
+        return None
+
+    candidates = sorted(
+        (
+            rollup
+            for rollup in rollups.values()
+            if rollup.alias.lower() == source["table_name"].lower()
+        ),
+        key=lambda rollup: len(rollup.keys),
+    )
+    if not candidates:
+        return None
+    try:
+        table = alias_store.quote_identifier(source["table_name"])
+        columns = conn.sql(f"SELECT * FROM {table} LIMIT 0")
+    except duckdb.Error:
+        return None
+    columns = {column.lower() for column in columns.columns}
+    aggregates = partials.aggregate_names(conn)
+    for rollup in candidates:
+        rewritten = _rewrite_for(conn, node, rollup, aggregates, columns)
+        if rewritten is not None:
+            tree["statements"][0]["node"] = rewritten
+            return _to_sql(conn, tree), rollup
+    return None
+
+
+def _built(conn):
+    """``{table: (sql, fingerprint)}`` of what the attached database holds."""
+    try:
+        rows = conn.sql(
+            f"SELECT table_name, sql, fingerprint FROM {_DEFINITIONS}"
+        ).fetchall()
+    except duckdb.CatalogException:
+        return {}
+    return {table: (sql, fingerprint) for table, sql, fingerprint in rows}
+
+
+def _stale(conn, rollups, aliases):
+    built = _built(conn)
+    return [
+        rollup
+        for rollup in rollups
+        if built.get(rollup.table)
+        != (rollup.sql, alias_store.fingerprint(aliases[rollup.alias]))
+    ]
+
+
+def _create_tables(conn):
+    """Create the definitions table if it is missing."""
+    conn.sql(
+        f"CREATE TABLE IF NOT EXISTS {_DEFINITIONS} (table_name VARCHAR PRIMARY KEY, "
+        "name VARCHAR, alias VARCHAR, path VARCHAR, sql VARCHAR, "
+        "fingerprint VARCHAR, built TIMESTAMP)"
+    )
+
+
+def refresh(conn, rollups, aliases, path=None):
+    """Attach the rollups database to ``conn`` with ``rollups`` up to date.
+
+    ``conn`` must have the rollups' aliases bound.  Returns ``{name: error}``
+    for any rollup that failed to build (empty if all is well), or ``None`` if
+    another process holds the database while a rollup needs rebuilding.  The
+    database is left attached read-only.
+    """
+    path = rollups_file() if path is None else path
+    try:
+        alias_store.attach(conn, NAME, path, read_only=True)
+    except duckdb.Error:
+        stale = list(rollups)  # Not created yet.
+    else:
+        stale = _stale(conn, rollups, aliases)
+        if not stale:
+            return {}
+        conn.sql(f"DETACH {NAME}")
+
+    failures = {}
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        alias_store.attach(conn, NAME, path, read_only=False)
+    except (duckdb.IOException, duckdb.BinderException):
+        return None
+    try:
+        _create_tables(conn)
+        for rollup in stale:
+            fingerprint = alias_store.fingerprint(aliases[rollup.alias])
+            table = alias_store.quote_identifier(rollup.table)
+            try:
+                conn.sql(f"CREATE OR REPLACE TABLE {NAME}.main.{table} AS {rollup.sql}")
+            except duckdb.Error as e:
+                failures[rollup.name] = str(e)
+                continue
+            # An earlier declaration of this rollup over the same path is
+            # superseded; other projects' rollups of the name are left alone.
+            for (old,) in conn.execute(
+                f"DELETE FROM {_DEFINITIONS} WHERE name = ? AND path IS NOT DISTINCT "
+                "FROM ? AND table_name != ? RETURNING table_name",
+                [rollup.name, rollup.path, rollup.table],
+            ).fetchall():
+                old = alias_store.quote_identifier(old)
+                conn.sql(f"DROP TABLE IF EXISTS {NAME}.main.{old}")
+            conn.execute(
+                f"INSERT OR REPLACE INTO {_DEFINITIONS} "
+                "VALUES (?, ?, ?, ?, ?, ?, current_localtimestamp())",
+                [
+                    rollup.table,
+                    rollup.name,
+                    rollup.alias,
+                    rollup.path,
+                    rollup.sql,
+                    fingerprint,
+                ],
+            )
+    finally:
+        conn.sql(f"DETACH {NAME}")
+    alias_store.attach(conn, NAME, path, read_only=True)
+    return failures
+
+
+def status(conn, rollups, aliases, path=None):
+    """``{name: "fresh" | "stale" | "not built"}`` for ``rollups``, read-only."""
+    path = rollups_file() if path is None else path
+    try:
+        alias_store.attach(conn, NAME, path, read_only=True)
+    except duckdb.Error:
+        return {rollup.name: "not built" for rollup in rollups}
+    try:
+        built = _built(conn)
+        stale = {rollup.name for rollup in _stale(conn, rollups, aliases)}
+    finally:
+        conn.sql(f"DETACH {NAME}")
+    return {
+        rollup.name: (
+            "not built"
+            if rollup.table not in built
+            else "stale" if rollup.name in stale else "fresh"
+        )
+        for rollup in rollups
+    }
@@ -0,0 +1,118 @@
+"""Run a query over a sharded alias in several processes, then merge.
+
+A glob of ``.duckdb`` files is already one table per name in a single DuckDB
+(see ``aliases.attach_databases``), and DuckDB spreads that union over its
+threads.  Shards that are large, or many, can also be spread over processes:
+``scatter`` runs the query against batches of shards in a process pool,
+then merges the partial results the way ``pksql --watch`` merges new files
+(see ``pksql.partials``), so only decomposable queries qualify.
+
+Each worker binds its batch under the alias's name and runs the query
+unchanged, writing its partial result to a scratch DuckDB file; the caller
+attaches those and merges them, so no value is converted through Python on
+the way.
+"""
+
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import duckdb
+
+from pksql import aliases as alias_store
+from pksql import partials
+
+PARTIAL = "pksql_partial"
+
+# Shards are handed out in batches, so that a worker's fixed costs (starting
+# DuckDB, writing its result) are paid per batch rather than per shard.  A few
+# batches per process keep the processes evenly loaded.
+BATCHES_PER_PROCESS = 4
+RESULT = "pksql_shard_result"
+
+
+def sharded(path):
+    """Whether ``path`` is a glob of ``.duckdb`` shards."""
+    return alias_store.is_database(path) and alias_store.is_glob(path)
+
+
+def _partial(sql, name, paths, out, params, threads):
+    """Run ``sql`` against just the shards ``paths``, bound as alias ``name``.
+
+    The partial result goes to table ``partial`` in a new database at ``out``.
+    Returns ``False`` if those shards lack the table the query reads, in which
+    case they contribute nothing.
+    """
+    conn = duckdb.connect(database=":memory:", config={"threads": threads})
+    try:
+        alias_store.attach_shards(conn, name, paths)
+        alias_store.attach(conn, PARTIAL, out, read_only=False)
+        try:
+            conn.execute(f"CREATE TABLE {PARTIAL}.partial AS ({sql})", params)
+        except duckdb.CatalogException:
+            return False
+        return True
+    finally:
+        conn.close()
+
+
+def scatter(conn, sql, aliases, names, processes, params=None):
+    """The result of ``sql`` computed over shards in ``processes``, as a relation.
+
+    ``conn`` has the aliases bound and ``names`` are those the query uses.
+    Returns ``None`` if the query does not read exactly one sharded alias
+    decomposably, for the caller to run it as usual.
+    """
+    shard_aliases = [name for name in names if sharded(aliases[name])]
+    if len(shard_aliases) != 1:
+        return None
+    (name,) = shard_aliases
+    tables = [
+        f"{name}.{table}"
+        for (table,) in conn.execute(
+            "SELECT view_name FROM duckdb_views() "
+            "WHERE database_name = 'memory' AND schema_name = ?",
+            [name],
+        ).fetchall()
+    ]
+    plan = partials.decompose(conn, sql, [name, *tables])
+    if plan is None:
+        return None
+    # Binding here reports a bad query once, not once per shard, and checks
+    # that the result can be merged before any shard is read.
+    plan.merge_sql(RESULT, conn.sql(sql, params=params or None))
+
+    shards = alias_store.files(aliases[name])
+    count = min(len(shards), processes * BATCHES_PER_PROCESS)
+    batches = [shards[start::count] for start in range(count)]
+    threads = max(1, (os.cpu_count() or 1) // processes)
+    # DuckDB's threads do not survive fork(), so start workers afresh.
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="pksql-shards-") as scratch:
+        with ProcessPoolExecutor(processes, mp_context=context) as pool:
+            futures = {}
+            for i, batch in enumerate(batches):
+                out = os.path.join(scratch, f"{i}.duckdb")
+                futures[out] = pool.submit(
+                    _partial, sql, name, batch, out, params or None, threads
+                )
+            outs = [out for out, future in futures.items() if future.result()]
+        if not outs:
+            return None
+
+        parts = [f"{PARTIAL}_{i}" for i in range(len(outs))]
+        for part, out in zip(parts, outs):
+            alias_store.attach(conn, part, out)
+        try:
+            union = " UNION ALL ".join(
+                f"SELECT * FROM {part}.partial" for part in parts
+            )
+            merge = plan.merge_sql(
+                f"({union})", conn.sql(f"SELECT * FROM {parts[0]}.partial")
+            )
+            conn.sql(f"CREATE OR REPLACE TEMP TABLE {RESULT} AS {merge}")
+        finally:
+            for part in parts:
+                conn.sql(f"DETACH {part}")
+    return conn.sql(f"SELECT * FROM {RESULT}")
@@ -0,0 +1,209 @@
+"""Standard input as the table ``stdin``, so pksql can sit in a pipeline.
+
+    producer | pksql "SELECT key, count(*) FROM stdin GROUP BY 1"
+
+DuckDB's CSV reader scans a pipe as it fills, so rows are aggregated as they
+arrive and the input never has to fit in memory, but only when it is told the
+columns up front: sniffing them means reading a sample and then starting
+over, and a pipe cannot be rewound.  So pksql sniffs for it.  It reads a
+sample, lets DuckDB work out the dialect and schema from that, then relays the
+sample followed by the rest of standard input through a fresh pipe to a
+reader configured with what was sniffed.  Newline-delimited JSON goes through
+the same reader one line at a time and is parsed with ``json_transform``.
+Input that fits in the sample, or a file redirected to standard input, is
+simply read in full.
+
+Arrow IPC streams carry their own schema and are handed to DuckDB as a
+record batch reader, which needs the optional ``pyarrow``.
+
+However it is read, standard input can only be scanned once per query.
+"""
+
+import json
+import os
+import stat
+import tempfile
+import threading
+
+import duckdb
+
+from pksql import aliases as alias_store
+
+NAME = "stdin"
+FORMATS = ("csv", "ndjson", "arrow")
+
+# How much input the schema is sniffed from.  Later rows that do not fit it
+# fail the query (CSV) or come out as NULL (JSON).
+SAMPLE_BYTES = 1 << 20
+_CHUNK = 1 << 16
+
+# NDJSON lines are read whole, so allow for large objects.
+_MAX_LINE = 16 << 20
+
+
+class StdinError(Exception):
+    """Standard input cannot be read in the requested format."""
+
+
+def _read_sample(fd):
+    """Up to ``SAMPLE_BYTES`` from ``fd``, and whether that was all of it."""
+    chunks, size = [], 0
+    while size < SAMPLE_BYTES:
+        chunk = os.read(fd, min(_CHUNK, SAMPLE_BYTES - size))
+        if not chunk:
+            return b"".join(chunks), True
+        chunks.append(chunk)
+        size += len(chunk)
+    return b"".join(chunks), False
+
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view) :]
+
+
+def _pump(sample, source, sink):
+    """Copy ``sample`` and then the rest of ``source`` into the pipe ``sink``."""
+    try:
+        _write_all(sink, sample)
+        while chunk := os.read(source, _CHUNK):
+            _write_all(sink, chunk)
+    except BrokenPipeError:
+        pass  # The query stopped reading, say at a LIMIT.
+    finally:
+        os.close(sink)
+
+
+def _relay(sample, fd):
+    """A path that reads as ``sample`` followed by whatever else ``fd`` yields."""
+    read_end, write_end = os.pipe()
+    thread = threading.Thread(
+        target=_pump, args=(sample, fd, write_end), name="pksql-stdin", daemon=True
+    )
+    thread.start()
+    return f"/dev/fd/{read_end}"
+
+
+def _full_reader(path, fmt):
+    if fmt == "csv":
+        return f"read_csv({alias_store.quote(path)})"
+    return f"read_json({alias_store.quote(path)}, format = 'newline_delimited')"
+
+
+def _csv_options(conn, sample):
+    """``read_csv`` options for the dialect and schema sniffed from ``sample``."""
+    found = conn.sql(f"SELECT * FROM sniff_csv({alias_store.quote(sample)})")
+    found = dict(zip(found.columns, found.fetchone()))
+    columns = ", ".join(
+        f"{alias_store.quote(column['name'])}: {alias_store.quote(column['type'])}"
+        for column in found["Columns"]
+    )
+    # Quoting is harmless where there are no quotes, so keep it even if the
+    # sample happened to have none.
+    quote = '"' if found["Quote"] == "(empty)" else found["Quote"]
+    options = [
+        "auto_detect = false",
+        f"delim = {alias_store.quote(found['Delimiter'])}",
+        f"quote = {alias_store.quote(quote)}",
+        f"skip = {found['SkipRows']}",
+        f"header = {str(found['HasHeader']).lower()}",
+        f"columns = {{{columns}}}",
+    ]
+    if found["Escape"] != "(empty)":
+        options.append(f"escape = {alias_store.quote(found['Escape'])}")
+    if found["Comment"] != "(empty)":
+        options.append(f"comment = {alias_store.quote(found['Comment'])}")
+    if found["DateFormat"]:
+        options.append(f"dateformat = {alias_store.quote(found['DateFormat'])}")
+    if found["TimestampFormat"]:
+        options.append(
+            f"timestampformat = {alias_store.quote(found['TimestampFormat'])}"
+        )
+    return ", ".join(options)
+
+
+def _ndjson_structure(conn, sample):
+    """The ``json_transform`` structure of the records sniffed from ``sample``."""
+    described = conn.sql(
+        f"DESCRIBE SELECT * FROM read_json({alias_store.quote(sample)}, "
+        "format = 'newline_delimited')"
+    ).fetchall()
+    return json.dumps({name: kind for name, kind, *_ in described})
+
+
+def _ndjson_reader(path, structure):
+    """The records of the NDJSON at ``path``, typed by ``structure``."""
+    # One VARCHAR column per line: no delimiter or quote can split it.
+    lines = (
+        f"read_csv({alias_store.quote(path)}, auto_detect = false, header = false, "
+        "columns = {'line': 'VARCHAR'}, delim = chr(0), quote = '', escape = '', "
+        f"max_line_size = {_MAX_LINE})"
+    )
+    structure = alias_store.quote(structure)
+    return (
+        f"(SELECT record.* FROM (SELECT json_transform(line, {structure}) "
+        f"AS record FROM {lines} WHERE trim(line) <> ''))"
+    )
+
+
+def _bind_arrow(conn, fd):
+    try:
+        import pyarrow.ipc
+    except ImportError:
+        raise StdinError(
+            "reading Arrow from stdin needs pyarrow (pip install pyarrow)"
+        ) from None
+    try:
+        reader = pyarrow.ipc.open_stream(os.fdopen(fd, "rb", closefd=False))
+    except pyarrow.ArrowInvalid as e:
+        raise StdinError(f"stdin is not an Arrow IPC stream: {e}") from None
+    conn.register(NAME, reader)
+
+
+def bind(conn, fmt="csv", fd=0):
+    """Expose ``fd`` (standard input) on ``conn`` as the table ``stdin``.
+
+    ``fmt`` is one of ``FORMATS``.  Raises ``StdinError`` if standard input is
+    a terminal, or is not what ``fmt`` says it is.
+    """
+    if os.isatty(fd):
+        raise StdinError("the query reads stdin, but nothing is piped into it")
+    if fmt == "arrow":
+        _bind_arrow(conn, fd)
+        return
+    if stat.S_ISREG(os.fstat(fd).st_mode):
+        # A redirected file can be sniffed and read like any other.
+        path = f"/dev/fd/{fd}"
+        conn.sql(f"CREATE TEMP VIEW {NAME} AS SELECT * FROM {_full_reader(path, fmt)}")
+        return
+
+    sample, complete = _read_sample(fd)
+    if not sample:
+        raise StdinError("stdin is empty")
+    with tempfile.TemporaryDirectory(prefix="pksql-stdin-") as scratch:
+        sample_file = os.path.join(scratch, f"sample.{fmt}")
+        with open(sample_file, "wb") as out:
+            # Sniff whole lines only; the relay still passes on every byte.
+            out.write(sample if complete else sample[: sample.rfind(b"\n") + 1])
+        try:
+            if complete:
+                # Small enough to have read already: keep it as a table.
+                conn.sql(
+                    f"CREATE TEMP TABLE {NAME} AS "
+                    f"SELECT * FROM {_full_reader(sample_file, fmt)}"
+                )
+                return
+            if fmt == "csv":
+                options = _csv_options(conn, sample_file)
+            else:
+                structure = _ndjson_structure(conn, sample_file)
+        except duckdb.Error as e:
+            raise StdinError(f"cannot read stdin as {fmt}: {e}") from None
+
+    path = _relay(sample, fd)
+    if fmt == "csv":
+        reader = f"read_csv({alias_store.quote(path)}, {options})"
+    else:
+        reader = _ndjson_reader(path, structure)
+    conn.sql(f"CREATE TEMP VIEW {NAME} AS SELECT * FROM {reader}")
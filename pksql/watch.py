@@ -0,0 +1,122 @@
+"""Re-run a query whenever the files behind its aliases change.
+
+``Watcher`` decides how each update is computed.  In general the query simply
+runs again.  When it reads a single glob alias decomposably (see
+``pksql.partials``), it instead scans only the files that appeared since the
+previous update and merges their partial result into the one it kept, so an
+append-only directory costs time proportional to what was added.  Should a
+file it already scanned change or disappear, the kept result is no longer
+trustworthy and the next update starts over from a full scan.
+"""
+
+import os
+import time
+
+from pksql import aliases as alias_store
+from pksql import partials
+
+STATE = "pksql_watch_state"
+DELTA = "pksql_watch_delta"
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class IncrementalQuery:
+    """The result of ``plan``'s query over a growing glob, kept up to date."""
+
+    def __init__(self, conn, sql, plan, path, params=None):
+        self.conn = conn
+        self.sql = sql
+        self.params = params or None
+        self.plan = plan
+        self.path = path
+        self.seen = {}
+        self.scanned = 0  # Files read by the latest update.
+
+    def update(self):
+        """Fold any new files into the kept result and return it as a relation."""
+        current = {name: _stamp(name) for name in alias_store.files(self.path)}
+        if any(current.get(name) != stamp for name, stamp in self.seen.items()):
+            self.seen = {}
+        new = [name for name in current if name not in self.seen]
+        if not new and self.seen:
+            self.scanned = 0
+            return self.conn.sql(f"SELECT * FROM {STATE}")
+        scan = alias_store.scan_sql(new) if new else None
+        if scan is None:
+            # No files at all, or a reader that cannot be given a list: run the
+            # query as it stands and start afresh next time.
+            self.seen = {}
+            self.scanned = len(current)
+            return self.conn.sql(self.sql, params=self.params)
+
+        # Read the listed files even on a first scan: a file landing between
+        # the listing and the scan must not be counted now and again later.
+        view = self.plan.table
+        self.conn.sql(f'CREATE OR REPLACE TEMP VIEW "{view}" AS SELECT * FROM {scan}')
+        try:
+            self.conn.sql(
+                f"CREATE OR REPLACE TEMP TABLE {DELTA} AS ({self.sql})",
+                params=self.params,
+            )
+        finally:
+            self.conn.sql(f'DROP VIEW temp.main."{view}"')
+        self.scanned = len(new)
+
+        if self.seen:
+            combined = f"(SELECT * FROM {STATE} UNION ALL SELECT * FROM {DELTA})"
+            merge = self.plan.merge_sql(combined, self.conn.table(DELTA))
+            self.conn.sql(f"CREATE OR REPLACE TEMP TABLE {STATE} AS {merge}")
+        else:
+            self.conn.sql(f"CREATE OR REPLACE TEMP TABLE {STATE} AS FROM {DELTA}")
+        self.seen.update((name, current[name]) for name in new)
+        return self.conn.sql(f"SELECT * FROM {STATE}")
+
+
+class Watcher:
+    """Runs ``sql`` on ``conn``, incrementally where the query allows it.
+
+    ``params`` gives the values of the query's named parameters, if any.
+    """
+
+    def __init__(self, conn, sql, aliases, params=None):
+        self.conn = conn
+        self.sql = sql
+        self.params = params or None
+        names = alias_store.referenced(sql, aliases)
+        self.paths = [aliases[name] for name in names]
+        self.incremental = None
+        plan = partials.decompose(conn, sql, names)
+        if plan is not None:
+            path = aliases[plan.table]
+            if alias_store.is_glob(path):
+                self.incremental = IncrementalQuery(conn, sql, plan, path, params)
+
+    def fingerprint(self):
+        return [alias_store.fingerprint(path) for path in self.paths]
+
+    def run(self):
+        """The query's current result, as a relation (``None`` for no result set)."""
+        if self.incremental is not None:
+            return self.incremental.update()
+        return self.conn.sql(self.sql, params=self.params)
+
+
+def changes(watcher, interval, sleep=None):
+    """Yield straight away, then again each time the watched files change.
+
+    Polls every ``interval`` seconds; a fingerprint is cheap (a directory
+    listing and some ``stat`` calls), so this works on any filesystem,
+    including network mounts where change notification does not.
+    """
+    sleep = time.sleep if sleep is None else sleep
+    last = None
+    while True:
+        current = watcher.fingerprint()
+        if current != last:
+            last = current
+            yield
+        sleep(interval)
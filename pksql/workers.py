@@ -0,0 +1,291 @@
+"""Run a query's partial results on pksql workers, possibly on other hosts.
+
+One DuckDB is limited to one machine's disks and network.  ``pksql worker``
+listens on a TCP or Unix socket; ``gather`` sends each worker the query and a
+share of the files behind the alias it reads, and merges the partial results
+the way ``pksql --watch`` merges new files (see ``pksql.partials``), so only
+decomposable queries qualify.
+
+Where the files are visible to the coordinator (a shared filesystem), they are
+split evenly between the workers.  Where they are not (each host holds its own
+part of the data), every worker reads whatever matches the alias's path on its
+own host.
+
+Partial results come back as an Arrow IPC stream when ``pyarrow`` is installed
+at both ends, and otherwise as a scratch DuckDB database file, as between
+``pksql.shards`` processes; parquet would do, but has no 128-bit integers for
+sums to arrive in.  Either way no value is converted through Python.
+
+A worker runs SQL sent by anyone who can reach its socket, so it refuses
+anything but a decomposable ``SELECT`` over the one alias it is sent, reads
+only files under its root directories, and runs the query in a DuckDB that
+can open no other file.  Listen on localhost or a Unix socket unless the
+network is trusted.
+"""
+
+import io
+import json
+import os
+import socket
+import socketserver
+import struct
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import duckdb
+
+from pksql import aliases as alias_store
+from pksql import partials
+
+DEFAULT_ADDRESS = "127.0.0.1:7878"
+CONNECT_TIMEOUT = 10
+RESULT = "pksql_worker_result"
+PARTIAL = "pksql_worker_partial"
+
+_LENGTH = struct.Struct(">Q")
+
+
+class WorkerError(Exception):
+    """Raised when a worker cannot be reached or fails its part of a query."""
+
+
+def _pyarrow():
+    try:
+        import pyarrow.ipc
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def parse_address(text):
+    """``(socket family, address)`` for ``unix:/path`` or ``host:port``."""
+    text = text.strip()
+    if text.startswith("unix:"):
+        return socket.AF_UNIX, text[len("unix:") :]
+    host, sep, port = text.rpartition(":")
+    if not sep or not port.isdigit():
+        raise WorkerError(f"expected host:port or unix:/path, got {text!r}")
+    return socket.AF_INET, (host.strip("[]") or "127.0.0.1", int(port))
+
+
+def _send(sock, payload):
+    sock.sendall(_LENGTH.pack(len(payload)) + payload)
+
+
+def _receive_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("connection closed mid-message")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _receive(sock):
+    (size,) = _LENGTH.unpack(_receive_exactly(sock, _LENGTH.size))
+    return _receive_exactly(sock, size)
+
+
+def _inside(path, roots):
+    real = os.path.realpath(path)
+    return any(os.path.commonpath([real, root]) == root for root in roots)
+
+
+def run_partial(request, roots):
+    """Compute one worker's partial result: ``(header, body)``.
+
+    ``request`` gives the ``sql``, the alias ``name``, and either the ``paths``
+    to read or a ``glob`` to match locally; every file must be under one of
+    the directories ``roots``.  The header says which ``format`` the body is
+    in, or that the worker had no files (``"empty"``).
+    """
+    name, sql = request["name"], request["sql"]
+    if not alias_store.NAME_RE.match(name):
+        raise WorkerError(f"{name!r} is not an alias name")
+    paths = request.get("paths") or alias_store.files(request.get("glob", ""))
+    roots = [os.path.realpath(root) for root in roots]
+    outside = [path for path in paths if not _inside(path, roots)]
+    if outside:
+        raise WorkerError(f"{outside[0]} is outside {', '.join(roots)}")
+    if not paths:
+        return {"format": "empty"}, b""
+    scan = alias_store.scan_sql(paths)
+    if scan is None:
+        raise WorkerError("the files differ in kind, or are not data files")
+
+    pyarrow = _pyarrow() if request.get("format") == "arrow" else None
+    params = request.get("params") or None
+    with tempfile.TemporaryDirectory(prefix="pksql-worker-") as scratch:
+        out = os.path.join(scratch, "partial.duckdb")
+        conn = duckdb.connect(database=":memory:")
+        try:
+            conn.sql(f'CREATE VIEW "{name}" AS SELECT * FROM {scan}')
+            if partials.decompose(conn, sql, [name]) is None:
+                raise WorkerError("workers only run count/sum/min/max queries")
+            if pyarrow is None:
+                alias_store.attach(conn, PARTIAL, out, read_only=False)
+            # From here on, the query can read the alias's files and no other.
+            conn.execute("SET allowed_paths = ?", [paths])
+            conn.sql("SET enable_external_access = false")
+            if pyarrow is not None:
+                reader = conn.execute(sql, params).fetch_record_batch()
+                body = io.BytesIO()
+                with pyarrow.ipc.new_stream(body, reader.schema) as writer:
+                    for batch in reader:
+                        writer.write_batch(batch)
+                return {"format": "arrow"}, body.getvalue()
+            conn.execute(f"CREATE TABLE {PARTIAL}.partial AS ({sql})", params)
+            conn.sql(f"DETACH {PARTIAL}")
+        finally:
+            conn.close()
+        with open(out, "rb") as f:
+            return {"format": "duckdb"}, f.read()
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(_receive(self.request))
+        except (ConnectionError, ValueError):
+            return
+        try:
+            header, body = run_partial(request, self.server.roots)
+        except (WorkerError, duckdb.Error, KeyError, TypeError) as e:
+            header, body = {"error": str(e)}, b""
+        _send(self.request, json.dumps(header).encode())
+        _send(self.request, body)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def server(address, roots):
+    """A server answering requests on ``address`` for files under ``roots``.
+
+    It is not serving yet.  A leftover Unix socket file is replaced, unless a
+    worker still answers on it.
+    """
+    family, where = parse_address(address)
+    if family == socket.AF_INET:
+        listening = _TCPServer(where, _Handler)
+        listening.roots = list(roots)
+        return listening
+    if os.path.exists(where):
+        probe = socket.socket(socket.AF_UNIX)
+        try:
+            probe.connect(where)
+        except OSError:
+            os.unlink(where)
+        else:
+            raise WorkerError(f"a worker is already listening on {where}")
+        finally:
+            probe.close()
+    listening = _UnixServer(where, _Handler)
+    listening.roots = list(roots)
+    return listening
+
+
+def ask(address, request):
+    """Send ``request`` to the worker at ``address``: ``(header, body)``."""
+    family, where = parse_address(address)
+    try:
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(where)
+            sock.settimeout(None)
+            _send(sock, json.dumps(request).encode())
+            header = json.loads(_receive(sock))
+            body = _receive(sock)
+    except (OSError, ValueError) as e:
+        raise WorkerError(f"worker {address}: {e}") from None
+    if "error" in header:
+        raise WorkerError(f"worker {address}: {header['error']}")
+    return header, body
+
+
+def split(conn, sql, aliases, names):
+    """The ``partials.Plan`` workers would run ``sql`` by, or ``None``.
+
+    Only a query reading exactly one file alias decomposably can be split.
+    ``conn`` has the aliases bound and ``names`` are those the query uses.
+    """
+    if len(names) != 1:
+        return None
+    (name,) = names
+    path = aliases[name]
+    if alias_store.is_database(path) or "://" in path:
+        return None
+    return partials.decompose(conn, sql, [name])
+
+
+def gather(conn, sql, aliases, names, workers, params=None):
+    """The result of ``sql`` computed by ``workers``, as a relation on ``conn``.
+
+    ``conn`` has the aliases bound and ``names`` are those the query uses.
+    Returns ``None`` if ``split`` cannot split the query, for the caller to
+    run it as usual.  Raises ``WorkerError`` if a worker fails.
+    """
+    plan = split(conn, sql, aliases, names)
+    if plan is None:
+        return None
+    name = plan.table
+    path = aliases[name]
+
+    files = alias_store.files(path)
+    if files:
+        # Binding here reports a bad query once, not once per worker.
+        plan.merge_sql(RESULT, conn.sql(sql, params=params or None))
+        shares = [files[i :: len(workers)] for i in range(len(workers))]
+        requests = [{"paths": share} for share in shares if share]
+    else:
+        requests = [{"glob": path}] * len(workers)
+    common = {
+        "name": name,
+        "sql": sql,
+        "params": params or {},
+        "format": "arrow" if _pyarrow() else "duckdb",
+    }
+    with ThreadPoolExecutor(len(requests)) as pool:
+        answers = list(
+            pool.map(
+                lambda worker, request: ask(worker, {**common, **request}),
+                workers,
+                requests,
+            )
+        )
+
+    with tempfile.TemporaryDirectory(prefix="pksql-gather-") as scratch:
+        tables, registered, attached = [], [], []
+        try:
+            for i, (header, body) in enumerate(answers):
+                part = f"{PARTIAL}_{i}"
+                if header["format"] == "arrow":
+                    conn.register(part, _pyarrow().ipc.open_stream(body).read_all())
+                    registered.append(part)
+                    tables.append(part)
+                elif header["format"] == "duckdb":
+                    out = os.path.join(scratch, f"{i}.duckdb")
+                    with open(out, "wb") as f:
+                        f.write(body)
+                    alias_store.attach(conn, part, out)
+                    attached.append(part)
+                    tables.append(f"{part}.partial")
+            if not tables:
+                raise WorkerError(f"no worker has any files matching {path}")
+            union = " UNION ALL ".join(f"SELECT * FROM {table}" for table in tables)
+            merge = plan.merge_sql(f"({union})", conn.sql(f"SELECT * FROM {tables[0]}"))
+            conn.sql(f"CREATE OR REPLACE TEMP TABLE {RESULT} AS {merge}")
+        finally:
+            for part in registered:
+                conn.unregister(part)
+            for part in attached:
+                conn.sql(f"DETACH {part}")
+    return conn.sql(f"SELECT * FROM {RESULT}")
@@ -1,12 +1,15 @@
+import duckdb
 import pytest
 
+from pksql import aliases
+
 
 @pytest.fixture
 def workspace(tmp_path, monkeypatch):
     """An empty working directory with its own ``$HOME``.
 
-    Alias lookup reads ``./.pksql`` and ``~/.pksql``, so tests must not see
-    (or write to) the real ones.
+    Alias lookup reads ``./.pksql`` and ``~/.pksql``, and caches live under
+    ``~/.cache/pksql``, so tests must not see (or write to) the real ones.
     """
     home = tmp_path / "home"
     work = tmp_path / "work"
@@ -14,5 +17,23 @@ def workspace(tmp_path, monkeypatch):
     work.mkdir()
     monkeypatch.setenv("HOME", str(home))
     monkeypatch.setenv("USERPROFILE", str(home))
+    monkeypatch.delenv("XDG_CACHE_HOME", raising=False)
     monkeypatch.chdir(work)
     return work
+
+
+@pytest.fixture
+def bind():
+    """``bind(registered)``: a new in-memory connection with the aliases bound.
+
+    File aliases get their views and database aliases are attached, as a query
+    naming all of them would have them.
+    """
+
+    def bind(registered):
+        conn = duckdb.connect(database=":memory:")
+        aliases.create_views(conn, registered)
+        assert aliases.attach_databases(conn, registered, list(registered)) == []
+        return conn
+
+    return bind
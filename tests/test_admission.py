@@ -0,0 +1,65 @@
+import os
+import threading
+import time
+
+import pytest
+from click.testing import CliRunner
+
+from pksql import admission
+from pksql.main import cli
+
+pytestmark = pytest.mark.skipif(admission.fcntl is None, reason="needs flock")
+
+
+@pytest.fixture
+def runtime(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    return tmp_path / "pksql"
+
+
+def test_slots_live_in_a_private_runtime_directory(runtime):
+    assert admission.slots_dir() == runtime
+    assert runtime.stat().st_mode & 0o777 == 0o700
+
+
+def test_queries_past_the_limit_wait_for_a_slot(runtime):
+    waits = []
+
+    def later():
+        with admission.admitted(2) as waited:
+            waits.append(waited)
+
+    with admission.admitted(2) as first, admission.admitted(2) as second:
+        assert first < 0.1 and second < 0.1
+        thread = threading.Thread(target=later)
+        thread.start()
+        time.sleep(0.3)
+        assert waits == []
+    thread.join()
+
+    assert 0.2 < waits[0] < 5
+    with admission.admitted(1) as waited:  # Every slot was given back.
+        assert waited < 0.1
+
+
+def test_budget_splits_cores_and_memory(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+    monkeypatch.setattr(admission, "physical_memory", lambda: 16 * 2**30)
+
+    assert admission.budget(4) == {
+        "threads": 2,
+        "memory_limit": f"{int(16 * 2**30 * 0.8 / 4)}B",
+    }
+    assert admission.budget(16)["threads"] == 1
+
+
+def test_cli_reports_the_wait_apart_from_the_query(runtime, workspace):
+    result = CliRunner().invoke(
+        cli,
+        ["-F", "csv", "SELECT current_setting('threads') >= 1 AS ok"],
+        env={"PKSQL_MAX_CONCURRENT": "1"},
+    )
+    assert result.exit_code == 0, result.output
+    assert result.stdout.strip() == "ok\nTrue"
+    assert "Queue wait:" in result.stderr
+    assert "Query time:" in result.stderr
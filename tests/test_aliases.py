@@ -25,6 +25,19 @@ def test_parse_reads_names_comments_and_quotes():
     }
 
 
+def test_parse_skips_directives_but_not_aliases_named_like_them():
+    parsed = aliases.parse("rollup daily = hits by day: count(*)\nrollup = r.parquet")
+    assert parsed == {"rollup": "r.parquet"}
+
+
+def test_settings_come_from_set_lines_and_local_files_win(workspace):
+    (Path.home() / ".pksql").write_text("set workers = a:1\nset max_scan = 1GB\n")
+    (workspace / ".pksql").write_text("set workers = 'b:1, c:1'\nset = s.parquet\n")
+
+    assert aliases.settings() == {"workers": "b:1, c:1", "max_scan": "1GB"}
+    assert aliases.load() == {"set": str(workspace / "s.parquet")}
+
+
 @pytest.mark.parametrize(
     "text",
     [
@@ -106,6 +119,57 @@ def test_create_views_quotes_paths_containing_quotes(workspace):
     conn.close()
 
 
+def _database(path, **tables):
+    conn = duckdb.connect(str(path))
+    for table, sql in tables.items():
+        conn.sql(f"CREATE TABLE {table} AS {sql}")
+    conn.close()
+    return str(path)
+
+
+def test_databases_are_attached_only_when_named(workspace):
+    registered = {
+        "corpus": _database(
+            workspace / "corpus.duckdb",
+            documents="SELECT 1 AS id",
+            tokens="SELECT 1 AS doc, 'x' AS token",
+        ),
+        "other": _database(workspace / "other.duckdb", t="SELECT 2 AS n"),
+    }
+    conn = duckdb.connect(database=":memory:")
+
+    assert aliases.create_views(conn, registered) == []
+    assert aliases.attach_databases(conn, registered, ["corpus"]) == []
+
+    attached = conn.sql(
+        "SELECT database_name FROM duckdb_databases() WHERE NOT internal"
+    ).fetchall()
+    assert sorted(attached) == [("corpus",), ("memory",)]
+    assert conn.sql(
+        "SELECT token FROM corpus.documents JOIN corpus.tokens ON doc = id"
+    ).fetchall() == [("x",)]
+    conn.close()
+
+
+def test_a_single_table_database_is_also_a_view(workspace):
+    registered = {"one": _database(workspace / "one.duckdb", t="SELECT 7 AS n")}
+    conn = duckdb.connect(database=":memory:")
+
+    aliases.attach_databases(conn, registered, ["one"])
+
+    assert conn.sql("SELECT * FROM one").fetchall() == [(7,)]
+    assert conn.sql("SELECT * FROM one.t").fetchall() == [(7,)]
+    conn.close()
+
+
+def test_a_missing_database_fails_to_attach(workspace):
+    conn = duckdb.connect(database=":memory:")
+    registered = {"gone": str(workspace / "gone.duckdb")}
+
+    assert aliases.attach_databases(conn, registered, ["gone"]) == ["gone"]
+    conn.close()
+
+
 @pytest.mark.parametrize("name", ["corpus", "hits2", "_x", "filter", "database"])
 def test_ordinary_identifiers_need_no_quoting(name):
     assert not aliases.needs_quoting(name)
@@ -146,3 +210,27 @@ def test_missing_only_checks_local_paths(workspace):
     assert aliases.missing(str(workspace / "*.csv"))
     assert not aliases.missing(str(workspace / "*.parquet"))
     assert not aliases.missing("s3://bucket/never-checked.parquet")
+
+
+def test_referenced_finds_aliases_in_any_statement():
+    names = ["corpus", "hits", "select", "unused"]
+    sql = (
+        'COPY (SELECT * FROM Corpus.documents JOIN "select" USING (id)) '
+        "TO 'out.csv' -- hits"
+    )
+    assert aliases.referenced(sql, names) == ["corpus", "select"]
+
+
+def test_fingerprint_tracks_the_files_behind_a_glob(workspace):
+    pattern = str(workspace / "*.parquet")
+    (workspace / "a.parquet").write_bytes(b"a")
+    before = aliases.fingerprint(pattern)
+    assert aliases.fingerprint(pattern) == before
+
+    (workspace / "b.parquet").write_bytes(b"b")
+    assert aliases.files(pattern) == [
+        str(workspace / "a.parquet"),
+        str(workspace / "b.parquet"),
+    ]
+    assert aliases.fingerprint(pattern) != before
+    assert aliases.fingerprint("s3://bucket/x.parquet") == "s3://bucket/x.parquet"
@@ -0,0 +1,82 @@
+import json
+
+import duckdb
+import pytest
+from click.testing import CliRunner
+
+from pksql import bench
+from pksql.main import cli
+
+
+def _connect():
+    return duckdb.connect(database=":memory:")
+
+
+def test_benchmark_summarises_timed_runs():
+    calls = []
+
+    def connect():
+        calls.append(None)
+        return _connect()
+
+    report = bench.benchmark(connect, "SELECT * FROM range(10)", {}, runs=5, warmup=2)
+    assert len(calls) == 1
+    assert report["runs"] == 5
+    assert report["rows"] == 10
+    assert (
+        report["min_seconds"]
+        <= report["median_seconds"]
+        <= report["p95_seconds"]
+        <= report["max_seconds"]
+    )
+    assert report["rows_per_second"] > 0
+
+
+def test_cold_runs_each_get_a_fresh_connection():
+    calls = []
+
+    def connect():
+        calls.append(None)
+        return _connect()
+
+    bench.benchmark(connect, "SELECT 1", {}, runs=3, warmup=1, cold=True)
+    assert len(calls) == 4
+
+
+def test_statements_without_results_are_timed_too():
+    report = bench.benchmark(
+        _connect, "CREATE TABLE t AS SELECT 1", {}, runs=1, warmup=0
+    )
+    assert report["rows"] is None
+    assert report["stddev_seconds"] == 0.0
+
+
+@pytest.mark.parametrize(
+    "fraction, expected", [(0.5, 5), (0.95, 10), (1.0, 10), (0.01, 1)]
+)
+def test_percentile_is_nearest_rank(fraction, expected):
+    assert bench._percentile(list(range(1, 11)), fraction) == expected
+
+
+def test_cli_bench_uses_aliases_and_emits_json(workspace):
+    duckdb.sql(
+        f"COPY (SELECT range AS a FROM range(100)) TO '{workspace / 'a.parquet'}'"
+    )
+    (workspace / ".pksql").write_text("a = a.parquet\n")
+
+    result = CliRunner().invoke(
+        cli, ["bench", "-n", "3", "--warmup", "0", "--cold", "SELECT * FROM a"]
+    )
+    assert result.exit_code == 0
+    report = json.loads(result.stdout)
+    assert report["rows"] == 100
+    assert report["cold"] is True
+    assert report["alias_files"] == 1
+    assert report["alias_bytes"] == (workspace / "a.parquet").stat().st_size
+    assert "median" in result.stderr
+
+
+def test_cli_bench_reports_errors(workspace):
+    result = CliRunner().invoke(cli, ["bench", "SELECT nonsense"])
+    assert result.exit_code == 1
+    assert "Error" in result.stderr
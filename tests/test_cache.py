@@ -0,0 +1,134 @@
+import functools
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import duckdb
+import pytest
+from click.testing import CliRunner
+
+from pksql import cache
+from pksql.main import cli
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    """A local HTTP server standing in for a remote store, serving ``tmp_path/www``.
+
+    ``SimpleHTTPRequestHandler`` sends ``Last-Modified`` (no ``ETag``), which is
+    enough to validate against.
+    """
+    root = tmp_path / "www"
+    root.mkdir()
+    handler = functools.partial(_QuietHandler, directory=str(root))
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield root, f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _publish(root, name, sql, mtime):
+    path = root / name
+    duckdb.sql(f"COPY ({sql}) TO '{path}' (FORMAT PARQUET)")
+    # Last-Modified has one-second resolution, so pin it explicitly.
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_fetch_misses_then_hits(server, workspace):
+    root, base = server
+    _publish(root, "a.parquet", "SELECT 1 AS a", 1_700_000_000)
+    store = cache.RemoteCache()
+
+    first = store.fetch(f"{base}/a.parquet")
+    second = store.fetch(f"{base}/a.parquet")
+
+    assert first == second
+    assert first.endswith(".parquet")
+    assert duckdb.sql(f"SELECT * FROM '{first}'").fetchall() == [(1,)]
+    assert (store.hits, store.misses) == (1, 1)
+    assert store.stats()["hits"] == 1
+
+
+def test_a_changed_object_is_fetched_again(server, workspace):
+    root, base = server
+    _publish(root, "a.parquet", "SELECT 1 AS a", 1_700_000_000)
+    store = cache.RemoteCache()
+    old = store.fetch(f"{base}/a.parquet")
+
+    _publish(root, "a.parquet", "SELECT 2 AS a", 1_700_000_100)
+    new = store.fetch(f"{base}/a.parquet")
+
+    assert new != old
+    assert duckdb.sql(f"SELECT * FROM '{new}'").fetchall() == [(2,)]
+    assert store.misses == 2
+
+
+def test_eviction_drops_the_least_recently_used(server, workspace):
+    root, base = server
+    for i, name in enumerate("abc"):
+        _publish(root, f"{name}.parquet", f"SELECT {i} AS a", 1_700_000_000)
+    size = (root / "a.parquet").stat().st_size
+    store = cache.RemoteCache(limit=2 * size)
+
+    a = store.fetch(f"{base}/a.parquet")
+    b = store.fetch(f"{base}/b.parquet")
+    store.fetch(f"{base}/a.parquet")  # a is now fresher than b
+    store.fetch(f"{base}/c.parquet")
+
+    assert os.path.exists(a)
+    assert not os.path.exists(b)
+    assert store.stats()["objects"] == 2
+
+
+def test_objects_larger_than_the_limit_are_not_cached(server, workspace):
+    root, base = server
+    small = _publish(root, "a.parquet", "SELECT 1 AS a", 1_700_000_000)
+    _publish(root, "big.parquet", "SELECT range AS a FROM range(1000)", 1_700_000_000)
+    store = cache.RemoteCache(limit=small.stat().st_size)
+    kept = store.fetch(f"{base}/a.parquet")
+
+    assert store.fetch(f"{base}/big.parquet") == f"{base}/big.parquet"
+    # Sized only once downloaded, when the server does not say up front.
+    head = store._head
+    store._head = lambda url: (head(url)[0], None)
+    assert store.fetch(f"{base}/big.parquet") == f"{base}/big.parquet"
+
+    assert os.path.exists(kept)
+    assert store.stats()["objects"] == 1
+    assert len(list((store.root / "objects").iterdir())) == 1
+
+
+def test_only_single_http_objects_are_cacheable():
+    assert cache.cacheable("https://host/x.parquet")
+    assert not cache.cacheable("https://host/*.parquet")
+    assert not cache.cacheable("s3://bucket/x.parquet")
+    assert not cache.cacheable("/local/x.parquet")
+
+
+def test_cli_caches_referenced_remote_aliases(server, workspace):
+    root, base = server
+    _publish(root, "a.parquet", "SELECT 7 AS a", 1_700_000_000)
+    (workspace / ".pksql").write_text(
+        f"remote = {base}/a.parquet\nother = {base}/never-read.parquet\n"
+    )
+    runner = CliRunner()
+
+    for expected in ("0 hits, 1 misses", "1 hits, 0 misses"):
+        result = runner.invoke(
+            cli, ["--cache-remote", "-F", "csv", "SELECT * FROM remote"]
+        )
+        assert result.exit_code == 0
+        assert result.stdout.strip() == "a\n7"
+        assert f"Remote cache: {expected}" in result.stderr
+
+    shown = runner.invoke(cli, ["cache"])
+    assert "1 objects" in shown.output
+    assert "50% hit rate" in shown.output
@@ -0,0 +1,140 @@
+import subprocess
+import sys
+
+import duckdb
+import pytest
+from click.testing import CliRunner
+
+from pksql import catalog
+from pksql.main import cli
+
+
+def _parquet(path, sql="SELECT 1 AS a"):
+    duckdb.sql(f"COPY ({sql}) TO '{path}' (FORMAT PARQUET)")
+    return str(path)
+
+
+@pytest.fixture
+def connect():
+    """Open a connection, closing the previous one as a finished run would.
+
+    A file attached by a live connection cannot be re-attached for writing,
+    even within one process.
+    """
+    conns = []
+
+    def connect():
+        if conns:
+            conns[-1].close()
+        conns.append(duckdb.connect(database=":memory:"))
+        return conns[-1]
+
+    yield connect
+    conns[-1].close()
+
+
+def test_views_survive_between_connections(workspace, connect):
+    registered = {"good": _parquet(workspace / "good.parquet", "SELECT 42 AS a")}
+    assert catalog.attach(connect(), registered) == []
+
+    conn = connect()
+    assert catalog.attach(conn, registered) == []
+    assert conn.sql("SELECT * FROM good").fetchall() == [(42,)]
+
+
+def test_unchanged_aliases_are_not_rebound(workspace, connect, monkeypatch):
+    registered = {"good": _parquet(workspace / "good.parquet")}
+    catalog.attach(connect(), registered)
+
+    def refresh(*args):
+        raise AssertionError("rebound an unchanged alias")
+
+    monkeypatch.setattr(catalog, "_refresh", refresh)
+    assert catalog.attach(connect(), registered) == []
+
+
+def test_each_project_keeps_its_own_views(workspace, connect, monkeypatch):
+    projects = []
+    for name in ("one", "two"):
+        directory = workspace / name
+        directory.mkdir()
+        path = _parquet(directory / "data.parquet", f"SELECT '{name}' AS a")
+        projects.append((directory, {"data": path}))
+    for directory, registered in projects:
+        catalog.attach(connect(), registered, cwd=directory)
+
+    def refresh(*args):
+        raise AssertionError("rebound another project's alias")
+
+    monkeypatch.setattr(catalog, "_refresh", refresh)
+    for _ in range(2):
+        for directory, registered in projects:
+            conn = connect()
+            assert catalog.attach(conn, registered, cwd=directory) == []
+            expected = [(directory.name,)]
+            assert conn.sql("SELECT * FROM data").fetchall() == expected
+
+
+def test_changed_sources_are_rebound(workspace, connect):
+    path = workspace / "data.parquet"
+    registered = {"data": _parquet(path, "SELECT 1 AS a")}
+    catalog.attach(connect(), registered)
+
+    _parquet(path, "SELECT 'x' AS b")  # new schema, so the old view is wrong
+    conn = connect()
+    catalog.attach(conn, registered)
+    assert conn.sql("SELECT * FROM data").fetchall() == [("x",)]
+
+
+def test_dead_and_removed_aliases(workspace, connect):
+    path = _parquet(workspace / "good.parquet")
+    catalog.attach(connect(), {"good": path, "dead": "/nowhere/dead.parquet"})
+
+    conn = connect()
+    assert catalog.attach(conn, {"dead": "/nowhere/dead.parquet"}) == ["dead"]
+    with pytest.raises(duckdb.CatalogException):
+        conn.sql("SELECT * FROM good")
+
+
+def test_tables_created_by_queries_stay_in_memory(workspace, connect):
+    conn = connect()
+    catalog.attach(conn, {"good": _parquet(workspace / "good.parquet")})
+    conn.sql("CREATE TABLE scratch AS SELECT 1")
+    assert conn.sql("SELECT current_database()").fetchone() == ("memory",)
+    assert conn.sql("SELECT count(*) FROM memory.scratch").fetchone() == (1,)
+
+
+def test_busy_catalog_falls_back(workspace, connect):
+    registered = {"good": _parquet(workspace / "good.parquet")}
+    catalog.attach(connect(), registered)
+    registered["other"] = _parquet(workspace / "other.parquet")
+
+    # Another process reading the catalog blocks the refresh this one needs.
+    holder = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "import duckdb, sys; c = duckdb.connect(); "
+            f"c.sql(\"ATTACH '{catalog.catalog_file()}' AS x (READ_ONLY)\"); "
+            "print('ready', flush=True); sys.stdin.read()",
+        ],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert holder.stdout.readline().strip() == "ready"
+        assert catalog.attach(connect(), registered) is None
+    finally:
+        holder.communicate("")
+
+
+def test_cli_queries_through_the_catalog(workspace):
+    _parquet(workspace / "good.parquet", "SELECT 7 AS a")
+    (workspace / ".pksql").write_text("good = good.parquet\n")
+    runner = CliRunner()
+    for _ in range(2):
+        result = runner.invoke(cli, ["--catalog", "-F", "csv", "SELECT * FROM good"])
+        assert result.exit_code == 0
+        assert result.stdout.strip() == "a\n7"
+    assert catalog.catalog_file().exists()
@@ -58,6 +58,38 @@ def test_cli_invalid_query():
     assert "Error" in result.stderr
 
 
+def test_cli_binds_params():
+    result = CliRunner().invoke(
+        cli, ["-p", "who=it's me", "-F", "csv", "SELECT $who AS who"]
+    )
+    assert result.exit_code == 0
+    assert result.stdout.strip() == "who\nit's me"
+
+
+def test_cli_rejects_a_malformed_param():
+    result = CliRunner().invoke(cli, ["-p", "oops", "SELECT 1"])
+    assert result.exit_code == 2
+    assert "expected NAME=VALUE" in result.stderr
+
+
+def test_cli_sweeps_params_from_stdin():
+    result = CliRunner().invoke(
+        cli,
+        [
+            "--params-file",
+            "-",
+            "-p",
+            "base=10",
+            "-F",
+            "csv",
+            "SELECT $base::INT + $n::INT AS total",
+        ],
+        input="n\n1\n2\n",
+    )
+    assert result.exit_code == 0
+    assert result.stdout == "base,n,total\n10,1,11\n10,2,12\n"
+
+
 def _parquet(path, sql="SELECT 1 AS a"):
     path.parent.mkdir(parents=True, exist_ok=True)
     duckdb.sql(f"COPY ({sql}) TO '{path}' (FORMAT PARQUET)")
@@ -184,6 +216,28 @@ def test_a_dead_alias_does_not_break_other_queries(workspace):
     assert "does not exist" in named.stderr
 
 
+def test_every_table_of_a_database_alias_is_queryable(workspace):
+    conn = duckdb.connect(str(workspace / "corpus.duckdb"))
+    conn.sql("CREATE TABLE documents AS SELECT 1 AS id, 'hello' AS body")
+    conn.sql("CREATE TABLE tokens AS SELECT 1 AS doc, 'hello' AS token")
+    conn.close()
+    (workspace / ".pksql").write_text("corpus = corpus.duckdb\n")
+
+    for flags in ([], ["--catalog"]):
+        result = CliRunner().invoke(
+            cli,
+            [
+                *flags,
+                "-F",
+                "csv",
+                "SELECT d.id, t.token FROM corpus.documents d "
+                "JOIN corpus.tokens t ON t.doc = d.id",
+            ],
+        )
+        assert result.exit_code == 0, result.output
+        assert result.stdout.strip() == "id,token\n1,hello"
+
+
 def test_malformed_alias_file_is_reported(workspace):
     (workspace / ".pksql").write_text("this is not an alias\n")
     result = CliRunner().invoke(cli, ["SELECT 1"])
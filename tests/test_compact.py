@@ -0,0 +1,84 @@
+import duckdb
+import pytest
+from click.testing import CliRunner
+
+from pksql import aliases, compact
+from pksql.main import cli
+
+
+@pytest.fixture
+def small_files(workspace):
+    """Twenty small parquet files behind alias ``hits``, in no useful order."""
+    (workspace / "results").mkdir()
+    for i in range(20):
+        duckdb.sql(
+            f"COPY (SELECT {i} AS part, (r * 37 + {i}) % 101 AS v "
+            f"FROM range(50) t(r)) TO 'results/{i}.parquet'"
+        )
+    (workspace / ".pksql").write_text("# kept\nhits = 'results/*.parquet'\n")
+    return workspace / "results"
+
+
+def test_compact_writes_sorted_files_of_the_same_rows(small_files, workspace):
+    conn = duckdb.connect()
+    scan = compact.source(str(small_files / "*.parquet"))
+
+    new_path = compact.compact(conn, scan, workspace / "out", 1 << 20, ["V"])
+
+    assert aliases.files(new_path) == [str(workspace / "out" / "part_0.parquet")]
+    rows = conn.sql(f"SELECT v FROM '{new_path}'").fetchall()
+    assert rows == sorted(conn.sql(f"SELECT v FROM {scan}").fetchall())
+    assert not [p for p in workspace.iterdir() if p.name.startswith(".out-")]
+
+
+def test_compact_refuses_unknown_columns_and_existing_output(small_files, workspace):
+    conn = duckdb.connect()
+    scan = compact.source(str(small_files / "*.parquet"))
+    (workspace / "taken").mkdir()
+
+    with pytest.raises(compact.CompactError, match="no column 'nope'"):
+        compact.compact(conn, scan, workspace / "out", 1 << 20, ["nope"])
+    with pytest.raises(compact.CompactError, match="already exists"):
+        compact.compact(conn, scan, workspace / "taken", 1 << 20)
+    with pytest.raises(compact.CompactError, match="database"):
+        compact.source(str(workspace / "x.duckdb"))
+
+
+def test_cli_compact_repoints_the_alias(small_files, workspace):
+    result = CliRunner().invoke(
+        cli, ["compact", "hits", "--sort-by", "part,v", "--output", "compacted"]
+    )
+    assert result.exit_code == 0, result.output
+    assert "before      20 files" in result.stdout
+    assert "after        1 files" in result.stdout
+
+    assert (workspace / ".pksql").read_text() == (
+        "# kept\nhits = compacted/*.parquet\n"
+    )
+    assert len(list(small_files.iterdir())) == 20  # The originals stay.
+    result = CliRunner().invoke(cli, ["-F", "csv", "SELECT count(*) AS n FROM hits"])
+    assert result.stdout.strip() == "n\n1000"
+
+
+def test_cli_compact_output_is_relative_to_where_it_runs(small_files, workspace):
+    (workspace / ".pksql").unlink()
+    declared = workspace.parent / "home" / ".pksql"
+    declared.write_text(f"hits = '{small_files / '*.parquet'}'\n")
+
+    result = CliRunner().invoke(cli, ["compact", "hits", "--output", "out"])
+    assert result.exit_code == 0, result.output
+    assert declared.read_text() == f"hits = {workspace / 'out' / '*.parquet'}\n"
+
+    # A relative entry stays relative, but to the file that declares it.
+    declared.write_text("hits = '../work/out/*.parquet'\n")
+    result = CliRunner().invoke(cli, ["compact", "hits", "--output", "again"])
+    assert result.exit_code == 0, result.output
+    assert declared.read_text() == "hits = ../work/again/*.parquet\n"
+    result = CliRunner().invoke(cli, ["-F", "csv", "SELECT count(*) AS n FROM hits"])
+    assert result.stdout.strip() == "n\n1000"
+
+
+def test_cli_compact_rejects_an_unknown_alias(workspace):
+    result = CliRunner().invoke(cli, ["compact", "nope"])
+    assert result.exit_code == 1
+    assert "no alias 'nope'" in result.stderr
@@ -2,8 +2,17 @@ import json
 from datetime import date
 
 import duckdb
+import pytest
 
-from pksql.core import execute_query, format_elapsed, json_serializer, render_result
+from pksql.core import (
+    execute_query,
+    format_elapsed,
+    format_size,
+    json_serializer,
+    parse_size,
+    render_result,
+    sweep,
+)
 
 
 def test_execute_query_table():
@@ -68,3 +77,53 @@ def test_format_elapsed_units():
     assert format_elapsed(0.0000001).endswith("μs")
     assert format_elapsed(0.01).endswith("ms")
     assert format_elapsed(2.5).endswith("sec")
+
+
+def test_parse_size_accepts_binary_units():
+    assert parse_size("1024") == 1024
+    assert parse_size("512MB") == 512 * 2**20
+    assert parse_size("1.5 GiB") == 3 * 2**29
+    with pytest.raises(ValueError):
+        parse_size("lots")
+
+
+def test_format_size_units():
+    assert format_size(10) == "10 B"
+    assert format_size(3 * 2**30) == "3.0 GiB"
+
+
+def test_execute_query_binds_params():
+    output, _ = execute_query(
+        "SELECT $name AS who, 2 = $n AS two",
+        output_format="csv",
+        params={"name": "o'brien", "n": "2"},
+    )
+    assert output == "who,two\no'brien,True"
+
+
+def test_sweep_tags_each_result_with_its_parameters():
+    conn = duckdb.connect(database=":memory:")
+    rows = [{"n": "2"}, {"n": "0"}, {"n": "1"}]
+    sql = "SELECT range AS r FROM range(3) WHERE range < $n"
+
+    assert list(sweep(sql, rows, conn, "csv")) == ["n,r\n2,0\n2,1", "1,0"]
+    assert json.loads("".join(sweep(sql, rows, conn, "json"))) == [
+        {"n": "2", "r": 0},
+        {"n": "2", "r": 1},
+        {"n": "1", "r": 0},
+    ]
+    assert len(list(sweep(sql, rows, conn, "table"))) == 3
+
+
+def test_sweep_labels_with_unused_columns_and_keeps_names_apart():
+    conn = duckdb.connect(database=":memory:")
+    rows = [{"n": "2", "label": "two"}, {"n": "3", "label": "three"}]
+    sql = "SELECT count(*) AS n FROM range($N::INT)"
+
+    assert list(sweep(sql, rows, conn, "csv")) == ["$n,label,n\n2,two,2", "3,three,3"]
+
+
+def test_sweep_rejects_parameter_names_that_are_not_identifiers():
+    conn = duckdb.connect(database=":memory:")
+    with pytest.raises(ValueError):
+        list(sweep("SELECT $a", [{"a := 1); --": "x"}], conn, "csv"))
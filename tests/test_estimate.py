@@ -0,0 +1,141 @@
+import os
+
+import duckdb
+import pytest
+from click.testing import CliRunner
+
+from pksql import aliases, estimate
+from pksql.main import cli
+
+
+@pytest.fixture
+def data(workspace):
+    """Alias ``hits`` over three parquet files, ``logs`` over a CSV, ``db``."""
+    (workspace / "hits").mkdir()
+    for i in range(3):
+        duckdb.sql(
+            f"COPY (SELECT {i} * 1000 + r AS id, r % 7 AS k, repeat('x', 40) AS pad "
+            f"FROM range(1000) t(r)) TO 'hits/{i}.parquet'"
+        )
+    duckdb.sql("COPY (SELECT range AS id FROM range(500)) TO 'logs.csv'")
+    with duckdb.connect("db.duckdb") as db:
+        db.sql("CREATE TABLE t AS SELECT range AS id FROM range(100)")
+    registered = {
+        "hits": "hits/*.parquet",
+        "logs": "logs.csv",
+        "db": "db.duckdb",
+        "remote": "https://example.com/data.parquet",
+    }
+    (workspace / ".pksql").write_text(
+        "".join(f"{name} = {path}\n" for name, path in registered.items())
+    )
+    conn = duckdb.connect()
+    local = {name: path for name, path in registered.items() if name != "remote"}
+    aliases.create_views(conn, local)
+    aliases.attach_databases(conn, local, ["db"])
+    return conn, registered
+
+
+def _estimate(data, sql, params=None):
+    conn, registered = data
+    names = aliases.referenced(sql, registered)
+    scans, unsized = estimate.estimate(conn, sql, registered, names, params)
+    return {scan.name: (scan.files, scan.bytes, scan.rows) for scan in scans}, unsized
+
+
+def _column_bytes(columns):
+    return duckdb.sql(
+        "SELECT sum(total_compressed_size) FROM parquet_metadata('hits/*.parquet') "
+        "WHERE list_contains($columns, path_in_schema)",
+        params={"columns": columns},
+    ).fetchone()[0]
+
+
+def test_parquet_counts_only_the_columns_read(data):
+    scans, _ = _estimate(data, "SELECT sum(k) FROM hits WHERE id > 10")
+    assert scans == {"hits": (3, _column_bytes(["id", "k"]), 3000)}
+
+    scans, _ = _estimate(data, "SELECT count(*) FROM hits")
+    assert scans == {"hits": (3, 0, 3000)}
+
+
+def test_footers_of_a_large_glob_are_sampled(data, monkeypatch):
+    monkeypatch.setattr(estimate, "FOOTER_SAMPLE", 1)
+    scans, _ = _estimate(data, "SELECT * FROM hits")
+    files, size, rows = scans["hits"]
+    assert files == 3
+    # Extrapolated from the first file by size, which is close but not exact.
+    assert rows == pytest.approx(3000, rel=0.15)
+    assert size == pytest.approx(_column_bytes(["id", "k", "pad"]), rel=0.15)
+
+
+def test_csv_and_database_files_count_whole(data, workspace):
+    scans, _ = _estimate(data, "SELECT * FROM logs JOIN db USING (id)")
+    assert scans["logs"][:2] == (1, os.path.getsize(workspace / "logs.csv"))
+    assert scans["db"][:2] == (1, os.path.getsize(workspace / "db.duckdb"))
+
+
+def test_unplannable_queries_count_every_column_and_remote_is_unsized(data):
+    scans, _ = _estimate(data, "SELECT k FROM hits WHERE id = $id")
+    assert scans["hits"][1] == _column_bytes(["id", "k", "pad"])
+
+    scans, _ = _estimate(data, "SELECT k FROM hits WHERE id = $id", {"id": "5"})
+    assert scans["hits"][1] == _column_bytes(["id", "k"])
+
+    conn, registered = data
+    assert estimate.estimate(conn, "SELECT 1", registered, ["remote"]) == (
+        [],
+        ["remote"],
+    )
+
+
+def test_cli_estimate_prints_without_running(data, workspace):
+    result = CliRunner().invoke(
+        cli, ["-F", "csv", "--estimate", "CREATE TABLE x AS SELECT * FROM hits"]
+    )
+    assert result.exit_code == 0, result.output
+    assert result.stdout.splitlines()[0] == "alias,files,bytes,size,rows"
+    assert result.stdout.splitlines()[1].startswith("hits,3,")
+    assert "Estimated scan:" in result.stderr
+    assert "Query time" not in result.stderr
+
+
+def test_cli_max_scan_refuses_large_queries(data, workspace):
+    runner = CliRunner()
+    result = runner.invoke(cli, ["--max-scan", "1KB", "SELECT * FROM hits"])
+    assert result.exit_code == 1
+    assert "more than 1.0 KiB (--max-scan)" in result.stderr
+    assert "refusing" in result.stderr
+
+    result = runner.invoke(cli, ["--max-scan", "1KB", "SELECT count(*) FROM hits"])
+    assert result.exit_code == 0, result.output
+
+    with open(".pksql", "a") as f:
+        f.write("set max_scan = 1KB\n")
+    result = runner.invoke(cli, ["SELECT * FROM hits"])
+    assert result.exit_code == 1
+    assert "(max_scan in .pksql)" in result.stderr
+    result = runner.invoke(cli, ["--max-scan", "1GB", "SELECT * FROM hits"])
+    assert result.exit_code == 0, result.output
+
+    result = runner.invoke(cli, ["--max-scan", "lots", "SELECT 1"])
+    assert result.exit_code == 2
+    assert "not a size" in result.output
+
+
+def test_cli_max_scan_guards_building_a_rollup(data, workspace):
+    with open(".pksql", "a") as f:
+        f.write("rollup by_k = hits by k: count(*)\n")
+    sql = "SELECT k, count(*) AS n FROM hits GROUP BY k"
+    runner = CliRunner()
+
+    result = runner.invoke(cli, ["--max-scan", "10", sql])
+    assert result.exit_code == 1
+    assert "Building rollup by_k would read about" in result.stderr
+    result = runner.invoke(cli, ["rollups"])
+    assert "(not built)" in result.stdout
+
+    assert runner.invoke(cli, ["rollups", "--refresh"]).exit_code == 0
+    result = runner.invoke(cli, ["--max-scan", "10", sql])
+    assert result.exit_code == 0, result.output
+    assert "answered from rollup by_k" in result.stderr
@@ -0,0 +1,84 @@
+import json
+
+import duckdb
+from click.testing import CliRunner
+
+from pksql import history
+from pksql.main import cli
+
+
+def test_normalize_ignores_layout_case_comments_and_literals():
+    sql, fingerprint = history.normalize("select  *\n from hits -- note\n where d = 1")
+    assert sql == "SELECT * FROM hits WHERE d = 1"
+
+    _, same = history.normalize("SELECT * FROM hits WHERE d = 2")
+    _, other = history.normalize("SELECT * FROM hits WHERE e = 1")
+    assert same == fingerprint
+    assert other != fingerprint
+
+
+def test_entry_measures_the_named_aliases(workspace):
+    duckdb.sql(f"COPY (SELECT 1 AS a) TO '{workspace / 'a.parquet'}'")
+    item = history.entry(
+        "SELECT * FROM a",
+        {"a": str(workspace / "a.parquet")},
+        0.25,
+        {"rows": 1, "seconds": 0.5},
+    )
+    assert item["aliases"] == ["a"]
+    assert item["input_files"] == 1
+    assert item["input_bytes"] == (workspace / "a.parquet").stat().st_size
+    assert (item["rows"], item["query_seconds"]) == (1, 0.5)
+    assert item["error"] is None
+    json.dumps(item)
+
+
+def test_cli_records_runs_and_summarises_them(workspace):
+    duckdb.sql(f"COPY (SELECT 1 AS a) TO '{workspace / 'a.parquet'}'")
+    (workspace / ".pksql").write_text("a = a.parquet\n")
+    runner = CliRunner()
+
+    for n in (1, 2):
+        query = f"SELECT a + {n} FROM a"
+        assert runner.invoke(cli, ["--history", "-F", "csv", query]).exit_code == 0
+    assert runner.invoke(cli, ["--history", "SELECT nonsense"]).exit_code == 1
+    assert runner.invoke(cli, ["SELECT 'not recorded'"]).exit_code == 0
+
+    logged = [
+        json.loads(line) for line in history.history_file().read_text().splitlines()
+    ]
+    assert len(logged) == 3
+    assert logged[0]["fingerprint"] == logged[1]["fingerprint"]
+    assert logged[0]["rows"] == 1
+    assert "nonsense" in logged[2]["error"]
+
+    recent = runner.invoke(cli, ["history", "-F", "json", "-n", "2"])
+    assert recent.exit_code == 0
+    assert [row["ok"] for row in json.loads(recent.stdout)] == [False, True]
+
+    stats = runner.invoke(cli, ["history", "--stats", "-F", "json"])
+    assert stats.exit_code == 0
+    (summary,) = json.loads(stats.stdout)
+    assert summary["runs"] == 2
+    assert summary["p95_seconds"] >= summary["p50_seconds"]
+
+    custom = runner.invoke(
+        cli, ["history", "-F", "csv", "SELECT count(*) AS n FROM history"]
+    )
+    assert custom.stdout.strip() == "n\n3"
+
+
+def test_cli_counts_the_rows_of_a_table(workspace):
+    duckdb.sql(f"COPY (SELECT * FROM range(3) t(a)) TO '{workspace / 'a.parquet'}'")
+    (workspace / ".pksql").write_text("a = a.parquet\n")
+
+    result = CliRunner().invoke(cli, ["--history", "SELECT * FROM a WHERE a > 0"])
+    assert result.exit_code == 0
+    (line,) = history.history_file().read_text().splitlines()
+    assert json.loads(line)["rows"] == 2
+
+
+def test_history_before_anything_was_recorded(workspace):
+    result = CliRunner().invoke(cli, ["history"])
+    assert result.exit_code == 0
+    assert "No history yet" in result.output
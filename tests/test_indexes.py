@@ -0,0 +1,141 @@
+import os
+import subprocess
+import sys
+
+import duckdb
+import pytest
+from click.testing import CliRunner
+
+from pksql import aliases, indexes
+from pksql.main import cli
+
+
+def _write_part(directory, part):
+    """Ids ``part``, ``part + 10``, ... shuffled into row groups of 2048."""
+    duckdb.sql(
+        f"COPY (SELECT i * 10 + {part} AS id, i % 7 AS k, random() AS r "
+        f"FROM range(10000) t(i) ORDER BY hash(i)) "
+        f"TO '{directory}/{part}.parquet' (ROW_GROUP_SIZE 2048)"
+    )
+
+
+@pytest.fixture
+def parts(workspace):
+    (workspace / "parts").mkdir()
+    for part in range(3):
+        _write_part(workspace / "parts", part)
+    (workspace / ".pksql").write_text("hits = parts/*.parquet\n")
+    return aliases.load()
+
+
+@pytest.mark.parametrize(
+    "sql, params",
+    [
+        ("SELECT * FROM hits WHERE id = 4242", None),
+        ("SELECT count(*) FROM hits h WHERE h.id IN (1, '22', 4.5, -3)", None),
+        ("SELECT id, k FROM hits WHERE $id = id AND k < 5", {"id": "1230"}),
+    ],
+)
+def test_prune_reads_fewer_row_groups_for_the_same_answer(bind, parts, sql, params):
+    conn = bind(parts)
+    expected = conn.execute(sql, params).fetchall()
+    assert indexes.build(conn, parts["hits"], "id") == (3, 0)
+
+    ((name, column, read, total, unindexed),) = indexes.prune(
+        conn, sql, parts, ["hits"], params
+    )
+
+    assert (name, column, total, unindexed) == ("hits", "id", 15, 0)
+    assert read <= 4
+    assert sorted(conn.execute(sql, params).fetchall()) == sorted(expected)
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT * FROM hits WHERE id = 1 OR k = 2",  # not a lookup
+        "SELECT * FROM hits WHERE id > 4242",
+        "SELECT * FROM hits a JOIN hits b USING (k) WHERE a.id = 1",  # read twice
+        "SELECT * FROM hits WHERE k = 3",  # not indexed
+    ],
+)
+def test_prune_leaves_other_queries_alone(bind, parts, sql):
+    conn = bind(parts)
+    indexes.build(conn, parts["hits"], "id")
+    assert indexes.prune(conn, sql, parts, ["hits"]) == []
+
+
+def test_queries_index_new_files_as_they_appear(bind, parts, workspace):
+    conn = bind(parts)
+    indexes.build(conn, parts["hits"], "id")
+    _write_part(workspace / "parts", 3)
+    (workspace / "parts" / "0.parquet").unlink()
+
+    conn = bind(parts)
+    sql = "SELECT id FROM hits WHERE id IN (3, 10, 13)"
+    ((_, _, _, total, unindexed),) = indexes.prune(conn, sql, parts, ["hits"])
+
+    assert (total, unindexed) == (15, 0)
+    assert sorted(conn.sql(sql).fetchall()) == [(3,), (13,)]
+    assert indexes.build(conn, parts["hits"], "id") == (0, 0)
+
+
+def test_files_changed_while_the_index_is_busy_are_read_whole(bind, parts, workspace):
+    conn = bind(parts)
+    indexes.build(conn, parts["hits"], "id")
+    duckdb.sql(
+        "COPY (SELECT i * 10 + 1 AS id, i % 7 AS k, random() AS r FROM range(10000) "
+        f"t(i)) TO '{workspace}/parts/1.parquet' (ROW_GROUP_SIZE 2048)"
+    )
+    (workspace / "parts" / "2.parquet").unlink()
+
+    # Another pksql reading the indexes keeps this one from updating them.
+    holder = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "import sys, duckdb; "
+            "c = duckdb.connect(sys.argv[1], read_only=True); "
+            "print('ready', flush=True); sys.stdin.read()",
+            str(indexes.indexes_file()),
+        ],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+    )
+    try:
+        assert holder.stdout.readline() == "ready\n"
+        conn = bind(parts)
+        sql = "SELECT id FROM hits WHERE id IN (4240, 4241)"
+        ((_, _, read, total, unindexed),) = indexes.prune(conn, sql, parts, ["hits"])
+        assert (total, unindexed) == (5, 1)
+        assert read <= 1
+        assert sorted(conn.sql(sql).fetchall()) == [(4240,), (4241,)]
+    finally:
+        holder.communicate("")
+
+
+def test_build_refuses_what_it_cannot_index(parts, workspace):
+    conn = duckdb.connect()
+    with pytest.raises(indexes.IndexingError, match="DOUBLE"):
+        indexes.build(conn, parts["hits"], "r")
+    with pytest.raises(indexes.IndexingError, match="no column 'nope'"):
+        indexes.build(conn, parts["hits"], "nope")
+    (workspace / "parts" / "notes.csv").write_text("a\n1\n")
+    with pytest.raises(indexes.IndexingError, match="not all parquet"):
+        indexes.build(conn, str(workspace / "parts" / "*"), "id")
+
+
+def test_cli_index_and_lookup(parts):
+    result = CliRunner().invoke(cli, ["index", "hits", "id"])
+    assert result.exit_code == 0, result.output
+    assert "3 files added" in result.stdout
+
+    result = CliRunner().invoke(cli, ["index"])
+    assert "hits.id (BIGINT, 3 files)" in result.stdout
+
+    result = CliRunner().invoke(cli, ["-F", "csv", "SELECT k FROM hits WHERE id = 22"])
+    assert result.exit_code == 0, result.output
+    assert "index on hits.id: reading 1 of 15 row groups" in result.stderr
+    assert result.stdout.strip() == "k\n2"
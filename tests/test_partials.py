@@ -0,0 +1,88 @@
+import duckdb
+import pytest
+
+from pksql import partials
+
+
+@pytest.fixture
+def conn():
+    conn = duckdb.connect(database=":memory:")
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize(
+    "sql, merges",
+    [
+        ("SELECT a, b FROM hits WHERE c > 0", [None, None]),
+        ("SELECT * FROM hits", [None]),
+        (
+            "SELECT k, count(*), sum(v), min(v), max(v) FROM hits GROUP BY k",
+            [None, "sum", "sum", "min", "max"],
+        ),
+        ("SELECT count(*) FILTER (WHERE v > 1) AS n FROM Hits", ["sum"]),
+        ("SELECT k, count(v) FROM hits GROUP BY ALL", [None, "sum"]),
+        ("SELECT k AS d, count(*) FROM hits GROUP BY 1", [None, "sum"]),
+        ("SELECT count(*), k % 2 AS p FROM hits GROUP BY k % 2", ["sum", None]),
+    ],
+)
+def test_decomposable_queries(conn, sql, merges):
+    plan = partials.decompose(conn, sql, ["hits"])
+    assert plan is not None
+    assert plan.table == "hits"
+    assert plan.merges == merges
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT k, avg(v) FROM hits GROUP BY k",
+        "SELECT k, count(DISTINCT v) FROM hits GROUP BY k",
+        "SELECT k, sum(v) / count(*) FROM hits GROUP BY k",
+        "SELECT k, count(*) FROM hits GROUP BY k HAVING count(*) > 1",
+        "SELECT k, count(*) FROM hits GROUP BY k ORDER BY 2",
+        # Grouped by something the partial results do not keep.
+        "SELECT count(*) AS n FROM hits GROUP BY k",
+        "SELECT k % 2 AS p, count(*) FROM hits GROUP BY k",
+        "SELECT k, count(*) FROM hits GROUP BY k, v",
+        "SELECT k, count(*) FROM hits GROUP BY 2",
+        "SELECT DISTINCT k FROM hits",
+        "SELECT * FROM hits JOIN other USING (k)",
+        "SELECT * FROM hits WHERE k IN (SELECT k FROM hits)",
+        "SELECT sum(v) OVER () FROM hits",
+        "SELECT * FROM other",
+        "CREATE TABLE t AS SELECT * FROM hits",
+        "SELECT 1; SELECT 2",
+    ],
+)
+def test_undecomposable_queries(conn, sql):
+    assert partials.decompose(conn, sql, ["hits"]) is None
+
+
+def test_grouping_by_a_select_alias_unless_a_column_has_its_name(conn):
+    conn.sql("CREATE TABLE hits AS SELECT 1 AS k, 2 AS v")
+    plan = partials.decompose(
+        conn, "SELECT k % 2 AS p, count(*) FROM hits GROUP BY p", ["hits"]
+    )
+    assert plan is not None
+    # DuckDB groups by the column v here, not by the select item.
+    sql = "SELECT k AS v, count(*) FROM hits GROUP BY v"
+    assert partials.decompose(conn, sql, ["hits"]) is None
+
+
+def test_merging_partials_matches_a_full_scan(conn):
+    conn.sql("CREATE TABLE hits AS SELECT i % 3 AS k, i AS v FROM range(100) t(i)")
+    sql = (
+        "SELECT k, count(*) AS n, sum(v) AS s, min(v) AS lo, max(v) AS hi "
+        "FROM hits GROUP BY k"
+    )
+    plan = partials.decompose(conn, sql, ["hits"])
+
+    conn.sql(
+        "CREATE TABLE parts AS SELECT k, count(*) AS n, sum(v) AS s, min(v) AS lo, "
+        "max(v) AS hi FROM hits GROUP BY k, v < 50"
+    )
+    merged = conn.sql(plan.merge_sql("parts", conn.sql(sql)))
+
+    assert merged.types == conn.sql(sql).types
+    assert sorted(merged.fetchall()) == sorted(conn.sql(sql).fetchall())
@@ -0,0 +1,176 @@
+import duckdb
+import pytest
+from click.testing import CliRunner
+
+from pksql import aliases, rollups
+from pksql.main import cli
+
+DECLARED = (
+    "hits = 'hits/*.parquet'\n"
+    "rollup daily = hits by day, status: count(*), sum(bytes), max(t)\n"
+    "rollup hourly = hits by date_trunc('hour', t) AS hour: count(*)\n"
+)
+
+
+def _write_hits(workspace, index, day):
+    duckdb.sql(
+        f"COPY (SELECT DATE '2024-01-0{day}' AS day, i % 3 AS status, i AS bytes, "
+        f"TIMESTAMP '2024-01-0{day}' + INTERVAL (i) MINUTE AS t "
+        f"FROM range(100) r(i)) TO '{workspace}/hits/{index}.parquet'"
+    )
+
+
+@pytest.fixture
+def hits(workspace):
+    (workspace / "hits").mkdir()
+    for index, day in enumerate((1, 2)):
+        _write_hits(workspace, index, day)
+    (workspace / ".pksql").write_text(DECLARED)
+    return aliases.load()
+
+
+@pytest.fixture
+def bound(hits):
+    """A connection with ``hits`` bound and the declared rollups built."""
+    conn = duckdb.connect(database=":memory:")
+    aliases.create_views(conn, hits)
+    declared = rollups.declared(conn, hits)
+    assert rollups.refresh(conn, declared.values(), hits) == {}
+    yield conn, declared
+    conn.close()
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "daily hits by day: count(*)",  # no '='
+        "daily = hits by day: avg(bytes)",  # avg cannot be re-aggregated
+        "daily = hits by day + 1: count(*)",  # an expression key needs a name
+        "daily = hits by day, day: count(*)",
+    ],
+)
+def test_parse_rollup_rejects_bad_declarations(text):
+    with pytest.raises(aliases.AliasError):
+        rollups.parse_rollup(duckdb.connect(), text)
+
+
+def test_declared_reads_only_the_named_aliases(hits):
+    conn = duckdb.connect()
+    assert set(rollups.declared(conn, hits)) == {"daily", "hourly"}
+    assert rollups.declared(conn, {"other": "x.parquet"}) == {}
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT status, count(*) AS n, sum(bytes) FROM hits GROUP BY status",
+        "SELECT day, max(h.t) FROM hits h WHERE status = 1 GROUP BY day ORDER BY 1",
+        "SELECT count(*) FROM hits WHERE day > '2024-01-05'",
+        "SELECT date_trunc('hour', t) AS hr, count(*) FROM hits GROUP BY hr "
+        "ORDER BY hr LIMIT 3",
+    ],
+)
+def test_rewritten_queries_give_the_same_answer(bound, sql):
+    conn, declared = bound
+
+    rewritten, _ = rollups.rewrite(conn, sql, declared)
+
+    assert rollups.NAME in rewritten
+    expected = conn.sql(sql)
+    actual = conn.sql(rewritten)
+    assert actual.columns == expected.columns
+    assert actual.types == expected.types
+    assert sorted(actual.fetchall()) == sorted(expected.fetchall())
+
+
+def test_the_coarsest_covering_rollup_is_chosen(bound):
+    conn, declared = bound
+    _, rollup = rollups.rewrite(conn, "SELECT count(*) FROM hits", declared)
+    assert rollup.name == "hourly"
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT avg(bytes) FROM hits",  # not a measure
+        "SELECT count(*) FROM hits WHERE bytes > 5",  # bytes is not a key
+        "SELECT day, status FROM hits",  # wants rows, not groups
+        "SELECT count(DISTINCT status) FROM hits",
+        "SELECT count(*) FROM hits JOIN hits h2 USING (day)",
+    ],
+)
+def test_rewrite_declines_queries_a_rollup_cannot_answer(bound, sql):
+    conn, declared = bound
+    assert rollups.rewrite(conn, sql, declared) is None
+
+
+def test_status_follows_the_files(hits, workspace):
+    conn = duckdb.connect(database=":memory:")
+    declared = list(rollups.declared(conn, hits).values())
+    assert set(rollups.status(conn, declared, hits).values()) == {"not built"}
+
+    aliases.create_views(conn, hits)
+    rollups.refresh(conn, declared, hits)
+    conn.sql(f"DETACH {rollups.NAME}")
+    assert set(rollups.status(conn, declared, hits).values()) == {"fresh"}
+
+    _write_hits(workspace, 2, 3)
+    assert set(rollups.status(conn, declared, hits).values()) == {"stale"}
+    conn.close()
+
+
+def test_projects_keep_their_own_rollups_of_a_name(hits, workspace):
+    other = workspace / "other"
+    (other / "hits").mkdir(parents=True)
+    _write_hits(other, 0, 5)
+    (other / ".pksql").write_text(DECLARED)
+    # Two files of 100 rows here, one in the other project.
+    projects = [(workspace, hits, 200), (other, aliases.load(other), 100)]
+
+    def tables():
+        with duckdb.connect(str(rollups.rollups_file()), read_only=True) as db:
+            return {
+                row[0]
+                for row in db.sql("SELECT table_name FROM duckdb_tables()").fetchall()
+            }
+
+    for built in (False, True):
+        for cwd, registered, rows in projects:
+            conn = duckdb.connect(database=":memory:")
+            aliases.create_views(conn, registered)
+            daily = rollups.declared(conn, ["hits"], cwd)["daily"]
+            expected = "fresh" if built else "not built"
+            assert rollups.status(conn, [daily], registered) == {"daily": expected}
+            assert rollups.refresh(conn, [daily], registered) == {}
+            sql, _ = rollups.rewrite(conn, "SELECT count(*) FROM hits", {"d": daily})
+            assert conn.sql(sql).fetchall() == [(rows,)]
+            conn.close()
+    assert len(tables()) == 3  # Two daily rollups and the definitions.
+
+    # A changed declaration replaces the project's old table.
+    (other / ".pksql").write_text(DECLARED.replace("max(t)", "min(t)"))
+    conn = duckdb.connect(database=":memory:")
+    aliases.create_views(conn, projects[1][1])
+    daily = rollups.declared(conn, ["hits"], other)["daily"]
+    assert rollups.refresh(conn, [daily], projects[1][1]) == {}
+    conn.close()
+    assert len(tables()) == 3
+
+
+def test_cli_answers_from_a_rollup_and_rebuilds_it(hits, workspace):
+    sql = "SELECT day, count(*) AS n FROM hits GROUP BY day ORDER BY day"
+
+    result = CliRunner().invoke(cli, ["-F", "csv", sql])
+    assert result.exit_code == 0, result.output
+    assert "answered from rollup daily" in result.stderr
+    assert result.stdout.strip() == "day,n\n2024-01-01,100\n2024-01-02,100"
+
+    _write_hits(workspace, 2, 3)
+    result = CliRunner().invoke(cli, ["-F", "csv", sql])
+    assert result.exit_code == 0, result.output
+    assert result.stdout.strip().endswith("2024-01-03,100")
+
+    result = CliRunner().invoke(cli, ["rollups"])
+    assert result.exit_code == 0, result.output
+    assert "daily" in result.stdout and "(fresh)" in result.stdout
+    assert "(not built)" in result.stdout  # Nothing needed hourly yet.
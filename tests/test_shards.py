@@ -0,0 +1,83 @@
+import duckdb
+import pytest
+from click.testing import CliRunner
+
+from pksql import shards
+from pksql.main import cli
+
+
+@pytest.fixture
+def sharded(workspace):
+    """Four daily shards of ``events``; only the last two also have ``extra``."""
+    (workspace / "shards").mkdir()
+    for day in range(4):
+        conn = duckdb.connect(str(workspace / "shards" / f"day{day}.duckdb"))
+        conn.sql(
+            f"CREATE TABLE events AS SELECT {day} AS day, i % 3 AS k, i AS v "
+            "FROM range(10) t(i)"
+        )
+        if day >= 2:
+            conn.sql(f"CREATE TABLE extra AS SELECT {day} AS day")
+        conn.close()
+    return {"shards": str(workspace / "shards" / "*.duckdb")}
+
+
+def test_a_shard_glob_unions_each_table(bind, sharded):
+    conn = bind(sharded)
+
+    assert conn.sql("SELECT count(*), sum(v) FROM shards.events").fetchall() == [
+        (40, 180)
+    ]
+    assert conn.sql("SELECT day FROM shards.extra ORDER BY day").fetchall() == [
+        (2,),
+        (3,),
+    ]
+    conn.close()
+
+
+def test_scatter_matches_a_single_process(bind, sharded):
+    conn = bind(sharded)
+    sql = (
+        "SELECT k, count(*) AS n, sum(v) AS total, max(day) AS last "
+        "FROM shards.events WHERE v > $floor GROUP BY k"
+    )
+    params = {"floor": 2}
+
+    scattered = shards.scatter(conn, sql, sharded, ["shards"], 2, params)
+
+    expected = conn.sql(sql, params=params)
+    assert scattered.types == expected.types
+    assert sorted(scattered.fetchall()) == sorted(expected.fetchall())
+    conn.close()
+
+
+def test_scatter_skips_shards_without_the_table(bind, sharded):
+    conn = bind(sharded)
+
+    scattered = shards.scatter(
+        conn, "SELECT count(*) FROM shards.extra", sharded, ["shards"], 2
+    )
+
+    assert scattered.fetchall() == [(2,)]
+    conn.close()
+
+
+def test_scatter_declines_what_it_cannot_merge(bind, sharded):
+    conn = bind(sharded)
+
+    assert (
+        shards.scatter(conn, "SELECT avg(v) FROM shards.events", sharded, ["shards"], 2)
+        is None
+    )
+    conn.close()
+
+
+def test_cli_shard_processes(sharded, workspace):
+    (workspace / ".pksql").write_text("shards = shards/*.duckdb\n")
+    sql = "SELECT k, count(*) AS n FROM shards.events GROUP BY k ORDER BY k"
+
+    result = CliRunner().invoke(cli, ["--shard-processes", "2", "-F", "csv", sql])
+    assert result.exit_code == 0, result.output
+    # ORDER BY cannot be merged, so the query runs in this process instead.
+    assert "running it in this process" in result.stderr
+    assert result.stdout.strip() == "k,n\n0,16\n1,12\n2,12"
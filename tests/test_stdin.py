@@ -0,0 +1,118 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import duckdb
+import pytest
+from click.testing import CliRunner
+
+from pksql import stdin
+from pksql.main import cli
+
+
+@pytest.fixture
+def piped():
+    """``feed(data)`` returns the read end of a pipe that ``data`` is written into.
+
+    The writer is a thread, as a real producer is a separate process: the
+    pipe holds far less than the data, so it only drains as it is read.
+    """
+    ends = []
+
+    def feed(data):
+        read_end, write_end = os.pipe()
+        ends.append(read_end)
+
+        def write():
+            with os.fdopen(write_end, "wb") as out:
+                out.write(data)
+
+        threading.Thread(target=write, daemon=True).start()
+        return read_end
+
+    yield feed
+    for fd in ends:
+        os.close(fd)
+
+
+def test_csv_streams_past_the_sample(piped, monkeypatch):
+    monkeypatch.setattr(stdin, "SAMPLE_BYTES", 64)
+    rows = "".join(f'{i % 3},{i},"row, {i}"\n' for i in range(20_000))
+    conn = duckdb.connect()
+
+    stdin.bind(conn, "csv", fd=piped(("key,value,label\n" + rows).encode()))
+
+    result = conn.sql(
+        "SELECT key, count(*), sum(value), max(label) FROM stdin GROUP BY 1 ORDER BY 1"
+    ).fetchall()
+    assert result == [
+        (0, 6667, 66663333, "row, 9999"),
+        (1, 6667, 66670000, "row, 9997"),
+        (2, 6666, 66656667, "row, 9998"),
+    ]
+
+
+def test_ndjson_streams_past_the_sample(piped, monkeypatch):
+    monkeypatch.setattr(stdin, "SAMPLE_BYTES", 64)
+    lines = [json.dumps({"key": i % 2, "tags": [i], "note": None}) for i in range(5000)]
+    conn = duckdb.connect()
+
+    stdin.bind(conn, "ndjson", fd=piped("\n".join(lines).encode()))
+
+    result = conn.sql(
+        "SELECT key, count(*), sum(tags[1]) FROM stdin GROUP BY 1 ORDER BY 1"
+    ).fetchall()
+    assert result == [(0, 2500, 6247500), (1, 2500, 6250000)]
+
+
+def test_small_input_is_read_in_full(piped):
+    conn = duckdb.connect()
+
+    stdin.bind(conn, "csv", fd=piped(b"a,b\n1,x\n"))
+
+    # Already a table, so it can be read more than once.
+    assert conn.sql("SELECT * FROM stdin").fetchall() == [(1, "x")]
+    assert conn.sql("SELECT count(*) FROM stdin").fetchall() == [(1,)]
+
+
+def test_empty_input_is_an_error(piped):
+    with pytest.raises(stdin.StdinError, match="empty"):
+        stdin.bind(duckdb.connect(), "csv", fd=piped(b""))
+
+
+def _pksql(args, **kwargs):
+    # The table is standard input itself, so run the CLI in a real process.
+    root = os.path.dirname(os.path.dirname(stdin.__file__))
+    env = {**os.environ, "PYTHONPATH": root}
+    return subprocess.run(
+        [sys.executable, "-m", "pksql.main", *args],
+        capture_output=True,
+        text=True,
+        env=env,
+        **kwargs,
+    )
+
+
+def test_cli_reads_piped_and_redirected_stdin(workspace):
+    data = "key,value\na,1\nb,2\na,3\n"
+    sql = "SELECT key, sum(value) AS total FROM stdin GROUP BY 1 ORDER BY 1"
+    expected = "key,total\na,4\nb,2"
+
+    piped_run = _pksql(["-F", "csv", sql], input=data)
+    assert piped_run.returncode == 0, piped_run.stderr
+    assert piped_run.stdout.strip() == expected
+
+    (workspace / "data.csv").write_text(data)
+    with open(workspace / "data.csv") as redirected:
+        file_run = _pksql(["-F", "csv", sql], stdin=redirected)
+    assert file_run.returncode == 0, file_run.stderr
+    assert file_run.stdout.strip() == expected
+
+
+def test_stdin_is_not_an_alias_name(workspace):
+    result = CliRunner().invoke(cli, ["add-alias", "stdin", "data.csv"])
+
+    assert result.exit_code == 1
+    assert "reserved" in result.output
@@ -0,0 +1,159 @@
+import duckdb
+import pytest
+from click.testing import CliRunner
+
+from pksql import watch
+from pksql.main import cli
+
+
+def _parquet(path, sql):
+    duckdb.sql(f"COPY ({sql}) TO '{path}' (FORMAT PARQUET)")
+
+
+@pytest.fixture
+def conn():
+    conn = duckdb.connect(database=":memory:")
+    yield conn
+    conn.close()
+
+
+def _hits(conn, workspace, first_sql):
+    """A glob alias ``hits`` over ``results/*.parquet``, holding one file so far."""
+    pattern = str(workspace / "results" / "*.parquet")
+    (workspace / "results").mkdir()
+    _parquet(workspace / "results" / "0.parquet", first_sql)
+    conn.sql(f"CREATE VIEW hits AS SELECT * FROM '{pattern}'")
+    return {"hits": pattern}
+
+
+def test_new_files_are_merged_into_the_kept_result(workspace, conn):
+    registered = _hits(conn, workspace, "SELECT 'a' AS k, 1 AS v")
+    sql = "SELECT k, count(*) AS n, sum(v) AS s FROM hits GROUP BY k"
+    watcher = watch.Watcher(conn, sql, registered)
+    assert watcher.incremental is not None
+
+    assert watcher.run().fetchall() == [("a", 1, 1)]
+    _parquet(
+        workspace / "results" / "1.parquet",
+        "SELECT * FROM (VALUES ('a', 2), ('b', 5)) t(k, v)",
+    )
+    assert sorted(watcher.run().fetchall()) == [("a", 2, 3), ("b", 1, 5)]
+    assert watcher.incremental.scanned == 1
+    assert sorted(watcher.run().fetchall()) == sorted(conn.sql(sql).fetchall())
+
+
+def test_a_rewritten_file_forces_a_full_rescan(workspace, conn):
+    registered = _hits(conn, workspace, "SELECT 0 AS v")
+    _parquet(workspace / "results" / "1.parquet", "SELECT 1 AS v")
+    watcher = watch.Watcher(conn, "SELECT sum(v) AS s FROM hits", registered)
+    assert watcher.run().fetchall() == [(1,)]
+
+    _parquet(workspace / "results" / "0.parquet", "SELECT 10 AS v, 'padding' AS p")
+    assert watcher.run().fetchall() == [(11,)]
+    assert watcher.incremental.scanned == 2
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT count(*) AS n FROM hits GROUP BY day",
+        "SELECT day % 2 AS p, count(*) AS n FROM hits GROUP BY day",
+    ],
+)
+def test_grouping_by_a_column_not_selected_simply_reruns(workspace, conn, sql):
+    registered = _hits(conn, workspace, "SELECT 1 AS day UNION ALL SELECT 2")
+    _parquet(workspace / "results" / "1.parquet", "SELECT 3 AS day UNION ALL SELECT 4")
+    watcher = watch.Watcher(conn, sql, registered)
+    assert watcher.incremental is None
+    assert sorted(watcher.run().fetchall()) == sorted(conn.sql(sql).fetchall())
+    assert len(watcher.run().fetchall()) == 4
+
+
+def test_other_queries_simply_rerun(workspace, conn):
+    registered = _hits(conn, workspace, "SELECT 1 AS v")
+    watcher = watch.Watcher(conn, "SELECT avg(v) FROM hits", registered)
+    assert watcher.incremental is None
+    assert watcher.run().fetchall() == [(1.0,)]
+
+
+def test_changes_yields_only_when_files_change(workspace, conn):
+    registered = _hits(conn, workspace, "SELECT 1 AS v")
+    watcher = watch.Watcher(conn, "SELECT count(*) FROM hits", registered)
+    polls = []
+
+    def sleep(interval):
+        polls.append(interval)
+        if len(polls) == 2:
+            _parquet(workspace / "results" / "1.parquet", "SELECT 2 AS v")
+
+    updates = watch.changes(watcher, 5, sleep=sleep)
+    next(updates)
+    next(updates)
+    assert polls == [5, 5]
+
+
+def test_cli_watch_prints_each_update(workspace, monkeypatch):
+    (workspace / "results").mkdir()
+    _parquet(workspace / "results" / "0.parquet", "SELECT 1 AS v")
+    (workspace / ".pksql").write_text("hits = 'results/*.parquet'\n")
+    polls = []
+
+    def sleep(interval):
+        polls.append(interval)
+        if len(polls) == 1:
+            _parquet(workspace / "results" / "1.parquet", "SELECT 2 AS v")
+        else:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(watch.time, "sleep", sleep)
+    result = CliRunner().invoke(
+        cli, ["--watch", "-F", "csv", "SELECT count(*) AS n, sum(v) AS s FROM hits"]
+    )
+    assert result.exit_code == 0
+    assert result.stdout == "n,s\n1,1\nn,s\n2,3\n"
+    assert "1 files scanned" in result.stderr
+
+
+def test_cli_watch_passes_parameters_to_every_update(workspace, monkeypatch):
+    (workspace / "results").mkdir()
+    _parquet(workspace / "results" / "0.parquet", "SELECT 1 AS v")
+    (workspace / ".pksql").write_text("hits = 'results/*.parquet'\n")
+    polls = []
+
+    def sleep(interval):
+        polls.append(interval)
+        if len(polls) == 1:
+            _parquet(workspace / "results" / "1.parquet", "SELECT 2 AS v")
+        else:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(watch.time, "sleep", sleep)
+    sql = "SELECT count(*) AS n FROM hits WHERE v > $min"
+    result = CliRunner().invoke(cli, ["--watch", "-F", "csv", "-p", "min=1", sql])
+    assert result.exit_code == 0, result.stderr
+    assert result.stdout == "n\n0\nn\n1\n"
+    assert "Error:" not in result.stderr
+
+
+def test_cli_watch_rejects_a_params_file(workspace):
+    (workspace / "days.csv").write_text("min\n1\n")
+    result = CliRunner().invoke(
+        cli, ["--watch", "--params-file", "days.csv", "SELECT $min"]
+    )
+    assert result.exit_code == 2
+    assert "--watch" in result.stderr
+
+
+def test_cli_watch_waits_for_an_empty_glob(workspace, monkeypatch):
+    (workspace / "results").mkdir()
+    (workspace / ".pksql").write_text("hits = 'results/*.parquet'\n")
+    monkeypatch.setattr(watch.time, "sleep", _interrupt)
+    sql = "SELECT k + 1 AS kk, count(*) AS n FROM hits GROUP BY kk"
+
+    result = CliRunner().invoke(cli, ["--watch", sql])
+    assert result.exit_code == 0, result.exception
+    assert "Error:" in result.stderr
+
+
+def _interrupt(interval):
+    raise KeyboardInterrupt
@@ -0,0 +1,132 @@
+import os
+import subprocess
+import sys
+
+import duckdb
+import pytest
+from click.testing import CliRunner
+
+from pksql import aliases, workers
+from pksql.main import cli
+
+
+@pytest.fixture
+def parts(workspace):
+    """Six parquet files behind alias ``hits``, with sums past 2**53."""
+    (workspace / "parts").mkdir()
+    for part in range(6):
+        duckdb.sql(
+            f"COPY (SELECT i % 4 AS k, {2**52} + i AS v, 'p{part}' AS p "
+            f"FROM range(100) t(i)) TO 'parts/{part}.parquet'"
+        )
+    (workspace / ".pksql").write_text("hits = parts/*.parquet\n")
+    return aliases.load()
+
+
+@pytest.fixture
+def listening(workspace, tmp_path):
+    """Two workers, serving the workspace from their own processes."""
+    root = os.path.dirname(os.path.dirname(workers.__file__))
+    env = {**os.environ, "PYTHONPATH": root}
+    addresses, processes = [], []
+    for i in range(2):
+        address = f"unix:{tmp_path / f'worker{i}.sock'}"
+        process = subprocess.Popen(
+            [sys.executable, "-m", "pksql.main", "worker", "--listen", address],
+            cwd=workspace,
+            env=env,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        assert "Listening on" in process.stderr.readline()
+        addresses.append(address)
+        processes.append(process)
+    yield addresses
+    for process in processes:
+        process.terminate()
+        process.wait()
+        process.stderr.close()
+    assert not list(tmp_path.glob("*.sock"))
+
+
+def test_gather_matches_a_single_process(bind, parts, listening):
+    conn = bind(parts)
+    sql = (
+        "SELECT k, count(*) AS n, sum(v) AS total, max(p) AS last "
+        "FROM hits WHERE v > $floor GROUP BY k"
+    )
+    params = {"floor": str(2**52 + 10)}
+
+    gathered = workers.gather(conn, sql, parts, ["hits"], listening, params)
+
+    expected = conn.sql(sql, params=params)
+    assert gathered.types == expected.types
+    assert sorted(gathered.fetchall()) == sorted(expected.fetchall())
+
+
+def test_gather_declines_what_it_cannot_merge(bind, parts, listening):
+    conn = bind(parts)
+    sql = "SELECT avg(v) FROM hits"
+    assert workers.gather(conn, sql, parts, ["hits"], listening) is None
+
+
+def test_split_declines_a_grouped_query_over_no_local_files(workspace):
+    conn = duckdb.connect(database=":memory:")
+    registered = {"hits": str(workspace / "elsewhere" / "*.parquet")}
+    sql = "SELECT k + 1 AS kk, count(*) FROM hits GROUP BY kk"
+    assert workers.split(conn, sql, registered, ["hits"]) is None
+
+    (workspace / ".pksql").write_text("hits = elsewhere/*.parquet\n")
+    result = CliRunner().invoke(cli, ["--workers", "unix:/nonexistent", sql])
+    assert result.exit_code == 1
+    assert isinstance(result.exception, SystemExit)
+
+
+def test_workers_only_run_mergeable_queries_on_their_own_files(parts, workspace):
+    path = str(workspace / "parts" / "0.parquet")
+    request = {"name": "hits", "sql": "SELECT count(*) FROM hits", "paths": [path]}
+
+    header, _ = workers.run_partial(request, [workspace])
+    assert header == {"format": "duckdb"}
+
+    with pytest.raises(workers.WorkerError, match="outside"):
+        workers.run_partial(request, [workspace / "elsewhere"])
+    with pytest.raises(workers.WorkerError, match="count/sum/min/max"):
+        workers.run_partial(
+            {**request, "sql": "SELECT * FROM hits LIMIT 1"}, [workspace]
+        )
+
+
+def test_cli_uses_workers_from_the_pksql_file(parts, listening, workspace):
+    with open(workspace / ".pksql", "a") as f:
+        f.write(f"set workers = {', '.join(listening)}\n")
+    sql = "SELECT count(*) AS n, sum(v) AS total FROM hits"
+
+    result = CliRunner().invoke(cli, ["-F", "csv", sql])
+    assert result.exit_code == 0, result.output
+    assert result.stdout.strip() == f"n,total\n600,{600 * 2**52 + 6 * 4950}"
+    assert "Note" not in result.stderr
+
+    result = CliRunner().invoke(cli, ["--workers", "unix:/nonexistent", sql])
+    assert result.exit_code == 1
+    assert "worker unix:/nonexistent" in result.stderr
+
+
+def test_queries_left_to_run_here_are_guarded_as_rewritten(parts, workspace):
+    with open(workspace / ".pksql", "a") as f:
+        f.write("set workers = unix:/nonexistent\n")
+        f.write("set max_scan = 10\n")  # bytes
+        f.write("rollup by_k = hits by k: count(*)\n")
+    # ORDER BY keeps it off the workers; the rollup answers it for nothing,
+    # once it has been built.
+    sql = "SELECT k, count(*) AS n FROM hits GROUP BY k ORDER BY k"
+    assert CliRunner().invoke(cli, ["rollups", "--refresh"]).exit_code == 0
+
+    result = CliRunner().invoke(cli, ["-F", "csv", sql])
+    assert result.exit_code == 0, result.output
+    assert "answered from rollup by_k" in result.stderr
+    assert result.stdout.strip() == "k,n\n0,150\n1,150\n2,150\n3,150"
+
+    result = CliRunner().invoke(cli, ["-F", "csv", "SELECT * FROM hits"])
+    assert result.exit_code == 1
+    assert "max_scan in .pksql" in result.stderr